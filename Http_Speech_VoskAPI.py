@@ -2,25 +2,40 @@
 # Developer: Trần Nguyên Hiền
 # Faculty: Electronics and Communication Engineering
 # =====================================================================================================
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import threading
 import uvicorn
+import asyncio
+import shutil
+import tempfile
 
-import sounddevice as sd
-import queue
 import json
-import requests
 import re
 import os
-import tempfile
-from vosk import Model, KaldiRecognizer
-from rapidfuzz import fuzz
-from gtts import gTTS
-from pydub import AudioSegment
-from pydub.playback import play
 import time
-from Installsubabase import supabase
+from Installsubabase import get_supabase
+from Speech_TTS import PromptCache
+from Speech_Output import SpeechOutput
+from Speech_Grammar import build_grammars, strip_unk, GrammarSwitcher
+from Speech_Endpointing import EndpointSwitcher
+from Speech_Matcher import KeywordMatcher
+from Speech_SlotParser import SlotParser
+from Speech_Confidence import ConfirmationPolicy, evidence_from_result, RECOGNIZER_ALTERNATIVES
+from Speech_Catalog import Catalog
+from Speech_Startup import Readiness, warm_up_recognizers
+from Speech_Workers import RecognitionPool, RECOGNITION_WORKERS
+from Speech_VAD import VoiceActivityGate, VAD_ENABLED
+from Speech_Persistence import OrderWriter
+from Speech_Recording import SessionRecorder
+from Speech_Capture import create_ring, device_latency, waveform_buffer
+from Speech_Resample import create_resampler
+from Speech_Models import ModelRegistry, SPEECH_LANGUAGE
+import Speech_Metrics as metrics
+from Speech_Partials import PartialTracker
+from Speech_OrderFeed import OrderFeed
+import Speech_Batch
 
 app = FastAPI(title="Voice Ordering System")
 app.add_middleware(
@@ -30,80 +45,131 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-is_speaking = False
+# The microphone is optional: a box without one still serves batch audits of files
+readiness = Readiness(["catalog", "model", "warmup", "orders", "workers", "microphone"],
+                      required=["catalog", "model", "warmup", "orders", "workers"])
 latest_order = None
+# Completed orders for the /orders long-poll and /orders/stream SSE consumers
+order_feed = OrderFeed()
 drink_prices = {}
+components = {}
+grammars = {}
+catalog_lock = threading.Lock()
 # ============ From Supabase Import Drink and Ingredient ============
-def fetch_drinks_from_supabase():
-    try:
-        response = supabase.table("drinkdata").select("drink_name,price").execute()
-        drink_list = []
-        for item in response.data:
-            name = item.get('drink_name', '').lower()
-            price = item.get('price', 0)
-            if name:
-                drink_list.append({"name": name, "price": price})
-        return drink_list
-    except Exception as e:
-        print("Error fetching drinks from Supabase:", str(e))
-        return []
-
-def fetch_components_from_supabase():
-    try:
-        response = supabase.table("drinkdata").select("drink_name,ingredients").execute()
-        comp_dict = {}
-        for item in response.data:
-            name = item.get("drink_name", "").lower()
-            ing = item.get("ingredients", [])
-            if name and isinstance(ing, list):
-                comp_dict[name] = [i.lower() for i in ing]
-        return comp_dict
-    except Exception as e:
-        print("Error fetching ingredients from Supabase:", str(e))
-        return {}
-
-def update_drink_keywords(drink_data):
-    keywords["Drink"] = {}
-    for item in drink_data:
-        name = item["name"]
-        price = item["price"]
-        clean_name = normalize_text(name)
-        keywords["Drink"][clean_name] = [clean_name]
-        drink_prices[clean_name] = price
+# The new tables, matcher and grammars are built first and then swapped in
+# together under catalog_lock, which the dialog holds while handling a turn
+def apply_catalog(snapshot, warm_prompts=True):
+    global drink_prices, components, matcher, slot_parser
+    drink_keywords, prices, comps = {}, {}, {}
+    for item in snapshot["drinks"]:
+        clean_name = normalize_text(item["name"])
+        drink_keywords[clean_name] = [clean_name]
+        prices[clean_name] = item["price"]
+        if item["ingredients"]:
+            comps[item["name"]] = item["ingredients"]
+    new_keywords = {**keywords, "Drink": drink_keywords}
+    new_matcher = KeywordMatcher(new_keywords)
+    new_slot_parser = SlotParser(new_keywords, comps)
+    new_grammars = build_grammars(new_keywords, extra_phrases=new_slot_parser.grammar_phrases())
+    with catalog_lock:
+        keywords["Drink"] = drink_keywords
+        drink_prices = prices
+        components = comps
+        matcher = new_matcher
+        slot_parser = new_slot_parser
+        grammars.clear()
+        grammars.update(new_grammars)
+    print("Updated drink keywords:", keywords["Drink"])
+    print("Updated components from Supabase:", components)
+    session_recorder.catalog(snapshot)
+    if warm_prompts:
+        tts_cache.warm_in_background(catalog_prompts())
+    if drink_keywords and not readiness.is_ready("catalog"):
+        readiness.mark("catalog")
 
 # ========================== Text-To-Speech ===========================
+tts_cache = PromptCache(lang='en')
+speech_output = SpeechOutput(tts_cache)
+# With barge-in the microphone stays open during prompts so the customer can interrupt
+# Off by default: without echo cancellation the prompt itself reaches the microphone,
+# and is_echo() can only recognize the transcripts it leaves, not every one
+BARGE_IN = os.environ.get("BARGE_IN", "0") == "1"
+
 def speak(text):
-    global is_speaking
     if not text.strip():
-        return
-    is_speaking = True
+        return None
     print(f"[TTS]: {text}")
-    tts = gTTS(text=text, lang='en')
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as fp:
-        tts.save(fp.name)
-        sound = AudioSegment.from_mp3(fp.name)
-        play(sound)
-    os.unlink(fp.name)
-    time.sleep(0.3)
-    is_speaking = False
+    return speech_output.say(text)
 
 # ========================= Voice Recognition =========================
-q = queue.Queue()
-model_en = Model("vosk-model-small-en-us-0.15")
-device_info = sd.query_devices(sd.default.device[0], 'input')
-samplerate = int(device_info['default_samplerate'])
-rec = KaldiRecognizer(model_en, samplerate)
-rec.SetWords(True)
+# Filled by the audio callback once the microphone stream is open
+audio_ring = None
+# One model per language (SPEECH_MODELS), loaded on first use and shared
+model_registry = ModelRegistry()
+# Rate the default model computes features at; other input rates are resampled to it
+MODEL_SAMPLE_RATE = model_registry.sample_rate(SPEECH_LANGUAGE)
+recognition_pool = None
+
+# A recognition worker that died takes the box out of /ready until it is restarted
+def report_recognition_workers(error):
+    if error is None:
+        readiness.mark("workers")
+    else:
+        readiness.fail("workers", error)
+
+# Loads the default language up front; with RECOGNITION_WORKERS set the worker processes load it instead
+def load_model():
+    global recognition_pool
+    if RECOGNITION_WORKERS > 0:
+        pool = RecognitionPool(model_registry.paths, SPEECH_LANGUAGE, RECOGNITION_WORKERS,
+                               report=report_recognition_workers)
+        pool.start()
+        recognition_pool = pool
+    else:
+        model_registry.preload(SPEECH_LANGUAGE)
+    readiness.mark("workers")
+
+def create_recognizer(sample_rate, grammar=None, language=SPEECH_LANGUAGE):
+    if recognition_pool:
+        recognizer = recognition_pool.create_recognizer(sample_rate, grammar, language)
+    else:
+        recognizer = model_registry.create_recognizer(sample_rate, grammar, language)
+    # n-best alternatives feed the confirmation policy; Vosk then leaves out word confidences
+    if RECOGNIZER_ALTERNATIVES > 0:
+        recognizer.SetMaxAlternatives(RECOGNIZER_ALTERNATIVES)
+    return recognizer
+
+# ============================= Metrics =============================
+AUDIO_QUEUE_DEPTH = metrics.gauge("speech_audio_queue_depth", "Captured blocks waiting for the recognizer", function=lambda: audio_ring.depth() if audio_ring else 0)
+AUDIO_DROPPED_BLOCKS = metrics.counter("speech_audio_dropped_blocks_total", "Input overflows reported by the audio device")
+MODELS_LOADED = metrics.gauge("speech_models_loaded", "Speech models loaded in this process", function=lambda: len(model_registry.loaded_languages()))
+MODEL_MEMORY_BYTES = metrics.gauge("speech_model_memory_bytes", "Size of the speech models loaded in this process", function=model_registry.memory_bytes)
+ACCEPT_WAVEFORM_SECONDS = metrics.histogram("speech_accept_waveform_seconds", "AcceptWaveform time per audio chunk", ["source"])
+MATCH_SECONDS = metrics.histogram("speech_match_seconds", "Keyword matcher time per call", ["kind"])
+TURN_SECONDS = metrics.histogram("speech_turn_seconds", "From the block that ended an utterance to the dialog's reaction", ["source"])
+MIC_ACCEPT_SECONDS = ACCEPT_WAVEFORM_SECONDS.labels(source="microphone")
+MIC_TURN_SECONDS = TURN_SECONDS.labels(source="microphone")
+BEST_MATCH_SECONDS = MATCH_SECONDS.labels(kind="best")
+CONFIDENT_MATCH_SECONDS = MATCH_SECONDS.labels(kind="confident")
+
+def accept_waveform(rec, data, histogram):
+    if not data:
+        return False
+    if isinstance(data, memoryview) and recognition_pool is None:
+        data = waveform_buffer(data)
+    with histogram.timer():
+        return rec.AcceptWaveform(data)
 
 def callback(indata, frames, time_, status):
-    global is_speaking
     if status:
         print("Audio Error:", status)
-    if not is_speaking:
-        q.put(bytes(indata))
+        if status.input_overflow:
+            AUDIO_DROPPED_BLOCKS.inc()
+    if BARGE_IN or not speech_output.is_speaking():
+        audio_ring.write(indata)
 
 def normalize_text(text):
-    text = text.lower()
+    text = strip_unk(text.lower())
     text = re.sub(r"[^\w\s]", "", text)
     text = re.sub(r"\s+", " ", text).strip()
     return text
@@ -123,222 +189,578 @@ keywords = {
 }
 
 def detect_best_match(text, category, threshold=80):
-    best_match = {"score": 0, "label": None, "length": 0}
-    for label, kw_list in keywords[category].items():
-        for kw in kw_list:
-            score = fuzz.partial_ratio(text, kw)
-            if score > best_match["score"] or (
-                score == best_match["score"] and len(kw.split()) > best_match["length"]
-            ):
-                best_match.update({"score": score, "label": label, "length": len(kw.split())})
-    if best_match["score"] >= threshold:
-        return best_match["label"]
-    return None
+    with BEST_MATCH_SECONDS.timer():
+        return matcher.best_match(text, category, threshold)
 
 def is_valid_speech(text):
-    if not text:
-        return False
-    for category in keywords.values():
-        for kw_list in category.values():
-            for kw in kw_list:
-                if kw in text:
-                    return True
-    return False
-
-def reset_state():
-    global selected_drink, selected_size, component_sizes
-    global customizing, current_component_index
-    global step, waiting_confirmation, pending_value, pending_category
-
-    selected_drink = None
-    selected_size = None
-    component_sizes.clear()
-    customizing = False
-    current_component_index = 0
-    step = 1
-    waiting_confirmation = False
-    pending_value = None
-    pending_category = None
+    return matcher.is_valid(text)
+
+# Thresholds come from CONFIRM_* (see Speech_Confidence)
+confirmation_policy = ConfirmationPolicy()
+
+def is_confident(evidence, category, label):
+    return confirmation_policy.confident(evidence, category, label, matcher)
+
+def detect_confident_match(text, category):
+    with CONFIDENT_MATCH_SECONDS.timer():
+        return matcher.confident_match(text, category)
+
+matcher = KeywordMatcher(keywords)
+slot_parser = SlotParser(keywords, components)
+
+# Every fixed prompt plus each catalog template the dialog below can produce
+def catalog_prompts():
+    prompts = [
+        "Hello! What would you like to drink?",
+        "Please say yes or no.",
+        "This drink cannot be customized. Please choose size.",
+        "What size do you want?",
+        "Please say size again.",
+        "Please say again. What would you like to drink?",
+        "Sorry I did not recognize the drink. Please try again.",
+        "Sorry I did not recognize the size. Please try again.",
+    ]
+    for drink in keywords["Drink"]:
+        price = drink_prices.get(drink, "unknown")
+        prompts += [
+            f"Did you mean drink {drink}? Please say yes or no.",
+            f"You chose drink: {drink}. Would you like to customize your drink ingredients?",
+            f"The price is {price} vnd. Order successful!",
+        ]
+        for size in keywords["Size"]:
+            prompts += [
+                f"Confirm: {drink} - size {size}",
+                f"You chose size: {size}. The price is {price} vnd. Order successful!",
+                f"Did you mean {drink} size {size}? Please say yes or no.",
+            ]
+    for size in keywords["Size"]:
+        prompts.append(f"Did you mean size {size}? Please say yes or no.")
+    for comp in sorted({comp for comps in components.values() for comp in comps}):
+        prompts += [
+            f"What size for {comp}?",
+            f"Please say size again for {comp}.",
+        ]
+        prompts += [f"Did you mean size {size} for {comp}? Please say yes or no." for size in keywords["Size"]]
+    return prompts
 
 # ============ Initialize Keywords And Data ============
-drink_data = fetch_drinks_from_supabase()
-update_drink_keywords(drink_data)
-components = fetch_components_from_supabase()
+catalog = Catalog(get_supabase, on_change=apply_catalog)
+# Finished orders are journaled locally and saved to Supabase in the background;
+# while the journal cannot be written the box reports itself not ready
+def report_order_journal(error):
+    if error is None:
+        readiness.mark("orders")
+    else:
+        readiness.fail("orders", error)
+
+order_writer = OrderWriter(get_supabase, report=report_order_journal)
+# With RECORD_SESSIONS=1 audio, results and dialog turns are captured for Speech_Replay.py
+session_recorder = SessionRecorder()
+
+# ============ ORDER SESSION ============
+# say(text) delivers a prompt to the customer, notify(message) publishes dialog events
+class OrderSession:
+    def __init__(self, say=None, notify=None):
+        self.say = say or speak
+        self.notify = notify or (lambda message: None)
+        self.component_sizes = {}
+        self.latest_order = None
+        self.reset_state()
+
+    def reset_state(self):
+        self.selected_drink = None
+        self.selected_size = None
+        self.component_sizes.clear()
+        self.customizing = False
+        self.current_component_index = 0
+        self.step = 1
+        self.waiting_confirmation = False
+        self.pending_value = None
+        self.pending_category = None
+
+    # Keyword category the next utterance is matched against, drives the grammar
+    def expected_category(self):
+        if self.waiting_confirmation:
+            return "YesNo"
+        if self.step == 1:
+            return "Drink"
+        return "Size"
+
+    # Category a partial may be committed early against; None while the answer can carry
+    # several slots (the drink with its sizes, several ingredient sizes), which a pause
+    # after the first of them would cut short
+    def early_commit_category(self):
+        if not self.waiting_confirmation and self.step in (1, 3):
+            return None
+        return self.expected_category()
+
+    # evidence is the recognizer result behind the text, None for early commits
+    def handle_text(self, text, evidence=None):
+        if self.waiting_confirmation:
+            answer = detect_best_match(text, "YesNo")
+            if answer == "Yes":
+                if self.pending_category == "Drink":
+                    self.accept_drink(self.pending_value)
+                elif self.pending_category == "Customize":
+                    if self.selected_drink in components:
+                        self.customizing = True
+                        self.current_component_index = 0
+                        self.component_sizes.clear()
+                        comp = components[self.selected_drink][self.current_component_index]
+                        self.say(f"What size for {comp}?")
+                        print(f"What size for {comp}?")
+                        self.step = 3
+                    else:
+                        self.say("This drink cannot be customized. Please choose size.")
+                        print("This drink cannot be customized. Please choose size.")
+                        self.step = 2
+                    self.waiting_confirmation = False
+                elif self.pending_category == "Size":
+                    self.place_size_order(self.pending_value)
+                elif self.pending_category == "ComponentSize":
+                    self.accept_component_sizes(self.pending_value)
+                elif self.pending_category == "Order":
+                    self.place_order()
+            elif answer == "No":
+                if self.pending_category == "Drink":
+                    self.say("Please say again. What would you like to drink?")
+                    print("Please say again. What would you like to drink?")
+                    self.step = 1
+                elif self.pending_category == "Customize":
+                    self.customizing = False
+                    self.say("What size do you want?")
+                    print("What size do you want?")
+                    self.step = 2
+                    self.waiting_confirmation = False
+                elif self.pending_category == "Size":
+                    self.say("Please say size again.")
+                    print("Please say size again.")
+                    self.step = 2
+                    self.waiting_confirmation = False
+                elif self.pending_category == "ComponentSize":
+                    comp = components[self.selected_drink][self.current_component_index]
+                    self.say(f"Please say size again for {comp}.")
+                    print(f"Please say size again for {comp}.")
+                    self.waiting_confirmation = False
+                elif self.pending_category == "Order":
+                    self.reset_state()
+                    self.say("Please say again. What would you like to drink?")
+                    print("Please say again. What would you like to drink?")
+            else:
+                self.say("Please say yes or no.")
+                print("Please say yes or no.")
+            return
+
+        if self.step == 1:
+            # "A large iced latte with less sugar" fills several slots at once
+            slots = slot_parser.parse(text)
+            if slots["drink"] and (slots["size"] or slots["components"]):
+                self.fill_slots(slots, evidence)
+                return
+            drink = detect_best_match(text, "Drink")
+            if drink and is_confident(evidence, "Drink", drink):
+                self.accept_drink(drink)
+            elif drink:
+                self.say(f"Did you mean drink {drink}? Please say yes or no.")
+                print(f"Did you mean drink {drink}? Please say yes or no.")
+                self.pending_value = drink
+                self.pending_category = "Drink"
+                self.waiting_confirmation = True
+            else:
+                self.say("Sorry I did not recognize the drink. Please try again.")
+                print("Sorry I did not recognize the drink. Please try again.")
+
+        elif self.step == 2:
+            size = detect_best_match(text, "Size")
+            if size and is_confident(evidence, "Size", size):
+                self.place_size_order(size)
+            elif size:
+                self.say(f"Did you mean size {size}? Please say yes or no.")
+                print(f"Did you mean size {size}? Please say yes or no.")
+                self.pending_value = size
+                self.pending_category = "Size"
+                self.waiting_confirmation = True
+            else:
+                self.say("Sorry I did not recognize the size. Please try again.")
+                print("Sorry I did not recognize the size. Please try again.")
+
+        elif self.step == 3:
+            # "Milk l, sugar s" answers several ingredients in one go
+            given = slot_parser.parse(text, drink=self.selected_drink)["components"]
+            confident = bool(given) and confirmation_policy.confident_utterance(evidence)
+            if not given:
+                size = detect_best_match(text, "Size")
+                if size:
+                    given = {components[self.selected_drink][self.current_component_index]: size}
+                    confident = is_confident(evidence, "Size", size)
+            if given and confident:
+                self.accept_component_sizes(given)
+            elif given:
+                answers = ", ".join(f"size {size} for {comp}" for comp, size in given.items())
+                self.say(f"Did you mean {answers}? Please say yes or no.")
+                print(f"Did you mean {answers}? Please say yes or no.")
+                self.pending_value = given
+                self.pending_category = "ComponentSize"
+                self.waiting_confirmation = True
+            else:
+                self.say("Sorry I did not recognize the size. Please try again.")
+                print("Sorry I did not recognize the size. Please try again.")
 
-print("Updated drink keywords:", keywords["Drink"])
-print("Updated components from Supabase:", components)
+    def accept_drink(self, drink):
+        self.selected_drink = drink
+        self.say(f"You chose drink: {self.selected_drink}. Would you like to customize your drink ingredients?")
+        print(f"You chose drink: {self.selected_drink}. Would you like to customize your drink ingredients?")
+        self.pending_category = "Customize"
+        self.waiting_confirmation = True
+
+    def accept_component_sizes(self, sizes):
+        self.component_sizes.update(sizes)
+        next_comp = self.next_missing_component()
+        if next_comp:
+            self.say(f"What size for {next_comp}?")
+            print(f"What size for {next_comp}?")
+        else:
+            self.place_component_order()
+        self.waiting_confirmation = False
+
+    # Takes every slot of a one-shot utterance and asks only for what is missing
+    def fill_slots(self, slots, evidence=None):
+        self.selected_drink = slots["drink"]
+        self.selected_size = slots["size"]
+        self.component_sizes.clear()
+        if slots["components"] and self.selected_drink in components:
+            self.customizing = True
+            self.component_sizes.update(slots["components"])
+            next_comp = self.next_missing_component()
+            if next_comp:
+                self.say(f"What size for {next_comp}?")
+                print(f"What size for {next_comp}?")
+                self.step = 3
+                return
+            summary = f"{self.selected_drink} with " + \
+                      ", ".join([f"{k} size {v}" for k, v in self.component_sizes.items()])
+        else:
+            summary = f"{self.selected_drink} size {self.selected_size}"
+        if confirmation_policy.confident_utterance(evidence):
+            self.place_order()
+            return
+        # Nothing of this was confirmed yet, so the whole order is read back once
+        self.say(f"Did you mean {summary}? Please say yes or no.")
+        print(f"Did you mean {summary}? Please say yes or no.")
+        self.pending_category = "Order"
+        self.waiting_confirmation = True
+
+    def place_order(self):
+        if self.customizing:
+            self.place_component_order()
+        else:
+            self.place_size_order(self.selected_size)
+
+    def next_missing_component(self):
+        for index, comp in enumerate(components[self.selected_drink]):
+            if comp not in self.component_sizes:
+                self.current_component_index = index
+                return comp
+        # Read back in catalog order, however the customer listed them
+        ordered = {comp: self.component_sizes[comp] for comp in components[self.selected_drink]}
+        self.component_sizes.clear()
+        self.component_sizes.update(ordered)
+        return None
+
+    def place_size_order(self, size):
+        self.selected_size = size
+        price = drink_prices.get(self.selected_drink, "unknown")
+        self.say(f"You chose size: {self.selected_size}. The price is {price} vnd. Order successful!")
+        self.say(f"Confirm: {self.selected_drink} - size {self.selected_size}")
+        self.latest_order = {
+            "price": price,
+            "drink": self.selected_drink,
+            "size": self.selected_size
+        }
+        self.notify({"type": "voiceOrderResult", "data": self.latest_order})
+        self.reset_state()
+
+    def place_component_order(self):
+        price = drink_prices.get(self.selected_drink, "unknown")
+        final_text = f"Confirm: {self.selected_drink} with " + \
+                     ", ".join([f"{k} size {v}" for k, v in self.component_sizes.items()])
+        self.say(final_text)
+        self.say(f"The price is {price} vnd. Order successful!")
+        self.latest_order = {
+            "drink": self.selected_drink,
+            "details": {
+                "price": price,
+                **self.component_sizes.copy(),
+            }
+        }
+        # Drink size from a one-shot order, the ingredient sizes alone do not carry it
+        if self.selected_size:
+            self.latest_order["size"] = self.selected_size
+        self.notify({"type": "voiceOrderResult", "data": self.latest_order})
+        self.reset_state()
 
 # ============= MAIN VOICE ORDER FUNCTION ==============
-def Voice_Ordering_System():
-    global step, selected_drink, selected_size
-    global waiting_confirmation, pending_value, pending_category
-    global customizing, current_component_index, component_sizes
+def publish_order(message):
     global latest_order
+    if message.get("type") == "voiceOrderResult":
+        latest_order = message["data"]
+        order_feed.append(message["data"])
+        order_writer.submit(message["data"], source="microphone")
 
-    print(f"Listening... (Sample Rate = {samplerate})")
+def Voice_Ordering_System():
+    import sounddevice as sd
+    device_info = sd.query_devices(sd.default.device[0], 'input')
+    samplerate = int(device_info['default_samplerate'])
+    resampler = create_resampler(samplerate, MODEL_SAMPLE_RATE)
+    decode_rate = MODEL_SAMPLE_RATE if resampler else samplerate
+    rec = create_recognizer(decode_rate)
+    print(f"Listening... (Sample Rate = {samplerate}, decoding at {decode_rate})")
+    session = OrderSession(say=speak, notify=publish_order)
+    grammar_switcher = GrammarSwitcher(grammars)
+    grammar_switcher.apply(rec, session.expected_category())
+    vad_gate = VoiceActivityGate(decode_rate) if VAD_ENABLED else None
+    # Short trailing silence for yes/no, longer for drink names (Speech_Endpointing)
+    endpoint_switcher = EndpointSwitcher(vad_gate)
+    endpoint_switcher.apply(rec, session.expected_category())
+    # No socket to show partials on here, they only drive early commit
+    partials = PartialTracker(lambda message: None, detect_confident_match)
+    recording = session_recorder.open_stream("microphone", samplerate, SPEECH_LANGUAGE)
     speak("Hello! What would you like to drink?")
     print("Hello! What would you like to drink?")
 
-    step = 1
-    selected_drink = None
-    selected_size = None
-    waiting_confirmation = False
-    pending_value = None
-    pending_category = None
-    customizing = False
-    current_component_index = 0
-    component_sizes = {}
-    latest_order = None
-
-    with sd.RawInputStream(samplerate=samplerate, blocksize=4000, dtype='int16', channels=1, callback=callback):
+    global audio_ring
+    block_frames, audio_ring = create_ring(samplerate)
+
+    with sd.RawInputStream(samplerate=samplerate, blocksize=block_frames, latency=device_latency(),
+                           dtype='int16', channels=1, callback=callback):
+        readiness.mark("microphone")
         while True:
-            data = q.get()
-            if rec.AcceptWaveform(data):
-                result = json.loads(rec.Result())
-                text = normalize_text(result.get("text", ""))
+            data = audio_ring.read()
+            block_at = time.perf_counter()
+            session_recorder.audio(recording, data)
+            if resampler:
+                data = resampler.process(data)
+            speech_ended = False
+            if vad_gate:
+                # Silence is not decoded at all; flush when the speaker stops
+                data, speech_ended = vad_gate.process(data)
+                if speech_ended:
+                    print(f"[VAD] {vad_gate.skipped_ratio():.0%} of audio skipped so far")
+            accepted = accept_waveform(rec, data, MIC_ACCEPT_SECONDS)
+            if accepted or speech_ended:
+                raw_result = rec.Result() if accepted else rec.FinalResult()
+                session_recorder.result(recording, raw_result)
+                evidence = evidence_from_result(json.loads(raw_result), normalize_text)
+                text, heard = evidence.text, evidence.heard
                 print(f"Detected: {text}")
-
-                if is_speaking or not text or not is_valid_speech(text):
-                    print("Ignored noise or system playback.")
+                if partials.final():
+                    # Already acted on from a partial, only the grammar switch was waiting
+                    with catalog_lock:
+                        grammar_switcher.apply(rec, session.expected_category())
+                    endpoint_switcher.apply(rec, session.expected_category())
                     continue
-
-                if waiting_confirmation:
-                    answer = detect_best_match(text, "YesNo")
-                    if answer == "Yes":
-                        if pending_category == "Drink":
-                            selected_drink = pending_value
-                            speak(f"You chose drink: {selected_drink}. Would you like to customize your drink ingredients?")
-                            print(f"You chose drink: {selected_drink}. Would you like to customize your drink ingredients?")
-                            pending_category = "Customize"
-                            waiting_confirmation = True
-                        elif pending_category == "Customize":
-                            if selected_drink in components:
-                                customizing = True
-                                current_component_index = 0
-                                component_sizes.clear()
-                                comp = components[selected_drink][current_component_index]
-                                speak(f"What size for {comp}?")
-                                print(f"What size for {comp}?")
-                                step = 3
-                            else:
-                                speak("This drink cannot be customized. Please choose size.")
-                                print("This drink cannot be customized. Please choose size.")
-                                step = 2
-                            waiting_confirmation = False
-                        elif pending_category == "Size":
-                            selected_size = pending_value
-                            price = drink_prices.get(selected_drink, "unknown")
-                            speak(f"You chose size: {selected_size}. The price is {price} vnd. Order successful!")
-                            speak(f"Confirm: {selected_drink} - size {selected_size}")
-                            latest_order = {
-                                "price": price,
-                                "drink": selected_drink,
-                                "size": selected_size
-                            }
-                            reset_state()
-                        elif pending_category == "ComponentSize":
-                            comp = components[selected_drink][current_component_index]
-                            component_sizes[comp] = pending_value
-                            current_component_index += 1
-                            if current_component_index < len(components[selected_drink]):
-                                next_comp = components[selected_drink][current_component_index]
-                                speak(f"What size for {next_comp}?")
-                                print(f"What size for {next_comp}?")
-                            else:
-                                price = drink_prices.get(selected_drink, "unknown")
-                                final_text = f"Confirm: {selected_drink} with " + \
-                                             ", ".join([f"{k} size {v}" for k, v in component_sizes.items()])
-                                speak(final_text)
-                                speak(f"The price is {price} vnd. Order successful!")
-                                latest_order = {
-                                    "drink": selected_drink,
-                                    "details": {
-                                        "price": price,
-                                        **component_sizes.copy(),
-                                    }
-                                }
-                                reset_state()
-                            waiting_confirmation = False
-                    elif answer == "No":
-                        if pending_category == "Drink":
-                            speak("Please say again. What would you like to drink?")
-                            print("Please say again. What would you like to drink?")
-                            step = 1
-                        elif pending_category == "Customize":
-                            customizing = False
-                            speak("What size do you want?")
-                            print("What size do you want?")
-                            step = 2
-                            waiting_confirmation = False
-                        elif pending_category == "Size":
-                            speak("Please say size again.")
-                            print("Please say size again.")
-                            step = 2
-                            waiting_confirmation = False
-                        elif pending_category == "ComponentSize":
-                            comp = components[selected_drink][current_component_index]
-                            speak(f"Please say size again for {comp}.")
-                            print(f"Please say size again for {comp}.")
-                            waiting_confirmation = False
-                    else:
-                        speak("Please say yes or no.")
-                        print("Please say yes or no.")
+            elif data:
+                heard = json.loads(rec.PartialResult()).get("partial", "")
+                text = partials.partial(normalize_text(heard), session.early_commit_category())
+                if not text:
                     continue
+                evidence = None
+                print(f"Early commit: {text}")
+            else:
+                continue
 
-                if step == 1:
-                    drink = detect_best_match(text, "Drink")
-                    if drink:
-                        speak(f"Did you mean drink {drink}? Please say yes or no.")
-                        print(f"Did you mean drink {drink}? Please say yes or no.")
-                        pending_value = drink
-                        pending_category = "Drink"
-                        waiting_confirmation = True
-                    else:
-                        speak("Sorry I did not recognize the drink. Please try again.")
-                        print("Sorry I did not recognize the drink. Please try again.")
-
-                elif step == 2:
-                    size = detect_best_match(text, "Size")
-                    if size:
-                        speak(f"Did you mean size {size}? Please say yes or no.")
-                        print(f"Did you mean size {size}? Please say yes or no.")
-                        pending_value = size
-                        pending_category = "Size"
-                        waiting_confirmation = True
-                    else:
-                        speak("Sorry I did not recognize the size. Please try again.")
-                        print("Sorry I did not recognize the size. Please try again.")
-
-                elif step == 3:
-                    size = detect_best_match(text, "Size")
-                    if size:
-                        comp = components[selected_drink][current_component_index]
-                        speak(f"Did you mean size {size} for {comp}? Please say yes or no.")
-                        print(f"Did you mean size {size} for {comp}? Please say yes or no.")
-                        pending_value = size
-                        pending_category = "ComponentSize"
-                        waiting_confirmation = True
-                    else:
-                        speak("Sorry I did not recognize the size. Please try again.")
-                        print("Sorry I did not recognize the size. Please try again.")
+            if not text or not is_valid_speech(text):
+                print("Ignored noise or system playback.")
+                continue
+            # The end of a prompt is only finalized once the endpointer has waited out its silence
+            if speech_output.is_echo(heard, tail=endpoint_switcher.trailing_silence() + block_frames / samplerate):
+                print("Ignored system playback.")
+                session_recorder.ignored(recording, text, "echo")
+                continue
+            if speech_output.is_speaking():
+                print("Barge-in, stopping prompt.")
+                speech_output.cancel()
+            if evidence is None:
+                partials.accept()
+
+            with catalog_lock:
+                session.handle_text(text, evidence)
+                session_recorder.transition(recording, session, text, early=evidence is None)
+                # Vosk only takes a new grammar between utterances
+                if accepted or speech_ended:
+                    grammar_switcher.apply(rec, session.expected_category())
+            if accepted or speech_ended:
+                endpoint_switcher.apply(rec, session.expected_category())
+            MIC_TURN_SECONDS.observe(time.perf_counter() - block_at)
 
 # ======================== FastAPI ========================
+# Everything heavy runs here, off the startup hook, so uvicorn binds the port straight away
+def initialize():
+    catalog_thread = threading.Thread(target=catalog.start, daemon=True)
+    catalog_thread.start()
+    order_writer.start()
+    session_recorder.start()
+    readiness.run("model", load_model)
+    catalog_thread.join()
+    if not readiness.is_ready("catalog"):
+        readiness.fail("catalog", "No snapshot and Supabase unreachable, retrying in background")
+    if not readiness.is_ready("model"):
+        return
+    readiness.run("warmup", warm_up_recognizers, create_recognizer, MODEL_SAMPLE_RATE, list(grammars.values()))
+    try:
+        Voice_Ordering_System()
+    except Exception as e:
+        readiness.fail("microphone", e)
+
 @app.on_event("startup")
 def start_background_thread():
-    thread = threading.Thread(target=Voice_Ordering_System, daemon=True)
+    thread = threading.Thread(target=initialize, daemon=True)
     thread.start()
-    print("Voice system started in background.")
+    print(f"Voice system started in background ({time.monotonic() - readiness.started:.2f}s after import).")
+
+@app.get("/metrics")
+def get_metrics():
+    if not metrics.METRICS_ENABLED:
+        return Response("Metrics are disabled (METRICS=0)\n", status_code=404, media_type="text/plain")
+    return Response(metrics.render_metrics(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/models")
+def speech_models():
+    status = {"default": SPEECH_LANGUAGE, "configured": model_registry.languages()}
+    if recognition_pool:
+        status["workers"] = recognition_pool.languages()
+    else:
+        status["loaded"] = model_registry.stats()
+    return status
+
+@app.get("/ready")
+def ready():
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 @app.get("/")
 def root():
     return {"Message": "Voice Chạy Được Rồi Nè"}
 
 @app.get("/latest_order")
-def get_latest_order():
+def get_latest_order(request: Request):
+    etag = order_feed.etag()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
     if latest_order:
-        return latest_order
+        return JSONResponse(latest_order, headers={"ETag": etag})
     else:
-        return {"Status": "No_Order", "Message": "No order has been placed yet."}
+        return JSONResponse({"Status": "No_Order", "Message": "No order has been placed yet."}, headers={"ETag": etag})
+
+# ======================== Order Feed ========================
+# GET /orders?since=<id>&wait=<seconds> returns every order after <id>, waiting up
+# to <wait> seconds for the next one when there is none yet (long-poll).
+# GET /orders/stream is the same feed as Server-Sent Events; a reconnecting
+# EventSource resumes from its Last-Event-ID. IDs start over when the process
+# restarts; an ID past last_id gets the whole buffer back with missed=True.
+# When orders after the reader's position are gone (fallen out of the buffer, or
+# from before a restart) the stream sends a "missed" event before the orders it
+# still has; the reader should resync from GET /orders.
+ORDER_WAIT_MAX_SECONDS = 60
+SSE_HEARTBEAT_SECONDS = 15
+
+@app.get("/orders")
+async def get_orders(request: Request, since: int = 0, wait: float = 0):
+    etag = order_feed.etag()
+    if wait <= 0 and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    entries, missed = await order_feed.wait_since(since, min(wait, ORDER_WAIT_MAX_SECONDS))
+    body = {"orders": entries, "last_id": order_feed.last_id, "missed": missed}
+    return JSONResponse(body, headers={"ETag": order_feed.etag()})
+
+@app.get("/orders/stream")
+async def stream_orders(request: Request, since: int = None):
+    last_event_id = request.headers.get("last-event-id")
+    if since is None:
+        since = int(last_event_id) if last_event_id and last_event_id.isdigit() else order_feed.last_id
+
+    async def events():
+        position = since
+        while not await request.is_disconnected():
+            entries, missed = await order_feed.wait_since(position, SSE_HEARTBEAT_SECONDS)
+            if missed:
+                yield f"event: missed\ndata: {json.dumps({'since': position, 'last_id': order_feed.last_id})}\n\n"
+            if missed and not entries:
+                # Last-Event-ID from before a restart, with no order since
+                position = 0
+                continue
+            if not entries:
+                yield ": keep-alive\n\n"
+                continue
+            for entry in entries:
+                yield f"id: {entry['id']}\nevent: order\ndata: {json.dumps(entry, ensure_ascii=False)}\n\n"
+            position = entries[-1]["id"]
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/catalog/refresh")
+def refresh_catalog():
+    catalog.trigger_refresh()
+    return {"Status": "Refresh_Scheduled", "Version": catalog.snapshot["version"]}
+
+# ======================== Batch Audit ========================
+# POST a WAV file or a zip/tar archive of WAV files as the raw request body.
+# The worker pool is kept between requests and rebuilt when the catalog changes.
+# The upload is streamed to disk, and writing, extracting and cleaning up run on
+# the default executor: a night's recordings would otherwise hold up the event
+# loop, and with it the /orders long-polls and SSE streams.
+batch_pool = None
+batch_pool_version = None
+batch_pool_lock = threading.Lock()
+
+def get_batch_pool():
+    global batch_pool, batch_pool_version
+    with batch_pool_lock:
+        snapshot = catalog.snapshot
+        if batch_pool is None or batch_pool_version != snapshot["version"]:
+            if batch_pool is not None:
+                batch_pool.shutdown(wait=False)
+            batch_pool = Speech_Batch.create_pool(__name__, snapshot)
+            batch_pool_version = snapshot["version"]
+        return batch_pool
+
+# A single WAV is told from an archive by its RIFF header
+def collect_upload(upload, work_dir):
+    with open(upload, "rb") as f:
+        is_wav = f.read(4) == b"RIFF"
+    path = upload + (".wav" if is_wav else ".archive")
+    os.rename(upload, path)
+    return Speech_Batch.collect_wav_files([path], work_dir)
+
+@app.post("/batch/transcribe")
+async def batch_transcribe(request: Request):
+    loop = asyncio.get_running_loop()
+    work_dir = await loop.run_in_executor(None, tempfile.mkdtemp)
+    try:
+        upload = os.path.join(work_dir, "upload")
+        size = 0
+        f = await loop.run_in_executor(None, open, upload, "wb")
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    size += len(chunk)
+                    await loop.run_in_executor(None, f.write, chunk)
+        finally:
+            await loop.run_in_executor(None, f.close)
+        if not size:
+            return JSONResponse({"Status": "Error", "Message": "Empty upload."}, status_code=400)
+        try:
+            paths = await loop.run_in_executor(None, collect_upload, upload, work_dir)
+        except (ValueError, OSError) as e:
+            return JSONResponse({"Status": "Error", "Message": str(e)}, status_code=400)
+        started = time.perf_counter()
+        results = await loop.run_in_executor(None, Speech_Batch.transcribe_paths, get_batch_pool(), paths)
+    finally:
+        await loop.run_in_executor(None, shutil.rmtree, work_dir, True)
+    for result in results:
+        result["file"] = os.path.relpath(result["file"], work_dir)
+    return {"summary": Speech_Batch.summarize(results, time.perf_counter() - started), "results": results}
 
 if __name__ == "__main__":
     uvicorn.run("Speech_VoskAPI:app", host="0.0.0.0", port=8000, reload=False)
@@ -0,0 +1,205 @@
+# ======================= Batch Transcription And Order Audit =======================
+# Replays recorded customer audio (WAV files, a directory of them, or a zip/tar
+# archive) through the same recognizer, grammar switching and OrderSession dialog
+# as the live kiosk. Files are spread over a process pool; every worker imports
+# the app once, loads the model once and applies the catalog snapshot it is given.
+#
+#   python Speech_Batch.py recordings/ --app Http_Speech_VoskAPI --workers 8 --output audit.jsonl
+# ===================================================================================
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import tarfile
+import tempfile
+import time
+import wave
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Speech_Confidence import evidence_from_result
+from Speech_Resample import create_resampler
+
+CHUNK_FRAMES = 4000
+
+worker_app = None
+
+def init_worker(app_name, snapshot):
+    global worker_app
+    worker_app = importlib.import_module(app_name)
+    # Already one process per core here, decode in-process rather than through a nested pool
+    worker_app.RECOGNITION_WORKERS = 0
+    worker_app.load_model()
+    worker_app.apply_catalog(snapshot, warm_prompts=False)
+
+# ============================== Input Collection ==============================
+def extract_archive(path, target_dir):
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            archive.extractall(target_dir)
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as archive:
+            archive.extractall(target_dir, filter="data")
+    else:
+        raise ValueError(f"Unsupported archive: {path}")
+
+def collect_wav_files(inputs, work_dir):
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, n) for n in sorted(names) if n.lower().endswith(".wav")]
+        elif path.lower().endswith(".wav"):
+            files.append(path)
+        else:
+            target = tempfile.mkdtemp(dir=work_dir)
+            extract_archive(path, target)
+            files += collect_wav_files([target], work_dir)
+    return files
+
+def read_wav(path):
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError("only 16-bit PCM WAV is supported")
+        sample_rate = wf.getframerate()
+        channels = wf.getnchannels()
+        pcm = wf.readframes(wf.getnframes())
+    if channels > 1:
+        samples = np.frombuffer(pcm, dtype=np.int16).reshape(-1, channels)
+        pcm = samples.mean(axis=1).astype(np.int16).tobytes()
+    return sample_rate, pcm
+
+# ============================== Worker Side ==============================
+def transcribe_file(path):
+    app = worker_app
+    started = time.perf_counter()
+    try:
+        sample_rate, pcm = read_wav(path)
+    except (OSError, EOFError, ValueError, wave.Error) as e:
+        return {"file": path, "error": str(e)}
+
+    orders = []
+    def collect_order(message):
+        if message.get("type") == "voiceOrderResult":
+            orders.append(message["data"])
+
+    session = app.OrderSession(say=lambda text: None, notify=collect_order)
+    # Recordings start at the counter, so do not wait for the wake phrase
+    if hasattr(session, "listening_for_trigger"):
+        session.listening_for_trigger = False
+    duration = len(pcm) / 2 / sample_rate
+    resampler = create_resampler(sample_rate, app.MODEL_SAMPLE_RATE)
+    if resampler:
+        pcm = resampler.process(pcm) + resampler.flush()
+        sample_rate = app.MODEL_SAMPLE_RATE
+    grammar_switcher = app.GrammarSwitcher(app.grammars)
+    rec = app.create_recognizer(sample_rate, grammar_switcher.initial(session.expected_category()))
+    # Same utterance boundaries as the live dialog
+    endpoint_switcher = app.EndpointSwitcher()
+    endpoint_switcher.apply(rec, session.expected_category())
+
+    utterances = []
+    def handle(raw_result):
+        evidence = evidence_from_result(json.loads(raw_result), app.normalize_text)
+        text = evidence.text
+        if not text:
+            return
+        words = evidence.words
+        confs = [conf for _, conf in evidence.word_confidences()]
+        utterances.append({
+            "text": text,
+            "start": words[0]["start"] if words else None,
+            "end": words[-1]["end"] if words else None,
+            "conf": round(sum(confs) / len(confs), 3) if confs else None,
+            "step": session.expected_category(),
+        })
+        if app.is_valid_speech(text):
+            session.handle_text(text, evidence)
+            grammar_switcher.apply(rec, session.expected_category())
+            endpoint_switcher.apply(rec, session.expected_category())
+
+    chunk_bytes = CHUNK_FRAMES * 2
+    for offset in range(0, len(pcm), chunk_bytes):
+        if rec.AcceptWaveform(pcm[offset:offset + chunk_bytes]):
+            handle(rec.Result())
+    handle(rec.FinalResult())
+
+    decode_seconds = time.perf_counter() - started
+    return {
+        "file": path,
+        "duration": round(duration, 3),
+        "decode_seconds": round(decode_seconds, 3),
+        "rtf": round(decode_seconds / duration, 4) if duration else None,
+        "utterances": utterances,
+        "slots": {
+            "drink": session.selected_drink,
+            "size": session.selected_size,
+            "ingredients": dict(session.component_sizes),
+            "pending": {"category": session.pending_category, "value": session.pending_value},
+        },
+        "orders": orders,
+    }
+
+# ============================== Parent Side ==============================
+def create_pool(app_name, snapshot, workers=None):
+    return ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(app_name, snapshot),
+    )
+
+def transcribe_paths(pool, paths):
+    return list(pool.map(transcribe_file, paths, chunksize=1))
+
+def summarize(results, wall_seconds):
+    audio = sum(r.get("duration", 0) for r in results)
+    return {
+        "files": len(results),
+        "errors": sum(1 for r in results if "error" in r),
+        "orders": sum(len(r.get("orders", [])) for r in results),
+        "audio_seconds": round(audio, 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "speedup": round(audio / wall_seconds, 2) if wall_seconds else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe recorded orders and extract drink/size/ingredient slots")
+    parser.add_argument("inputs", nargs="+", help="WAV files, directories or zip/tar archives")
+    parser.add_argument("--app", default="Http_Speech_VoskAPI", help="app module whose dialog and keywords to use")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", help="write one JSON result per line here instead of stdout")
+    args = parser.parse_args()
+
+    from Installsubabase import get_supabase
+    from Speech_Catalog import Catalog
+    catalog = Catalog(get_supabase)
+    if not catalog.load_snapshot():
+        catalog.refresh()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = collect_wav_files(args.inputs, work_dir)
+        print(f"Transcribing {len(paths)} files with {args.workers} workers...")
+        started = time.perf_counter()
+        with create_pool(args.app, catalog.snapshot, args.workers) as pool:
+            results = transcribe_paths(pool, paths)
+        summary = summarize(results, time.perf_counter() - started)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        for result in results:
+            line = json.dumps(result, ensure_ascii=False)
+            if out:
+                out.write(line + "\n")
+            else:
+                print(line)
+    finally:
+        if out:
+            out.close()
+    print("Summary:", summary)
+
+if __name__ == "__main__":
+    main()
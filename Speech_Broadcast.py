@@ -0,0 +1,111 @@
+# ============================ WebSocket Broadcast ============================
+# Dialog events are produced on the recognition thread but the sockets belong to
+# uvicorn's event loop. publish() only hands the message to that loop; there it is
+# put on a bounded queue per client and every client has its own sender task, so
+# clients are written to concurrently and one slow screen never holds up the
+# others or the recognizer. A client whose queue fills up, or whose send takes
+# longer than the timeout, is closed and dropped.
+# =============================================================================
+import asyncio
+import os
+import time
+from collections import deque
+
+import Speech_Metrics as metrics
+
+BROADCAST_QUEUE_SIZE = int(os.environ.get("BROADCAST_QUEUE_SIZE", 64))
+BROADCAST_SEND_TIMEOUT = float(os.environ.get("BROADCAST_SEND_TIMEOUT", 2.0))
+
+FAN_OUT_SECONDS = metrics.histogram("speech_broadcast_fan_out_seconds", "Time to queue one event for every client")
+DELIVERY_SECONDS = metrics.histogram("speech_broadcast_delivery_seconds", "Time from publish() to the event being written to a client")
+
+class ClientChannel:
+    def __init__(self, websocket, max_queue):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.task = None
+
+class Broadcaster:
+    def __init__(self, max_queue=BROADCAST_QUEUE_SIZE, send_timeout=BROADCAST_SEND_TIMEOUT,
+                 latency_samples=1000):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.loop = None
+        self.clients = {}
+        # Seconds from publish() to the message being written to a client
+        self.latencies = deque(maxlen=latency_samples)
+        self.counts = {"published": 0, "sent": 0, "dropped_clients": 0}
+
+    # Called from the endpoint, on the server loop
+    def register(self, websocket):
+        self.loop = asyncio.get_running_loop()
+        channel = ClientChannel(websocket, self.max_queue)
+        channel.task = asyncio.create_task(self.sender(channel))
+        self.clients[websocket] = channel
+
+    def unregister(self, websocket):
+        channel = self.clients.pop(websocket, None)
+        if channel and channel.task is not asyncio.current_task():
+            channel.task.cancel()
+
+    # Safe from any thread; never waits on a socket
+    def publish(self, message):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        queued_at = time.perf_counter()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.fan_out(message, queued_at)
+        else:
+            loop.call_soon_threadsafe(self.fan_out, message, queued_at)
+
+    def fan_out(self, message, queued_at):
+        self.counts["published"] += 1
+        with FAN_OUT_SECONDS.timer():
+            for websocket, channel in list(self.clients.items()):
+                try:
+                    channel.queue.put_nowait((message, queued_at))
+                except asyncio.QueueFull:
+                    self.drop(websocket, "send queue full")
+
+    async def sender(self, channel):
+        websocket = channel.websocket
+        while True:
+            message, queued_at = await channel.queue.get()
+            try:
+                await asyncio.wait_for(websocket.send_json(message), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.drop(websocket, "send timed out")
+                return
+            except Exception as e:
+                self.drop(websocket, f"send failed: {e}")
+                return
+            latency = time.perf_counter() - queued_at
+            self.latencies.append(latency)
+            DELIVERY_SECONDS.observe(latency)
+            self.counts["sent"] += 1
+
+    def drop(self, websocket, reason):
+        if websocket not in self.clients:
+            return
+        self.unregister(websocket)
+        self.counts["dropped_clients"] += 1
+        print(f"Dropping WebSocket client ({reason})")
+        asyncio.ensure_future(self.close(websocket))
+
+    async def close(self, websocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013, reason="Client too slow"), self.send_timeout)
+        except Exception:
+            pass
+
+    def stats(self):
+        ordered = sorted(self.latencies)
+        def pct(p):
+            return round(1000 * ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3) if ordered else None
+        return {"clients": len(self.clients), **self.counts,
+                "latency_ms": {"p50": pct(50), "p95": pct(95), "max": pct(100)}}
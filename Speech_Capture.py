@@ -0,0 +1,110 @@
+# ============================ Microphone Capture Ring ============================
+# The audio callback copies each block once into a slot of a preallocated ring and
+# the recognition loop reads it back as a memoryview of that slot, so no bytes
+# object is created per block and memory never grows. The ring only holds
+# AUDIO_MAX_LAG_MS of audio; when decoding falls further behind than that the
+# overflow policy decides what goes:
+#   drop_oldest - discard the oldest unread block, keeping latency bounded (default)
+#   drop_newest - discard the incoming block, keeping what is already queued
+# A slot handed to the reader stays untouched until the next read() call.
+# =================================================================================
+import math
+import os
+import threading
+from collections import deque
+
+import Speech_Metrics as metrics
+
+AUDIO_BLOCK_MS = float(os.environ.get("AUDIO_BLOCK_MS", 250))
+AUDIO_MAX_LAG_MS = float(os.environ.get("AUDIO_MAX_LAG_MS", 2000))
+AUDIO_OVERFLOW = os.environ.get("AUDIO_OVERFLOW", "drop_oldest")
+# Passed to sounddevice: "low", "high" or seconds
+AUDIO_LATENCY = os.environ.get("AUDIO_LATENCY", "low")
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+
+RING_DROPPED_BLOCKS = metrics.counter("speech_audio_ring_dropped_blocks_total",
+                                      "Blocks discarded because the capture ring was full", ["policy"])
+
+def device_latency(value=AUDIO_LATENCY):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+class AudioRing:
+    def __init__(self, block_bytes, max_blocks, overflow=AUDIO_OVERFLOW):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"AUDIO_OVERFLOW must be one of {OVERFLOW_POLICIES}, not {overflow!r}")
+        self.block_bytes = block_bytes
+        self.max_blocks = max(1, max_blocks)
+        self.overflow = overflow
+        # One extra slot for the block the reader is still working on
+        slots = self.max_blocks + 1
+        self.view = memoryview(bytearray(block_bytes * slots))
+        self.lengths = [0] * slots
+        self.free = deque(range(slots))
+        self.ready = deque()
+        self.held = None
+        self.cond = threading.Condition()
+        self.dropped = RING_DROPPED_BLOCKS.labels(policy=overflow)
+        self.counts = {"written": 0, "dropped": 0}
+
+    # Called from the audio callback; never allocates and never waits on the reader
+    def write(self, data):
+        with self.cond:
+            if self.free and len(self.ready) < self.max_blocks:
+                slot = self.free.popleft()
+            elif self.overflow == "drop_oldest" and self.ready:
+                slot = self.ready.popleft()
+                self.drop()
+            else:
+                self.drop()
+                return False
+        # The slot belongs to neither list now, so it is filled outside the lock
+        size = min(len(data), self.block_bytes)
+        start = slot * self.block_bytes
+        self.view[start:start + size] = memoryview(data).cast("B")[:size]
+        with self.cond:
+            self.lengths[slot] = size
+            self.ready.append(slot)
+            self.counts["written"] += 1
+            self.cond.notify()
+        return True
+
+    def drop(self):
+        self.counts["dropped"] += 1
+        self.dropped.inc()
+
+    # Returns a view of the next block (valid until the next read) or None on timeout
+    def read(self, timeout=None):
+        with self.cond:
+            if self.held is not None:
+                self.free.append(self.held)
+                self.held = None
+            if not self.ready and not self.cond.wait_for(lambda: self.ready, timeout):
+                return None
+            slot = self.ready.popleft()
+            self.held = slot
+            size = self.lengths[slot]
+        start = slot * self.block_bytes
+        return self.view[start:start + size]
+
+    def depth(self):
+        return len(self.ready)
+
+# Sizes the ring for a stream: block frames from AUDIO_BLOCK_MS, slots from AUDIO_MAX_LAG_MS
+def create_ring(sample_rate, sample_width=2, channels=1, block_ms=AUDIO_BLOCK_MS,
+                max_lag_ms=AUDIO_MAX_LAG_MS, overflow=AUDIO_OVERFLOW):
+    block_frames = max(1, int(sample_rate * block_ms / 1000))
+    max_blocks = max(1, math.ceil(max_lag_ms / block_ms))
+    return block_frames, AudioRing(block_frames * sample_width * channels, max_blocks, overflow)
+
+# KaldiRecognizer hands its argument to a cffi "const char *", which takes bytes or
+# cdata but not a memoryview; wrap the view instead of copying it
+def waveform_buffer(view):
+    try:
+        from vosk import _ffi
+    except ImportError:
+        return bytes(view)
+    return _ffi.from_buffer(view)
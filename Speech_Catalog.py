@@ -0,0 +1,114 @@
+# ============================== Drink Catalog ==============================
+# Prices and ingredients come from one query against "drinkdata". The last good
+# result is kept as a versioned snapshot file, so startup applies it instantly
+# (and offline) while a background thread refreshes from Supabase. Listeners get
+# the whole new snapshot at once and swap their tables in one step.
+# ===========================================================================
+import hashlib
+import json
+import os
+import threading
+import time
+
+CATALOG_SNAPSHOT = os.environ.get("CATALOG_SNAPSHOT", "catalog_snapshot.json")
+CATALOG_REFRESH_SECONDS = float(os.environ.get("CATALOG_REFRESH_SECONDS", 300))
+
+def parse_ingredients(ing):
+    if isinstance(ing, str):
+        ing = ing.strip("{}").split(",")
+    if not isinstance(ing, list):
+        return []
+    return [i.strip().lower() for i in ing if isinstance(i, str) and i.strip()]
+
+def fetch_catalog(client):
+    response = client.table("drinkdata").select("drink_name,price,ingredients").execute()
+    drinks = []
+    for item in response.data:
+        name = (item.get("drink_name") or "").lower()
+        if name:
+            drinks.append({
+                "name": name,
+                "price": item.get("price", 0),
+                "ingredients": parse_ingredients(item.get("ingredients")),
+            })
+    return drinks
+
+def catalog_hash(drinks):
+    return hashlib.sha256(json.dumps(drinks, sort_keys=True).encode("utf-8")).hexdigest()
+
+class Catalog:
+    # get_client is called lazily so startup never waits on building the client
+    def __init__(self, get_client, snapshot_path=CATALOG_SNAPSHOT, on_change=None,
+                 refresh_interval=CATALOG_REFRESH_SECONDS):
+        self.get_client = get_client
+        self.snapshot_path = snapshot_path
+        self.on_change = on_change or (lambda snapshot: None)
+        self.refresh_interval = refresh_interval
+        self.snapshot = {"version": 0, "hash": None, "fetched_at": None, "drinks": []}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print("Error reading catalog snapshot:", str(e))
+            return False
+        with self.lock:
+            self.snapshot = snapshot
+        print(f"Catalog snapshot v{snapshot['version']} loaded ({len(snapshot['drinks'])} drinks).")
+        self.on_change(snapshot)
+        return True
+
+    def save_snapshot(self, snapshot):
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.snapshot_path)
+
+    # Returns True when the catalog changed; on failure the current menu stays in place
+    def refresh(self):
+        try:
+            drinks = fetch_catalog(self.get_client())
+        except Exception as e:
+            print("Error fetching catalog from Supabase:", str(e))
+            return False
+        digest = catalog_hash(drinks)
+        with self.lock:
+            if digest == self.snapshot["hash"]:
+                return False
+            snapshot = {
+                "version": self.snapshot["version"] + 1,
+                "hash": digest,
+                "fetched_at": time.time(),
+                "drinks": drinks,
+            }
+            self.snapshot = snapshot
+        try:
+            self.save_snapshot(snapshot)
+        except OSError as e:
+            print("Error writing catalog snapshot:", str(e))
+        print(f"Catalog updated to v{snapshot['version']} ({len(drinks)} drinks).")
+        self.on_change(snapshot)
+        return True
+
+    def start(self):
+        if not self.load_snapshot():
+            self.refresh()
+        else:
+            self.wake.set()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def trigger_refresh(self):
+        self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.refresh_interval)
+            self.wake.clear()
+            self.refresh()
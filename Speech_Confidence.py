@@ -0,0 +1,133 @@
+# ======================== Confirmation Skipping Policy ========================
+# Decides whether a slot heard in one utterance is certain enough to take
+# without a "did you mean ...?" turn. Three signals have to agree:
+#   - the fuzzy matcher's score for the phrase it picked (CONFIRM_MIN_MATCH_SCORE)
+#   - Vosk's per-word confidence for the words of that phrase (CONFIRM_MIN_WORD_CONF)
+#   - with RECOGNIZER_ALTERNATIVES > 0, the n-best list: the best alternative that
+#     reads as a different slot must trail the top one by CONFIRM_NBEST_MARGIN
+# Vosk drops the per-word "conf" once n-best is on, so each run has one acoustic
+# signal or the other; a result with neither is never taken unconfirmed. Early
+# commits from partial transcripts carry no evidence and always get confirmed.
+#
+# Every decision prints a "[Confidence]" line; benchmarks/tune_confirmation.py
+# sweeps the thresholds over recorded clips.
+# ==============================================================================
+import os
+
+CONFIRM_SKIP = os.environ.get("CONFIRM_SKIP", "1") == "1"
+CONFIRM_MIN_WORD_CONF = float(os.environ.get("CONFIRM_MIN_WORD_CONF", 0.9))
+CONFIRM_MIN_MATCH_SCORE = float(os.environ.get("CONFIRM_MIN_MATCH_SCORE", 95))
+# In Vosk's n-best "confidence" units (lattice log-likelihood), not a probability
+CONFIRM_NBEST_MARGIN = float(os.environ.get("CONFIRM_NBEST_MARGIN", 2.0))
+RECOGNIZER_ALTERNATIVES = int(os.environ.get("RECOGNIZER_ALTERNATIVES", 0))
+
+class Evidence:
+    def __init__(self, text, words=(), alternatives=(), heard=None):
+        self.text = text
+        # Top transcript as the recognizer wrote it, "[unk]" tokens included
+        self.heard = text if heard is None else heard
+        # Vosk word entries: {"word", "start", "end"} plus "conf" without n-best
+        self.words = list(words)
+        # (normalized text, confidence), best first
+        self.alternatives = list(alternatives)
+
+    def word_confidences(self):
+        return [(w["word"], w["conf"]) for w in self.words if "conf" in w]
+
+# Accepts both result shapes: {"text", "result"} and {"alternatives": [{"text", "confidence", "result"}]}
+def evidence_from_result(result, normalize):
+    if "alternatives" in result:
+        alternatives = [(normalize(alt.get("text", "")), float(alt.get("confidence", 0.0)))
+                        for alt in result["alternatives"]]
+        top = result["alternatives"][0] if result["alternatives"] else {}
+        return Evidence(alternatives[0][0] if alternatives else "", top.get("result", []), alternatives,
+                        top.get("text", ""))
+    return Evidence(normalize(result.get("text", "")), result.get("result", []), heard=result.get("text", ""))
+
+# Lowest word confidence over the longest of `phrases` heard word for word, None if none was
+def phrase_confidence(word_confs, phrases):
+    words = [word for word, _ in word_confs]
+    for target in sorted((phrase.split() for phrase in phrases), key=len, reverse=True):
+        for start in range(len(words) - len(target) + 1):
+            if words[start:start + len(target)] == target:
+                return min(conf for _, conf in word_confs[start:start + len(target)])
+    return None
+
+class ConfirmationPolicy:
+    def __init__(self, enabled=CONFIRM_SKIP, min_word_conf=CONFIRM_MIN_WORD_CONF,
+                 min_match_score=CONFIRM_MIN_MATCH_SCORE, nbest_margin=CONFIRM_NBEST_MARGIN):
+        self.enabled = enabled
+        self.min_word_conf = min_word_conf
+        self.min_match_score = min_match_score
+        self.nbest_margin = nbest_margin
+
+    # Returns (auto_confirm, details) for `label` picked from the evidence text in `category`
+    def decide(self, evidence, category, label, matcher):
+        details = {"category": category, "label": label}
+        if not self.enabled or evidence is None:
+            return False, details
+        matched, score = matcher.scored_match(evidence.text, category)
+        details["score"] = score
+        if matched != label or score < self.min_match_score:
+            return False, details
+
+        word_confs = evidence.word_confidences()
+        if word_confs:
+            conf = phrase_confidence(word_confs, matcher.phrases_for(category, label))
+            details["word_conf"] = conf
+            if conf is None or conf < self.min_word_conf:
+                return False, details
+        elif len(evidence.alternatives) < 2:
+            # No acoustic signal at all, the fuzzy score alone is not enough
+            return False, details
+
+        if len(evidence.alternatives) > 1:
+            top = evidence.alternatives[0][1]
+            rival = next((conf for text, conf in evidence.alternatives[1:]
+                          if matcher.scored_match(text, category)[0] != label), None)
+            margin = top - rival if rival is not None else float("inf")
+            details["margin"] = margin
+            if margin < self.nbest_margin:
+                return False, details
+        return True, details
+
+    # For answers carrying several slots at once: every word must be certain and
+    # no alternative reading may come close
+    def decide_utterance(self, evidence):
+        details = {"category": "Utterance"}
+        if not self.enabled or evidence is None or not evidence.text:
+            return False, details
+        word_confs = evidence.word_confidences()
+        if word_confs:
+            conf = min(conf for _, conf in word_confs)
+            details["word_conf"] = conf
+            if conf < self.min_word_conf:
+                return False, details
+        elif len(evidence.alternatives) < 2:
+            return False, details
+        if len(evidence.alternatives) > 1:
+            top_text, top = evidence.alternatives[0]
+            rival = next((conf for text, conf in evidence.alternatives[1:] if text != top_text), None)
+            margin = top - rival if rival is not None else float("inf")
+            details["margin"] = margin
+            if margin < self.nbest_margin:
+                return False, details
+        return True, details
+
+    def confident(self, evidence, category, label, matcher):
+        auto, details = self.decide(evidence, category, label, matcher)
+        if evidence is not None and self.enabled:
+            print(f"[Confidence] {format_details(details)} -> {'auto' if auto else 'confirm'}")
+        return auto
+
+    def confident_utterance(self, evidence):
+        auto, details = self.decide_utterance(evidence)
+        if evidence is not None and self.enabled:
+            print(f"[Confidence] {format_details(details)} -> {'auto' if auto else 'confirm'}")
+        return auto
+
+def format_details(details):
+    parts = []
+    for key, value in details.items():
+        parts.append(f"{key}={value:.3g}" if isinstance(value, float) else f"{key}={value}")
+    return " ".join(parts)
@@ -0,0 +1,105 @@
+# ======================== Endpointing Profiles Per Step ========================
+# How much trailing silence ends an utterance depends on what the dialog is
+# waiting for: a "yes" is over the moment it is said, a drink name can have a
+# pause in the middle ("iced ... latte"). Each expected category gets its own
+# endpointer delays, switched on the recognizer together with the grammar:
+#   start_max  - silence before any speech after which the segment is given up (Kaldi rule1)
+#   end        - trailing silence after a confident final (rule2; Vosk derives the
+#                waits for less certain finals from it)
+#   max_length - longest utterance before it is cut (rule5)
+# The VAD gate's hangover follows the same profile, ENDPOINT_VAD_MARGIN longer than
+# `end`, so the gate only flushes when Kaldi itself has not endpointed.
+#
+#   ENDPOINTING=1
+#   ENDPOINT_PROFILES=YesNo=0.3,Size=0.4,Drink=0.8        end only
+#   ENDPOINT_PROFILES=YesNo=5:0.3:10,Drink=5:0.8:20       start_max:end:max_length
+# Categories without a profile get Vosk's defaults (5:0.5:20), which with the
+# margin is the gate's usual 800 ms hangover.
+#
+# SetEndpointerDelays only exists in newer Vosk releases; with an older one the
+# recognizer keeps its defaults and only the VAD hangover changes per step.
+# Speech_Replay.py reports the endpoint delay per category, and
+# benchmarks/bench_endpointing.py compares a set of profiles against none.
+# ===============================================================================
+import os
+
+from Speech_Models import parse_mapping
+
+ENDPOINTING = os.environ.get("ENDPOINTING", "1") == "1"
+ENDPOINT_PROFILES_SPEC = os.environ.get("ENDPOINT_PROFILES", "YesNo=0.3,Size=0.4,Drink=0.8")
+ENDPOINT_VAD_MARGIN = float(os.environ.get("ENDPOINT_VAD_MARGIN", 0.3))
+
+class EndpointProfile:
+    def __init__(self, start_max=5.0, end=0.5, max_length=20.0):
+        self.start_max = start_max
+        self.end = end
+        self.max_length = max_length
+
+    def __eq__(self, other):
+        return isinstance(other, EndpointProfile) and self.delays() == other.delays()
+
+    def delays(self):
+        return self.start_max, self.end, self.max_length
+
+    def __repr__(self):
+        return f"{self.start_max:g}:{self.end:g}:{self.max_length:g}"
+
+DEFAULT_PROFILE = EndpointProfile()
+
+def parse_profiles(spec):
+    profiles = {}
+    for category, value in parse_mapping(spec).items():
+        parts = [float(part) for part in value.split(":")]
+        if len(parts) == 1:
+            profiles[category] = EndpointProfile(end=parts[0])
+        elif len(parts) == 3:
+            profiles[category] = EndpointProfile(*parts)
+        else:
+            raise ValueError(f"ENDPOINT_PROFILES entry {category}={value!r} is neither end nor start_max:end:max_length")
+    return profiles
+
+ENDPOINT_PROFILES = parse_profiles(ENDPOINT_PROFILES_SPEC)
+
+_supported = None
+
+# Asked of the installed vosk, not of the recognizer: a worker-pool proxy always has the method
+def endpointer_supported():
+    global _supported
+    if _supported is None:
+        try:
+            from vosk import KaldiRecognizer
+        except ImportError:
+            _supported = False
+        else:
+            _supported = hasattr(KaldiRecognizer, "SetEndpointerDelays")
+        if not _supported and ENDPOINTING:
+            print("[Endpointing] This vosk has no SetEndpointerDelays, only the VAD hangover follows the dialog step")
+    return _supported
+
+# Keeps one recognizer (and its VAD gate) on the profile of the step the dialog is
+# waiting for; call apply() wherever the grammar is switched
+class EndpointSwitcher:
+    def __init__(self, vad_gate=None, profiles=None, enabled=ENDPOINTING, vad_margin=ENDPOINT_VAD_MARGIN):
+        self.vad_gate = vad_gate
+        self.profiles = ENDPOINT_PROFILES if profiles is None else profiles
+        self.enabled = enabled
+        self.vad_margin = vad_margin
+        self.current = None
+
+    def apply(self, recognizer, category):
+        profile = self.profiles.get(category, DEFAULT_PROFILE)
+        # Until a profile has been applied the recognizer is on the model's own settings
+        if not self.enabled or profile == (self.current or DEFAULT_PROFILE):
+            return False
+        if endpointer_supported():
+            recognizer.SetEndpointerDelays(*profile.delays())
+        if self.vad_gate is not None:
+            self.vad_gate.set_hangover(profile.end + self.vad_margin)
+        self.current = profile
+        return True
+
+    # Longest silence after the last word before this recognizer finalizes an utterance
+    # on the current step: Kaldi's trailing silence, or the VAD gate's hangover
+    def trailing_silence(self):
+        profile = self.current or DEFAULT_PROFILE
+        return profile.end + (self.vad_margin if self.vad_gate is not None else 0.0)
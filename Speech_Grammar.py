@@ -0,0 +1,51 @@
+# ============================ Step-Aware Grammars ============================
+# Vosk phrase-list grammars generated from the loaded keyword tables. Each dialog
+# step only decodes against the phrases it can act on, plus "[unk]" so anything
+# else collapses into one garbage token instead of a random in-vocabulary word.
+# =============================================================================
+import json
+import os
+
+UNK = "[unk]"
+CONSTRAINED_GRAMMAR = os.environ.get("CONSTRAINED_GRAMMAR", "1") == "1"
+
+# What a step grammar could not place comes out as "[unk]"; it has no words to match
+def strip_unk(text):
+    return text.replace(UNK, " ")
+
+# extra_phrases adds words a step may hear besides its own keywords, e.g. the
+# sizes and ingredients of a one-shot order while the drink is being asked for
+def build_grammars(keywords, trigger_keywords=(), extra_phrases=None):
+    grammars = {}
+    for category, labels in keywords.items():
+        phrases = [kw for kw_list in labels.values() for kw in kw_list]
+        phrases += (extra_phrases or {}).get(category, [])
+        grammars[category] = json.dumps(list(dict.fromkeys(phrases)) + [UNK])
+    if trigger_keywords:
+        grammars["Trigger"] = json.dumps(list(dict.fromkeys(trigger_keywords)) + [UNK])
+    return grammars
+
+# Keeps one recognizer on the grammar of the step the dialog is waiting for.
+# Vosk only accepts a new grammar between utterances, so call apply() right
+# after a final result has been handled.
+class GrammarSwitcher:
+    def __init__(self, grammars, enabled=CONSTRAINED_GRAMMAR):
+        self.grammars = grammars
+        self.enabled = enabled
+        self.current = None
+
+    def initial(self, category):
+        if not self.enabled:
+            return None
+        self.current = self.grammars.get(category)
+        return self.current
+
+    # Compares grammar text, not the category name, so a catalog reload that
+    # changes the phrase list is picked up on the next call
+    def apply(self, recognizer, category):
+        grammar = self.grammars.get(category)
+        if not self.enabled or grammar is None or grammar == self.current:
+            return False
+        recognizer.SetGrammar(grammar)
+        self.current = grammar
+        return True
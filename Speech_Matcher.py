@@ -0,0 +1,117 @@
+# ========================== Keyword Matching Index ==========================
+# Built once per catalog load. Every category is flattened into parallel
+# label / phrase / word-count arrays and scored in one rapidfuzz cdist call;
+# the "is this speech at all" gate runs an Aho-Corasick automaton over all
+# phrases, so both stay flat as the drink catalog grows.
+# ============================================================================
+from collections import deque
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+class SubstringAutomaton:
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.match = [False]
+        for pattern in patterns:
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.match.append(False)
+                state = nxt
+            self.match[state] = True
+
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, nxt in self.goto[state].items():
+                pending.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                self.match[nxt] = self.match[nxt] or self.match[self.fail[nxt]]
+
+    def contains_any(self, text):
+        goto, fail, match = self.goto, self.fail, self.match
+        state = 0
+        if match[0]:
+            return True
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if match[state]:
+                return True
+        return False
+
+class KeywordMatcher:
+    def __init__(self, keywords, trigger_keywords=()):
+        self.choices = {}
+        patterns = list(trigger_keywords)
+        for category, table in keywords.items():
+            labels = [label for label, kw_list in table.items() for _ in kw_list]
+            phrases = [kw for kw_list in table.values() for kw in kw_list]
+            lengths = np.array([len(kw.split()) for kw in phrases], dtype=np.int64)
+            self.choices[category] = (labels, phrases, lengths)
+            patterns += phrases
+        if trigger_keywords:
+            self.choices["Trigger"] = (["Trigger"] * len(trigger_keywords), list(trigger_keywords),
+                                       np.array([len(kw.split()) for kw in trigger_keywords], dtype=np.int64))
+        self.automaton = SubstringAutomaton(patterns)
+        # Phrases that are the first words of a longer phrase ("latte" / "latte macchiato")
+        self.extendable = {
+            category: {p for p in phrases if any(o.startswith(p + " ") for o in phrases)}
+            for category, (_, phrases, _) in self.choices.items()
+        }
+
+    # Same result as scanning label by label: highest partial_ratio wins, ties
+    # go to the phrase with more words, then to the earliest phrase.
+    def best_match(self, text, category, threshold=80):
+        return self.scored_match(text, category, threshold)[0]
+
+    # (label, score) of the best match; label is None below threshold
+    def scored_match(self, text, category, threshold=80):
+        labels, phrases, lengths = self.choices[category]
+        if not phrases:
+            return None, 0.0
+        scores = process.cdist([text], phrases, scorer=fuzz.partial_ratio, dtype=np.float64)[0]
+        best = scores.max()
+        if best < threshold:
+            return None, float(best)
+        tied = np.flatnonzero(scores == best)
+        return labels[tied[np.argmax(lengths[tied])]], float(best)
+
+    def phrases_for(self, category, label):
+        labels, phrases, _ = self.choices[category]
+        return [phrase for phrase_label, phrase in zip(labels, phrases) if phrase_label == label]
+
+    # Strict match for acting on a partial transcript: a phrase must appear word for
+    # word, every phrase found must agree on the label, and a phrase that could still
+    # grow into a longer one must not be the last thing said
+    def confident_match(self, text, category):
+        if category not in self.choices:
+            return None
+        labels, phrases, _ = self.choices[category]
+        padded = f" {text} "
+        hits = [(label, phrase) for label, phrase in zip(labels, phrases) if f" {phrase} " in padded]
+        found = set()
+        for label, phrase in hits:
+            # "latte" inside a heard "iced latte" is not a match of its own
+            if any(other != phrase and f" {phrase} " in f" {other} " for _, other in hits):
+                continue
+            if phrase in self.extendable[category] and padded.endswith(f" {phrase} "):
+                return None
+            found.add(label)
+        return found.pop() if len(found) == 1 else None
+
+    def is_valid(self, text):
+        if not text:
+            return False
+        return self.automaton.contains_any(text)
@@ -0,0 +1,199 @@
+# ============================== Pipeline Metrics ==============================
+# Histograms, counters and gauges for every stage of a turn, rendered in the
+# Prometheus text format on /metrics. Metrics are module-level objects created
+# where they are observed; with METRICS=0 observe()/inc() return straight away
+# and timer() hands back a shared no-op context, so the hot loop pays a call.
+# ==============================================================================
+import os
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_ENABLED = os.environ.get("METRICS", "1") == "1"
+
+# Seconds; fine at the bottom for per-chunk decode and matcher calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = NullTimer()
+
+class Timer:
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metric.observe(time.perf_counter() - self.started)
+        return False
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=(), enabled=METRICS_ENABLED):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.children = {}
+        self.label_values = ()
+
+    # metric.labels(source="kiosk").observe(...); children are created once and reused
+    def labels(self, **labels):
+        values = tuple(str(labels[name]) for name in self.labelnames)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self.new_child()
+                    child.label_values = values
+                    self.children[values] = child
+        return child
+
+    def series(self):
+        if self.labelnames:
+            return sorted(self.children.items())
+        return [((), self)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.series():
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.value = 0
+
+    def new_child(self):
+        return Counter(self.name, self.help, enabled=self.enabled)
+
+    def inc(self, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}{format_labels(labelnames, values)} {format_value(self.value)}"]
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, function=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.value = 0
+        # Read only when scraped, e.g. a queue's qsize, so it costs nothing per block
+        self.function = function
+
+    def new_child(self):
+        return Gauge(self.name, self.help, enabled=self.enabled)
+
+    def set(self, value):
+        if self.enabled:
+            self.value = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self, name, labelnames, values):
+        value = self.function() if self.function else self.value
+        return [f"{name}{format_labels(labelnames, values)} {format_value(value)}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def new_child(self):
+        return Histogram(self.name, self.help, buckets=self.buckets, enabled=self.enabled)
+
+    def observe(self, value):
+        if not self.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def timer(self):
+        return Timer(self) if self.enabled else NULL_TIMER
+
+    def samples(self, name, labelnames, values):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = format_labels(labelnames, values, [("le", format_value(float(bound)))])
+            lines.append(f"{name}_bucket{le} {cumulative}")
+        labels = format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    # Returns the existing metric when both apps' modules ask for the same name
+    def register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def histogram(name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(name, help, labelnames, buckets=buckets))
+
+def counter(name, help, labelnames=()):
+    return registry.register(Counter(name, help, labelnames))
+
+def gauge(name, help, labelnames=(), function=None):
+    return registry.register(Gauge(name, help, labelnames, function=function))
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def render_metrics():
+    return registry.render()
@@ -0,0 +1,204 @@
+# ============================== Speech Model Registry ==============================
+# One Vosk model per language, loaded the first time a recognizer needs it and
+# shared by every recognizer after that. Models nobody is decoding with are
+# unloaded, least recently used first, once loading another one would go over
+# the memory budget, and on their own after sitting idle for a while. The
+# default language is loaded at startup and never unloaded.
+#
+#   SPEECH_MODELS=en=vosk-model-small-en-us-0.15,vi=vosk-model-small-vn-0.4
+#   SPEECH_LANGUAGE=en             language of sessions that do not pick one
+#   MODEL_MEMORY_MB=0              budget for loaded models per process, 0 = none
+#   MODEL_IDLE_SECONDS=600         unload a model unused this long, 0 = never
+#   LANGUAGE_TRIGGERS=vietnamese=vi,english=en   words that switch a session's language
+#                                  (only to one the dialog has tables for, DIALOG_LANGUAGES)
+#
+# A model is in use while any recognizer opened on it is alive. Its size is the
+# size of its directory: Kaldi reads the graph and acoustic model into memory
+# whole, so that is close to what it costs resident. Vosk refcounts models
+# internally, so unloading one here never pulls it from under a live recognizer.
+# ==================================================================================
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from Speech_Resample import model_sample_rate
+
+def parse_mapping(spec):
+    mapping = {}
+    for item in spec.split(","):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            mapping[key.strip()] = value.strip()
+    return mapping
+
+SPEECH_MODELS = parse_mapping(os.environ.get("SPEECH_MODELS", "en=vosk-model-small-en-us-0.15"))
+SPEECH_LANGUAGE = os.environ.get("SPEECH_LANGUAGE", next(iter(SPEECH_MODELS)))
+MODEL_MEMORY_MB = float(os.environ.get("MODEL_MEMORY_MB", 0))
+MODEL_IDLE_SECONDS = float(os.environ.get("MODEL_IDLE_SECONDS", 600))
+LANGUAGE_TRIGGERS = parse_mapping(os.environ.get("LANGUAGE_TRIGGERS", "vietnamese=vi,english=en"))
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def load_vosk_model(path):
+    from vosk import Model
+    return Model(path)
+
+def open_vosk_recognizer(model, sample_rate, grammar=None):
+    from vosk import KaldiRecognizer
+    if grammar:
+        recognizer = KaldiRecognizer(model, sample_rate, grammar)
+    else:
+        recognizer = KaldiRecognizer(model, sample_rate)
+    recognizer.SetWords(True)
+    return recognizer
+
+class LoadedModel:
+    def __init__(self, model, footprint):
+        self.model = model
+        self.footprint = footprint
+        self.users = 0
+        self.last_used = time.monotonic()
+
+class ModelRegistry:
+    def __init__(self, paths=None, default=SPEECH_LANGUAGE, budget_mb=MODEL_MEMORY_MB,
+                 idle_seconds=MODEL_IDLE_SECONDS, loader=load_vosk_model, opener=open_vosk_recognizer):
+        self.paths = dict(paths or SPEECH_MODELS)
+        if default not in self.paths:
+            raise ValueError(f"SPEECH_LANGUAGE={default!r} has no entry in SPEECH_MODELS")
+        self.default = default
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self.loader = loader
+        self.opener = opener
+        # Least recently used first
+        self.loaded = OrderedDict()
+        self.lock = threading.Lock()
+        # One load at a time per language; other languages keep being served meanwhile
+        self.load_locks = {language: threading.Lock() for language in self.paths}
+        self.sample_rates = {}
+
+    def languages(self):
+        return list(self.paths)
+
+    def resolve(self, language):
+        language = language or self.default
+        if language not in self.paths:
+            raise ValueError(f"No speech model configured for language {language!r}")
+        return language
+
+    def sample_rate(self, language=None):
+        language = self.resolve(language)
+        if language not in self.sample_rates:
+            self.sample_rates[language] = model_sample_rate(self.paths[language])
+        return self.sample_rates[language]
+
+    # Loads the model if needed and counts one user until release(); the user
+    # is taken under the lock so the model cannot be unloaded in between
+    def acquire(self, language=None):
+        language = self.resolve(language)
+        with self.lock:
+            entry = self.take(language)
+        if entry is None:
+            with self.load_locks[language]:
+                with self.lock:
+                    entry = self.take(language)
+                if entry is None:
+                    path = self.paths[language]
+                    footprint = directory_size(path)
+                    # Room is made first so two large models are never resident at once
+                    self.evict(incoming=footprint)
+                    if self.budget and self.memory_bytes() + footprint > self.budget:
+                        print(f"[Models] Loading {language} goes over MODEL_MEMORY_MB, the loaded models are all in use")
+                    started = time.perf_counter()
+                    model = self.loader(path)
+                    print(f"[Models] Loaded {language} from {path} ({footprint / 2**20:.0f} MB) "
+                          f"in {time.perf_counter() - started:.1f}s")
+                    entry = LoadedModel(model, footprint)
+                    with self.lock:
+                        self.loaded[language] = entry
+                        entry.users += 1
+        self.evict()
+        return entry
+
+    def take(self, language):
+        entry = self.loaded.get(language)
+        if entry is not None:
+            self.loaded.move_to_end(language)
+            entry.users += 1
+            entry.last_used = time.monotonic()
+        return entry
+
+    def release(self, entry):
+        with self.lock:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+
+    def preload(self, language=None):
+        self.release(self.acquire(language))
+
+    def create_recognizer(self, sample_rate, grammar=None, language=None):
+        entry = self.acquire(language)
+        try:
+            recognizer = self.opener(entry.model, sample_rate, grammar)
+        except Exception:
+            self.release(entry)
+            raise
+        weakref.finalize(recognizer, self.release, entry)
+        return recognizer
+
+    def evict(self, incoming=0):
+        now = time.monotonic()
+        evicted = []
+        with self.lock:
+            used = sum(entry.footprint for entry in self.loaded.values())
+            for language, entry in list(self.loaded.items()):
+                if entry.users or language == self.default:
+                    continue
+                over_budget = self.budget and used + incoming > self.budget
+                idle = self.idle_seconds and now - entry.last_used >= self.idle_seconds
+                if over_budget or idle:
+                    del self.loaded[language]
+                    used -= entry.footprint
+                    evicted.append(language)
+        for language in evicted:
+            print(f"[Models] Unloaded {language}")
+        return evicted
+
+    def loaded_languages(self):
+        with self.lock:
+            return list(self.loaded)
+
+    def memory_bytes(self):
+        with self.lock:
+            return sum(entry.footprint for entry in self.loaded.values())
+
+    def stats(self):
+        with self.lock:
+            return {language: {"users": entry.users, "mb": round(entry.footprint / 2**20, 1),
+                               "idle_seconds": round(time.monotonic() - entry.last_used, 1)}
+                    for language, entry in self.loaded.items()}
+
+# Language asked for in an utterance ("hey dispenser, vietnamese please"), only
+# among the languages that have a model
+def language_from_text(text, languages):
+    padded = f" {text} "
+    for phrase, language in LANGUAGE_TRIGGERS.items():
+        if language in languages and f" {phrase} " in padded:
+            return language
+    return None
+
+# Nothing to choose between with a single model, so no phrases then
+def trigger_phrases(languages):
+    if len(languages) < 2:
+        return []
+    return [phrase for phrase, language in LANGUAGE_TRIGGERS.items() if language in languages]
@@ -0,0 +1,74 @@
+# ================================ Order Feed ================================
+# Every completed order gets the next ID and goes into a bounded ring buffer of
+# recent orders. Readers ask for everything after the last ID they saw, so no
+# order is lost between polls; long-poll and SSE readers sleep on an asyncio
+# event that the recognition thread sets through the server loop.
+#
+# IDs start over at 1 in every process. The ETag carries the process's boot time
+# so one from before a restart never matches, and a reader asking for orders
+# after an ID the feed has not reached yet gets the whole buffer with missed=True.
+# ============================================================================
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+ORDER_FEED_SIZE = int(os.environ.get("ORDER_FEED_SIZE", 256))
+
+class OrderFeed:
+    def __init__(self, max_orders=ORDER_FEED_SIZE):
+        self.orders = deque(maxlen=max_orders)
+        self.last_id = 0
+        self.epoch = f"{time.time_ns():x}"
+        self.lock = threading.Lock()
+        self.loop = None
+        self.changed = None
+
+    def append(self, order):
+        with self.lock:
+            self.last_id += 1
+            entry = {"id": self.last_id, "created_at": time.time(), "order": order}
+            self.orders.append(entry)
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.wake)
+        return entry
+
+    def wake(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def latest(self):
+        with self.lock:
+            return self.orders[-1] if self.orders else None
+
+    # Returns (entries after order_id, missed) where missed means some of the
+    # requested orders already fell out of the ring buffer, or were handed out
+    # by an earlier process
+    def since(self, order_id):
+        with self.lock:
+            restarted = order_id > self.last_id
+            if restarted:
+                order_id = 0
+            entries = [entry for entry in self.orders if entry["id"] > order_id]
+            oldest = self.orders[0]["id"] if self.orders else self.last_id + 1
+        return entries, restarted or (order_id + 1 < oldest and order_id < self.last_id)
+
+    def etag(self):
+        return f'W/"{self.epoch}-{self.last_id}"'
+
+    async def wait_since(self, order_id, timeout):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.changed = asyncio.Event()
+        deadline = time.monotonic() + timeout
+        while True:
+            entries, missed = self.since(order_id)
+            remaining = deadline - time.monotonic()
+            if entries or missed or remaining <= 0:
+                return entries, missed
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
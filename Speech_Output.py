@@ -0,0 +1,147 @@
+# ============================ Speech Output Worker ============================
+# The dialog only enqueues prompts; one worker thread synthesizes (through the
+# prompt cache) and plays them in order. Playback is written in short blocks so
+# a prompt can be cancelled mid-sentence when the customer barges in.
+# ==============================================================================
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+from rapidfuzz import fuzz
+
+import Speech_Metrics as metrics
+from Speech_Grammar import UNK
+
+PLAYBACK_BLOCK_FRAMES = 1024
+
+PROMPT_WAIT_SECONDS = metrics.histogram("speech_prompt_wait_seconds", "Time from say() until the prompt starts playing")
+PLAYBACK_SECONDS = metrics.histogram("speech_playback_seconds", "Time spent playing one prompt")
+
+class Prompt:
+    def __init__(self, text):
+        self.text = text
+        self.done = threading.Event()
+        self.cancelled = False
+        self.queued_at = time.perf_counter()
+        self.finished_at = None
+
+def play_sound(sound, prompt):
+    import sounddevice as sd
+    sound = sound.set_sample_width(2)
+    samples = np.frombuffer(sound.raw_data, dtype=np.int16).reshape(-1, sound.channels)
+    with sd.OutputStream(samplerate=sound.frame_rate, channels=sound.channels, dtype='int16') as stream:
+        for start in range(0, len(samples), PLAYBACK_BLOCK_FRAMES):
+            if prompt.cancelled:
+                stream.abort()
+                return
+            stream.write(samples[start:start + PLAYBACK_BLOCK_FRAMES])
+
+# True when `words` appear in `sequence` in the same order, gaps allowed
+def in_order(words, sequence):
+    remaining = iter(sequence)
+    return all(word in remaining for word in words)
+
+class SpeechOutput:
+    def __init__(self, cache, play=play_sound, echo_tail=0.3, echo_threshold=90, echo_min_words=3):
+        self.cache = cache
+        self.play = play
+        self.echo_tail = echo_tail
+        self.echo_threshold = echo_threshold
+        self.echo_min_words = echo_min_words
+        self.prompts = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.current = None
+        self.last_prompt = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def say(self, text):
+        prompt = Prompt(text)
+        with self.lock:
+            self.pending += 1
+        self.prompts.put(prompt)
+        return prompt
+
+    def is_speaking(self):
+        with self.lock:
+            return self.pending > 0
+
+    # Barge-in: stop the prompt being played and drop everything still queued
+    def cancel(self):
+        with self.lock:
+            if self.current is not None:
+                self.current.cancelled = True
+        while True:
+            try:
+                prompt = self.prompts.get_nowait()
+            except queue.Empty:
+                break
+            prompt.cancelled = True
+            self.finish(prompt)
+
+    # Transcript of our own prompt leaking back into the microphone. Pass the text as
+    # the recognizer wrote it: a step grammar projects a prompt onto the few words it
+    # knows ("[unk] yes [unk] no" for "... please say yes or no"), so a transcript with
+    # "[unk]" stretches whose words all come from the prompt, in order, is echo.
+    # Otherwise it takes the whole prompt, or a run of several of its words; a short
+    # answer on its own ("yes", "l") that merely occurs in the prompt is the customer
+    # barging in. `tail` is how long after a prompt ends its echo can still come out
+    # of the recognizer, i.e. the trailing silence the endpointer waits for.
+    def is_echo(self, text, tail=0.0):
+        tokens = re.sub(r"[^\w\s\[\]]", " ", text.lower()).split()
+        words = [token for token in tokens if token != UNK]
+        projected = len(words) < len(tokens)
+        text = " ".join(words)
+        with self.lock:
+            candidates = [p for p in (self.current, self.last_prompt) if p is not None]
+        now = time.monotonic()
+        long_enough = len(words) >= self.echo_min_words
+        for prompt in candidates:
+            if prompt.finished_at is not None and now - prompt.finished_at > max(self.echo_tail, tail):
+                continue
+            prompt_words = re.sub(r"[^\w\s]", " ", prompt.text.lower()).split()
+            if projected and words and in_order(words, prompt_words):
+                return True
+            prompt_text = " ".join(prompt_words)
+            if fuzz.ratio(text, prompt_text) >= self.echo_threshold:
+                return True
+            if long_enough and fuzz.partial_ratio(text, prompt_text) >= self.echo_threshold:
+                return True
+        return False
+
+    def wait_idle(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.is_speaking():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def finish(self, prompt):
+        prompt.finished_at = time.monotonic()
+        with self.lock:
+            self.pending -= 1
+            if self.current is prompt:
+                self.current = None
+            self.last_prompt = prompt
+        prompt.done.set()
+
+    def run(self):
+        while True:
+            prompt = self.prompts.get()
+            with self.lock:
+                self.current = prompt
+            try:
+                if not prompt.cancelled:
+                    sound = self.cache.get(prompt.text)
+                    if not prompt.cancelled:
+                        PROMPT_WAIT_SECONDS.observe(time.perf_counter() - prompt.queued_at)
+                        with PLAYBACK_SECONDS.timer():
+                            self.play(sound, prompt)
+            except Exception as e:
+                print("TTS Playback Error:", str(e))
+            finally:
+                self.finish(prompt)
@@ -0,0 +1,56 @@
+# ========================= Partial Results And Early Commit =========================
+# Vosk only hands out a final result after the endpointer has heard enough trailing
+# silence. Partials arrive every block, so they are published for live feedback and,
+# once a partial has held still for a couple of blocks and names exactly one
+# keyword of the step the dialog is waiting for, it is offered to the caller. Once
+# the caller has acted on it (accept()) the final result of that same utterance is
+# dropped, it was already handled. An offer turned down (noise, echo) leaves the
+# final result to be handled as usual. Steps whose answer can carry several slots
+# pass no category: "iced latte ... large with less sugar" only arrives whole in
+# the final result, so their partials are published but never committed.
+# ====================================================================================
+import os
+
+EARLY_COMMIT = os.environ.get("EARLY_COMMIT", "1") == "1"
+
+class PartialTracker:
+    def __init__(self, publish, confident_match, stable_blocks=2, enabled=EARLY_COMMIT):
+        self.publish = publish
+        self.confident_match = confident_match
+        self.stable_blocks = stable_blocks
+        self.enabled = enabled
+        self.last = ""
+        self.stable = 0
+        self.offered = False
+        self.committed = False
+
+    # Feed every non-final partial; returns the text to act on when it is safe to commit
+    # early. Each stable text is offered once, call accept() when the dialog acts on it
+    def partial(self, text, category):
+        if text != self.last:
+            self.last = text
+            self.stable = 1
+            self.offered = False
+            if text:
+                self.publish({"type": "partial", "text": text})
+        else:
+            self.stable += 1
+        if not self.enabled or category is None or self.committed or self.offered or not text \
+                or self.stable < self.stable_blocks:
+            return None
+        if self.confident_match(text, category) is None:
+            return None
+        self.offered = True
+        return text
+
+    def accept(self):
+        self.committed = True
+
+    # Call on every final result; True means this utterance was already handled early
+    def final(self):
+        committed = self.committed
+        self.last = ""
+        self.stable = 0
+        self.offered = False
+        self.committed = False
+        return committed
@@ -0,0 +1,191 @@
+# ========================== Write-Behind Order Persistence ==========================
+# The dialog only puts a finished order on a queue. A background writer appends it
+# to a local journal (flushed to disk) first, then upserts batches into Supabase
+# keyed by a per-order idempotency key, so a retried batch never creates
+# duplicates. Batches that fail are retried with backoff; whatever has not been
+# acknowledged when the process stops is replayed from the journal on next start.
+# The journal itself failing (disk full, read-only mount) does not stop the writer:
+# orders keep going to Supabase from memory, journal writes are retried with
+# backoff, and report(error) tells the app, which fails /ready until it recovers.
+#
+# Journal lines: {"type": "order", "record": {...}} and {"type": "ack", "keys": [...]}
+# ====================================================================================
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import Speech_Metrics as metrics
+
+ORDER_JOURNAL = os.environ.get("ORDER_JOURNAL", "orders_journal.jsonl")
+ORDER_TABLE = os.environ.get("ORDER_TABLE", "orders")
+ORDER_BATCH_SIZE = int(os.environ.get("ORDER_BATCH_SIZE", 50))
+ORDER_FLUSH_SECONDS = float(os.environ.get("ORDER_FLUSH_SECONDS", 1.0))
+
+JOURNAL_ERRORS = metrics.counter("speech_order_journal_errors_total", "Failed order journal operations", ["operation"])
+
+class OrderWriter:
+    def __init__(self, get_client, journal_path=ORDER_JOURNAL, table=ORDER_TABLE,
+                 batch_size=ORDER_BATCH_SIZE, flush_seconds=ORDER_FLUSH_SECONDS,
+                 max_backoff=60.0, compact_after=1000, report=None):
+        self.get_client = get_client
+        self.journal_path = journal_path
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_backoff = max_backoff
+        self.compact_after = compact_after
+        self.report = report
+        self.inbox = queue.Queue()
+        self.pending = {}
+        self.acked_lines = 0
+        self.thread = None
+        self.counts = {"submitted": 0, "written": 0, "failed_batches": 0, "journal_errors": 0}
+        # None while the journal is healthy; reported to the app whenever it changes
+        self.error = "Order journal not replayed yet"
+        self.journal_backoff = 0.0
+        self.journal_retry_at = 0.0
+
+    # Called from the dialog; never blocks
+    def submit(self, order, source):
+        record = {
+            "order_key": uuid.uuid4().hex,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "source": source,
+            "order": order,
+        }
+        self.inbox.put(record)
+        self.counts["submitted"] += 1
+        return record["order_key"]
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True, name="order-writer")
+            self.thread.start()
+        return self.thread
+
+    # ============================== Journal ==============================
+    def replay_journal(self):
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash mid-write
+            if entry["type"] == "order":
+                self.pending[entry["record"]["order_key"]] = entry["record"]
+            elif entry["type"] == "ack":
+                for key in entry["keys"]:
+                    self.pending.pop(key, None)
+        self.acked_lines = len(lines) - len(self.pending)
+        if self.pending:
+            print(f"Order journal: {len(self.pending)} orders not yet in Supabase, retrying.")
+
+    def append_journal(self, entries):
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Rewrites the journal with only the unacknowledged orders
+    def compact_journal(self):
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self.pending.values():
+                f.write(json.dumps({"type": "order", "record": record}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self.acked_lines = 0
+
+    # ============================== Writer ==============================
+    def collect(self, timeout):
+        records = []
+        try:
+            records.append(self.inbox.get(timeout=timeout))
+            while len(records) < self.batch_size:
+                records.append(self.inbox.get_nowait())
+        except queue.Empty:
+            pass
+        return records
+
+    def write_batch(self, records):
+        self.get_client().table(self.table).upsert(records, on_conflict="order_key").execute()
+
+    def set_error(self, error):
+        if error == self.error:
+            return
+        self.error = error
+        if self.report:
+            self.report(error)
+
+    # Runs one journal operation; an OSError is logged, counted and backs off the next attempt
+    def journal_call(self, operation, fn, *args):
+        try:
+            fn(*args)
+        except OSError as e:
+            JOURNAL_ERRORS.labels(operation=operation).inc()
+            self.counts["journal_errors"] += 1
+            self.journal_backoff = min(self.max_backoff, self.journal_backoff * 2 if self.journal_backoff else 1.0)
+            self.journal_retry_at = time.monotonic() + self.journal_backoff
+            print(f"Order journal {operation} failed, retrying in {self.journal_backoff:.0f}s:", str(e))
+            self.set_error(f"Order journal {operation} failed: {e}")
+            return False
+        self.journal_backoff = 0.0
+        self.set_error(None)
+        return True
+
+    def run(self):
+        try:
+            self.write_loop()
+        finally:
+            self.set_error("Order writer stopped")
+
+    def write_loop(self):
+        # Compacting over a journal that could not be read would lose its orders
+        while not self.journal_call("replay", self.replay_journal):
+            time.sleep(self.journal_backoff)
+        backoff = 0.0
+        retry_at = 0.0
+        unjournaled = []
+        while True:
+            new_records = self.collect(self.flush_seconds)
+            # Sent from memory even before they are journaled; a late order line
+            # after its ack only makes the next start upsert it once more
+            for record in new_records:
+                self.pending[record["order_key"]] = record
+            unjournaled += new_records
+            if unjournaled and time.monotonic() >= self.journal_retry_at:
+                if self.journal_call("append", self.append_journal, [{"type": "order", "record": r} for r in unjournaled]):
+                    unjournaled = []
+            # While the backend is failing, new orders are still journaled straight away
+            if not self.pending or time.monotonic() < retry_at:
+                continue
+
+            batch = list(self.pending.values())[:self.batch_size]
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                self.counts["failed_batches"] += 1
+                backoff = min(self.max_backoff, backoff * 2 if backoff else 1.0)
+                retry_at = time.monotonic() + backoff
+                print(f"Saving {len(batch)} orders failed, retrying in {backoff:.0f}s:", str(e))
+                continue
+            backoff = 0.0
+            keys = [record["order_key"] for record in batch]
+            # A lost ack only means these are upserted again after a restart
+            self.journal_call("ack", self.append_journal, [{"type": "ack", "keys": keys}])
+            for key in keys:
+                self.pending.pop(key, None)
+            self.counts["written"] += len(keys)
+            self.acked_lines += len(keys) + 1
+            if self.acked_lines >= self.compact_after and time.monotonic() >= self.journal_retry_at:
+                self.journal_call("compact", self.compact_journal)
@@ -0,0 +1,316 @@
+# ============================ Session Recording ============================
+# With RECORD_SESSIONS=1 every audio source writes what it heard and what the
+# dialog made of it into rotating segment files under RECORD_DIR:
+#   - the raw PCM blocks, as the capture ring (or the kiosk socket) hands them to
+#     the decoder, so blocks the ring dropped are missing here too
+#   - every Vosk result, verbatim
+#   - every dialog transition: the text handled and the step, pending_category
+#     and expected category it left the session in
+# plus the catalog in force, so Speech_Replay.py can run a capture back through
+# the recognizer and dialog offline and get the same results.
+#
+# The decode loops only put records on a bounded queue; a writer thread does the
+# encoding and file I/O. When the queue is full records are dropped and counted
+# rather than slowing recognition down, and the gap is noted in the capture.
+#
+#   RECORD_SESSIONS=0           turn recording on with 1
+#   RECORD_DIR=recordings
+#   RECORD_SEGMENT_MB=16        start a new segment after this many MB...
+#   RECORD_SEGMENT_SECONDS=600  ...or this many seconds
+#   RECORD_KEEP_SEGMENTS=64     oldest segments beyond this are deleted
+#   RECORD_QUEUE_SIZE=2000      records waiting for the writer before dropping
+#
+# Segment layout: MAGIC, then records of RECORD_HEADER (kind, stream, wall time,
+# payload length) followed by the payload. Each segment starts with the catalog
+# and a RESUME record for every stream still open, so it can be read on its own.
+# ===========================================================================
+import glob
+import itertools
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+import Speech_Metrics as metrics
+
+RECORD_SESSIONS = os.environ.get("RECORD_SESSIONS", "0") == "1"
+RECORD_DIR = os.environ.get("RECORD_DIR", "recordings")
+RECORD_SEGMENT_MB = float(os.environ.get("RECORD_SEGMENT_MB", 16))
+RECORD_SEGMENT_SECONDS = float(os.environ.get("RECORD_SEGMENT_SECONDS", 600))
+RECORD_KEEP_SEGMENTS = int(os.environ.get("RECORD_KEEP_SEGMENTS", 64))
+RECORD_QUEUE_SIZE = int(os.environ.get("RECORD_QUEUE_SIZE", 2000))
+
+MAGIC = b"VOSKREC1"
+RECORD_HEADER = struct.Struct("<BIdI")
+SEGMENT_SUFFIX = ".rec"
+
+# Record kinds
+CATALOG, OPEN, RESUME, AUDIO, RESULT, DIALOG, EOF, CLOSE, GAP = range(1, 10)
+KIND_NAMES = {CATALOG: "catalog", OPEN: "open", RESUME: "resume", AUDIO: "audio", RESULT: "result",
+              DIALOG: "dialog", EOF: "eof", CLOSE: "close", GAP: "gap"}
+
+# Settings that change what the recognizer or the dialog does with the same audio;
+# they are stored with each stream and put back by the replay
+REPLAY_SETTINGS = ("VAD", "RESAMPLE", "CONSTRAINED_GRAMMAR", "EARLY_COMMIT", "RECOGNIZER_ALTERNATIVES",
+                   "CONFIRM_SKIP", "CONFIRM_MIN_WORD_CONF", "CONFIRM_MIN_MATCH_SCORE",
+                   "CONFIRM_NBEST_MARGIN", "SPEECH_LANGUAGE", "LANGUAGE_TRIGGERS",
+                   "ENDPOINTING", "ENDPOINT_PROFILES", "ENDPOINT_VAD_MARGIN")
+
+RECORDS_WRITTEN = metrics.counter("speech_recording_records_total", "Records written to session captures")
+RECORDS_DROPPED = metrics.counter("speech_recording_dropped_records_total",
+                                  "Records dropped because the capture writer fell behind")
+
+# What the dialog looks like after a turn; copied on the decode thread because the session keeps changing
+def dialog_state(session, text, early=False):
+    state = {
+        "text": text,
+        "step": session.step,
+        "pending_category": session.pending_category,
+        "pending_value": session.pending_value,
+        "waiting_confirmation": session.waiting_confirmation,
+        "expected": session.expected_category(),
+        "drink": session.selected_drink,
+        "size": session.selected_size,
+        "components": dict(session.component_sizes),
+    }
+    if hasattr(session, "listening_for_trigger"):
+        state["listening_for_trigger"] = session.listening_for_trigger
+    if hasattr(session, "language"):
+        state["language"] = session.language
+    if early:
+        state["early"] = True
+    return state
+
+class SessionRecorder:
+    def __init__(self, directory=RECORD_DIR, enabled=RECORD_SESSIONS, segment_mb=RECORD_SEGMENT_MB,
+                 segment_seconds=RECORD_SEGMENT_SECONDS, keep_segments=RECORD_KEEP_SEGMENTS,
+                 queue_size=RECORD_QUEUE_SIZE):
+        self.directory = directory
+        self.enabled = enabled
+        self.segment_bytes = int(segment_mb * 1024 * 1024)
+        self.segment_seconds = segment_seconds
+        self.keep_segments = keep_segments
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.stream_ids = itertools.count(1)
+        # Sortable by start time, so segment names sort in recording order
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.counts = {"records": 0, "dropped": 0, "segments": 0}
+        self.thread = None
+        # Writer thread only
+        self.file = None
+        self.segment_index = 0
+        self.segment_started = 0.0
+        self.open_streams = {}
+        self.catalog_payload = None
+        self.dropped_seen = 0
+
+    def start(self):
+        if not self.enabled or self.thread is not None:
+            return self.thread
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, daemon=True, name="session-recorder")
+        self.thread.start()
+        print(f"[Recording] Capturing sessions to {os.path.abspath(self.directory)}")
+        return self.thread
+
+    # ========================= Decode-thread side =========================
+    # None of these block: they queue a record or count it as dropped
+    def put(self, kind, stream, payload):
+        try:
+            self.inbox.put_nowait((kind, stream, time.time(), payload))
+        except queue.Full:
+            self.counts["dropped"] += 1
+            RECORDS_DROPPED.inc()
+
+    # Returns the stream id the other calls take, None when recording is off
+    def open_stream(self, source, sample_rate, language=None):
+        if not self.enabled:
+            return None
+        stream = next(self.stream_ids)
+        settings = {name: os.environ[name] for name in REPLAY_SETTINGS if name in os.environ}
+        self.put(OPEN, stream, {"source": source, "sample_rate": sample_rate, "language": language,
+                                "run": self.run_id, "settings": settings})
+        return stream
+
+    def audio(self, stream, data):
+        if stream is not None:
+            # The caller's buffer is reused for the next block
+            self.put(AUDIO, stream, bytes(data))
+
+    def result(self, stream, raw_result):
+        if stream is not None:
+            self.put(RESULT, stream, raw_result)
+
+    def transition(self, stream, session, text, early=False):
+        if stream is not None:
+            self.put(DIALOG, stream, dialog_state(session, text, early))
+
+    # A result the loop threw away instead of handing to the dialog (playback echo)
+    def ignored(self, stream, text, reason):
+        if stream is not None:
+            self.put(DIALOG, stream, {"text": text, "ignored": reason})
+
+    def end_of_input(self, stream):
+        if stream is not None:
+            self.put(EOF, stream, b"")
+
+    def close_stream(self, stream):
+        if stream is not None:
+            self.put(CLOSE, stream, b"")
+
+    def catalog(self, snapshot):
+        if self.enabled:
+            self.put(CATALOG, 0, snapshot)
+
+    # ============================ Writer thread ============================
+    def run(self):
+        while True:
+            kind, stream, at, payload = self.inbox.get()
+            try:
+                self.handle(kind, stream, at, payload)
+                if self.inbox.empty() and self.file is not None:
+                    self.file.flush()
+            except OSError as e:
+                print("[Recording] Error writing capture:", str(e))
+                self.close_segment()
+
+    def handle(self, kind, stream, at, payload):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        elif not isinstance(payload, bytes):
+            payload = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        if self.file is None or self.file.tell() >= self.segment_bytes \
+                or at - self.segment_started >= self.segment_seconds:
+            self.rotate(at)
+        dropped = self.counts["dropped"]
+        if dropped != self.dropped_seen:
+            self.write(GAP, 0, at, json.dumps({"dropped": dropped - self.dropped_seen}).encode("utf-8"))
+            self.dropped_seen = dropped
+        self.write(kind, stream, at, payload)
+        # Repeated at the start of every later segment
+        if kind == OPEN:
+            self.open_streams[stream] = payload
+        elif kind == CLOSE:
+            self.open_streams.pop(stream, None)
+        elif kind == CATALOG:
+            self.catalog_payload = payload
+
+    def write(self, kind, stream, at, payload):
+        self.file.write(RECORD_HEADER.pack(kind, stream, at, len(payload)))
+        self.file.write(payload)
+        self.counts["records"] += 1
+        RECORDS_WRITTEN.inc()
+
+    def rotate(self, at):
+        self.close_segment()
+        self.segment_index += 1
+        path = os.path.join(self.directory, f"{self.run_id}-{self.segment_index:05d}{SEGMENT_SUFFIX}")
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.segment_started = at
+        self.counts["segments"] += 1
+        if self.catalog_payload is not None:
+            self.write(CATALOG, 0, at, self.catalog_payload)
+        for stream, meta in self.open_streams.items():
+            self.write(RESUME, stream, at, meta)
+        self.prune()
+
+    def close_segment(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+
+    def prune(self):
+        if self.keep_segments <= 0:
+            return
+        segments = sorted(glob.glob(os.path.join(self.directory, f"*{SEGMENT_SUFFIX}")))
+        for path in segments[:-self.keep_segments]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {**self.counts, "enabled": self.enabled, "queued": self.inbox.qsize()}
+
+# ============================== Reading ==============================
+# Yields (kind, stream, wall time, payload); a record cut short by a crash ends the segment
+def read_segment(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session capture")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            kind, stream, at, size = RECORD_HEADER.unpack(header)
+            payload = f.read(size)
+            if len(payload) < size:
+                return
+            yield kind, stream, at, payload
+
+def segment_paths(inputs):
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths += glob.glob(os.path.join(path, f"*{SEGMENT_SUFFIX}"))
+        else:
+            paths.append(path)
+    return sorted(paths)
+
+class CapturedStream:
+    def __init__(self, run, stream, meta, catalog, complete_start):
+        self.run = run
+        self.stream = stream
+        self.meta = meta
+        self.catalog = catalog
+        # False when the segments with the start of the session were rotated away
+        self.complete_start = complete_start
+        # (kind, wall time, payload) in recording order: AUDIO, RESULT, DIALOG, EOF and CATALOG
+        self.records = []
+        self.closed = False
+        self.gaps = 0
+
+    def name(self):
+        return f"{self.run}/{self.stream}"
+
+    def results(self):
+        return [payload.decode("utf-8") for kind, _, payload in self.records if kind == RESULT]
+
+    def transitions(self):
+        states = (json.loads(payload) for kind, _, payload in self.records if kind == DIALOG)
+        return [state for state in states if "ignored" not in state]
+
+# Groups the records of all segments by session, in order
+def load_capture(inputs):
+    streams = {}
+    for path in segment_paths(inputs):
+        run = os.path.basename(path).rsplit("-", 1)[0]
+        catalog = None
+        for kind, stream, at, payload in read_segment(path):
+            key = (run, stream)
+            if kind == CATALOG:
+                catalog = json.loads(payload)
+                # A refresh mid-session reaches the dialog at that point of the replay too
+                for captured in streams.values():
+                    if captured.run == run and not captured.closed:
+                        captured.records.append((kind, at, payload))
+            elif kind == GAP:
+                dropped = json.loads(payload)["dropped"]
+                for captured in streams.values():
+                    if captured.run == run and not captured.closed:
+                        captured.gaps += dropped
+            elif kind in (OPEN, RESUME):
+                if key not in streams:
+                    streams[key] = CapturedStream(run, stream, json.loads(payload), catalog, kind == OPEN)
+            elif key in streams:
+                if kind == CLOSE:
+                    streams[key].closed = True
+                else:
+                    streams[key].records.append((kind, at, payload))
+    return list(streams.values())
@@ -0,0 +1,350 @@
+# ========================== Session Capture Replay ==========================
+# Runs captures written with RECORD_SESSIONS=1 (Speech_Recording) back through
+# the recognizer, grammar switching, VAD, early commits and OrderSession of the
+# app that recorded them, fed block by block exactly as the live loop decoded
+# them, and checks that every Vosk result and dialog transition comes out the
+# same. Kiosk sessions go through the app's own KioskStream; microphone sessions
+# through the same steps as the microphone loop, taking its echo decisions from
+# the capture since there is no loudspeaker here.
+#
+# The settings recorded with the session (VAD, CONFIRM_*, ...) are put back
+# before the app is imported; --keep-env replays under the current environment
+# instead, and --set NAME=VALUE changes one of them, to see what a different
+# setting would have done with the same audio.
+#
+# Besides the comparison it reports, per expected category, how long each turn
+# waited after its last word before the result came out (in audio seconds, so
+# it does not depend on how fast this machine decodes).
+#
+#   python Speech_Replay.py recordings/ --app WebSocket_Speech_VoskAPI --session 20260101-120000-4242/3
+# ============================================================================
+import argparse
+import importlib
+import json
+import os
+import time
+
+import numpy as np
+
+from Speech_Recording import AUDIO, CATALOG, DIALOG, EOF, REPLAY_SETTINGS, RESULT, dialog_state, load_capture
+
+def apply_settings(settings):
+    for name in REPLAY_SETTINGS:
+        if name in settings:
+            os.environ[name] = settings[name]
+        else:
+            os.environ.pop(name, None)
+
+# Counts the audio a recognizer has been given, so a result can be placed on the audio timeline
+class CountingRecognizer:
+    def __init__(self, recognizer, sample_rate):
+        self.recognizer = recognizer
+        self.sample_rate = sample_rate
+        self.fed_bytes = 0
+
+    def AcceptWaveform(self, data):
+        self.fed_bytes += len(data)
+        return self.recognizer.AcceptWaveform(data)
+
+    def seconds(self):
+        return self.fed_bytes / 2 / self.sample_rate
+
+    def __getattr__(self, name):
+        return getattr(self.recognizer, name)
+
+# Stands in for the app's SessionRecorder during a replay and keeps what the same hooks report
+class ReplayRecorder:
+    def __init__(self, app):
+        self.app = app
+        self.session = None
+        self.recognizer = None
+        self.results = []
+        self.transitions = []
+        self.turns = []
+
+    def open_stream(self, source, sample_rate, language=None):
+        return 1
+
+    def audio(self, stream, data):
+        pass
+
+    def result(self, stream, raw_result):
+        self.results.append(raw_result)
+        evidence = self.app.evidence_from_result(json.loads(raw_result), self.app.normalize_text)
+        if evidence.words and self.recognizer is not None:
+            self.turns.append({
+                "category": self.session.expected_category(),
+                "text": evidence.text,
+                "endpoint_delay": self.recognizer.seconds() - evidence.words[-1]["end"],
+            })
+
+    def transition(self, stream, session, text, early=False):
+        self.transitions.append(dialog_state(session, text, early))
+
+    def ignored(self, stream, text, reason):
+        pass
+
+    def end_of_input(self, stream):
+        pass
+
+    def close_stream(self, stream):
+        pass
+
+    def catalog(self, snapshot):
+        pass
+
+def instrument(app, recorder):
+    create_recognizer = app.create_recognizer
+    def counting_recognizer(sample_rate, grammar=None, *args):
+        recorder.recognizer = CountingRecognizer(create_recognizer(sample_rate, grammar, *args), sample_rate)
+        return recorder.recognizer
+    app.create_recognizer = counting_recognizer
+    app.session_recorder = recorder
+    return create_recognizer
+
+# ============================== Kiosk Sessions ==============================
+def replay_kiosk(app, captured, recorder):
+    stream = app.KioskStream(captured.meta["sample_rate"], captured.meta.get("language") or app.SPEECH_LANGUAGE)
+    recorder.session = stream.session
+    prompts = []
+    for kind, _, payload in captured.records:
+        if kind == CATALOG:
+            app.apply_catalog(json.loads(payload), warm_prompts=False)
+            continue
+        if kind == AUDIO:
+            replies = stream.feed(payload)
+        elif kind == EOF:
+            replies = stream.finish()
+        else:
+            continue
+        prompts += [reply["text"] for reply in replies if reply["type"] == "prompt"]
+    return prompts
+
+# ============================ Microphone Sessions ============================
+def open_pipeline(app, sample_rate, language, category):
+    if hasattr(app, "open_decoder"):
+        return app.open_decoder(sample_rate, language, category)
+    resampler = app.create_resampler(sample_rate, app.MODEL_SAMPLE_RATE)
+    decode_rate = app.MODEL_SAMPLE_RATE if resampler else sample_rate
+    rec = app.create_recognizer(decode_rate)
+    grammar_switcher = app.GrammarSwitcher(app.grammars)
+    grammar_switcher.apply(rec, category)
+    vad_gate = app.VoiceActivityGate(decode_rate) if app.VAD_ENABLED else None
+    endpoint_switcher = app.EndpointSwitcher(vad_gate)
+    endpoint_switcher.apply(rec, category)
+    return resampler, decode_rate, rec, grammar_switcher, endpoint_switcher, vad_gate
+
+# (results so far, text) of every transcript the live loop dropped as playback echo
+def echo_ignores(captured):
+    ignored = set()
+    results = 0
+    for kind, _, payload in captured.records:
+        if kind == RESULT:
+            results += 1
+        elif kind == DIALOG:
+            state = json.loads(payload)
+            if state.get("ignored") == "echo":
+                ignored.add((results, state["text"]))
+    return ignored
+
+def replay_microphone(app, captured, recorder):
+    prompts = []
+    sample_rate = captured.meta["sample_rate"]
+    if hasattr(app, "open_decoder"):
+        session = app.OrderSession(say=prompts.append, notify=lambda message: None,
+                                   language=captured.meta.get("language") or app.SPEECH_LANGUAGE)
+        language = session.language
+    else:
+        session = app.OrderSession(say=prompts.append, notify=lambda message: None)
+        language = None
+    partials = app.PartialTracker(lambda message: None, app.detect_confident_match)
+    recorder.session = session
+    resampler, _, rec, grammar_switcher, endpoint_switcher, vad_gate = open_pipeline(app, sample_rate, language, session.expected_category())
+    ignored = echo_ignores(captured)
+
+    for kind, _, payload in captured.records:
+        if kind == CATALOG:
+            app.apply_catalog(json.loads(payload), warm_prompts=False)
+            continue
+        if kind != AUDIO:
+            continue
+        data = payload
+        if resampler:
+            data = resampler.process(data)
+        speech_ended = False
+        if vad_gate:
+            data, speech_ended = vad_gate.process(data)
+        accepted = rec.AcceptWaveform(data) if data else False
+        if accepted or speech_ended:
+            raw_result = rec.Result() if accepted else rec.FinalResult()
+            recorder.result(None, raw_result)
+            evidence = app.evidence_from_result(json.loads(raw_result), app.normalize_text)
+            text = evidence.text
+            if partials.final():
+                grammar_switcher.apply(rec, session.expected_category())
+                endpoint_switcher.apply(rec, session.expected_category())
+                continue
+        elif data:
+            partial = app.normalize_text(json.loads(rec.PartialResult()).get("partial", ""))
+            text = partials.partial(partial, session.early_commit_category())
+            if not text:
+                continue
+            evidence = None
+        else:
+            continue
+
+        if not text or not app.is_valid_speech(text):
+            continue
+        if (len(recorder.results), text) in ignored:
+            continue
+        if evidence is None:
+            partials.accept()
+        session.handle_text(text, evidence)
+        recorder.transition(None, session, text, early=evidence is None)
+        if (accepted or speech_ended) and getattr(session, "language", None) == language:
+            grammar_switcher.apply(rec, session.expected_category())
+            endpoint_switcher.apply(rec, session.expected_category())
+        if getattr(session, "language", None) != language:
+            language = session.language
+            resampler, _, rec, grammar_switcher, endpoint_switcher, vad_gate = open_pipeline(app, sample_rate, language, session.expected_category())
+            partials.final()
+    return prompts
+
+# ============================== Comparison ==============================
+# Index of the first entry that differs, None when both lists match
+def first_difference(recorded, replayed):
+    for index, (a, b) in enumerate(zip(recorded, replayed)):
+        if a != b:
+            return index
+    if len(recorded) != len(replayed):
+        return min(len(recorded), len(replayed))
+    return None
+
+def replay_stream(app, captured):
+    recorder = ReplayRecorder(app)
+    create_recognizer = instrument(app, recorder)
+    if captured.catalog:
+        app.apply_catalog(captured.catalog, warm_prompts=False)
+    audio_bytes = sum(len(payload) for kind, _, payload in captured.records if kind == AUDIO)
+    started = time.perf_counter()
+    try:
+        if captured.meta["source"] == "kiosk" and hasattr(app, "KioskStream"):
+            prompts = replay_kiosk(app, captured, recorder)
+        else:
+            prompts = replay_microphone(app, captured, recorder)
+    finally:
+        app.create_recognizer = create_recognizer
+    decode_seconds = time.perf_counter() - started
+
+    recorded_results = [json.loads(raw) for raw in captured.results()]
+    replayed_results = [json.loads(raw) for raw in recorder.results]
+    recorded_transitions = captured.transitions()
+    result_diff = first_difference(recorded_results, replayed_results)
+    transition_diff = first_difference(recorded_transitions, recorder.transitions)
+    duration = audio_bytes / 2 / captured.meta["sample_rate"]
+    report = {
+        "session": captured.name(),
+        "source": captured.meta["source"],
+        "complete": captured.complete_start and captured.gaps == 0,
+        "duration": round(duration, 3),
+        "decode_seconds": round(decode_seconds, 3),
+        "rtf": round(decode_seconds / duration, 4) if duration else None,
+        "results": len(replayed_results),
+        "transitions": len(recorder.transitions),
+        "deterministic": result_diff is None and transition_diff is None,
+        "turns": recorder.turns,
+        "prompts": prompts,
+        "final_state": recorder.transitions[-1] if recorder.transitions else None,
+    }
+    if result_diff is not None:
+        report["result_diff"] = {
+            "index": result_diff,
+            "recorded": recorded_results[result_diff] if result_diff < len(recorded_results) else None,
+            "replayed": replayed_results[result_diff] if result_diff < len(replayed_results) else None,
+        }
+    if transition_diff is not None:
+        report["transition_diff"] = {
+            "index": transition_diff,
+            "recorded": recorded_transitions[transition_diff] if transition_diff < len(recorded_transitions) else None,
+            "replayed": recorder.transitions[transition_diff] if transition_diff < len(recorder.transitions) else None,
+        }
+    return report
+
+def summarize_turns(reports):
+    delays = {}
+    for report in reports:
+        for turn in report["turns"]:
+            delays.setdefault(turn["category"], []).append(turn["endpoint_delay"])
+    return {
+        category: {
+            "turns": len(values),
+            "mean": round(float(np.mean(values)), 3),
+            "p50": round(float(np.percentile(values, 50)), 3),
+            "p90": round(float(np.percentile(values, 90)), 3),
+        }
+        for category, values in sorted(delays.items())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions through the recognizer and dialog")
+    parser.add_argument("inputs", nargs="+", help="capture segments or directories of them")
+    parser.add_argument("--app", default="WebSocket_Speech_VoskAPI", help="app module that recorded the sessions")
+    parser.add_argument("--session", action="append", help="only replay RUN/STREAM (repeatable)")
+    parser.add_argument("--keep-env", action="store_true", help="replay with the current settings, not the recorded ones")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a setting on top of the recorded ones (repeatable)")
+    parser.add_argument("--output", help="write one JSON report per session here")
+    args = parser.parse_args()
+
+    streams = load_capture(args.inputs)
+    if args.session:
+        streams = [captured for captured in streams if captured.name() in args.session]
+    if not streams:
+        raise SystemExit("No recorded sessions found")
+    if not args.keep_env:
+        # Settings are read once at import, so one run can only take one set of them
+        settings = [captured.meta.get("settings", {}) for captured in streams]
+        if any(s != settings[0] for s in settings):
+            print("Sessions were recorded with different settings, replaying all with those of the first")
+        apply_settings(settings[0])
+    for override in args.set:
+        name, _, value = override.partition("=")
+        os.environ[name] = value
+
+    app = importlib.import_module(args.app)
+    # Decode in this process so results do not depend on worker scheduling
+    app.RECOGNITION_WORKERS = 0
+    app.load_model()
+
+    reports = []
+    for captured in streams:
+        if not any(kind == AUDIO for kind, _, _ in captured.records):
+            continue
+        if captured.catalog is None:
+            print(f"{captured.name()}: no catalog in the capture, skipped")
+            continue
+        report = replay_stream(app, captured)
+        reports.append(report)
+        status = "same results" if report["deterministic"] else "DIVERGED"
+        if not report["complete"]:
+            status += " (capture incomplete)"
+        print(f"{report['session']} [{report['source']}] {report['duration']:.1f}s audio, "
+              f"{report['results']} results, {report['transitions']} turns: {status}")
+        for key in ("result_diff", "transition_diff"):
+            if key in report:
+                print(f"  first {key.split('_')[0]} difference at #{report[key]['index']}:")
+                print(f"    recorded {json.dumps(report[key]['recorded'], ensure_ascii=False)}")
+                print(f"    replayed {json.dumps(report[key]['replayed'], ensure_ascii=False)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for report in reports:
+                f.write(json.dumps(report, ensure_ascii=False) + "\n")
+    print("Endpoint delay by expected category (audio seconds after the last word):")
+    for category, row in summarize_turns(reports).items():
+        print(f"  {category:<16} turns={row['turns']:<4} mean={row['mean']:.3f} p50={row['p50']:.3f} p90={row['p90']:.3f}")
+    diverged = sum(1 for report in reports if not report["deterministic"])
+    print(f"{len(reports)} sessions replayed, {diverged} diverged")
+
+if __name__ == "__main__":
+    main()
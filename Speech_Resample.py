@@ -0,0 +1,90 @@
+# ============================ Streaming Resampler ============================
+# Microphones usually run at 44.1 or 48 kHz while the model's features are
+# computed at the rate in its conf/mfcc.conf (16 kHz for the small English
+# model). Converting before decoding means Kaldi gets a third of the samples.
+#
+# Rational polyphase resampler: the rate ratio is reduced to up/down, a
+# Kaiser-windowed sinc low-pass is split into `up` phases, and every output
+# sample is one dot product of its phase with the newest input samples. All
+# outputs of a block are computed in one NumPy gather + einsum. The last taps
+# of input are carried over, so blocks can be any size and the output is the
+# same as resampling the whole stream at once.
+# =============================================================================
+import os
+import re
+from math import gcd
+
+import numpy as np
+
+RESAMPLE = os.environ.get("RESAMPLE", "1") == "1"
+
+def model_sample_rate(model_path, default=16000):
+    try:
+        with open(os.path.join(model_path, "conf", "mfcc.conf"), encoding="utf-8") as f:
+            found = re.search(r"--sample-frequency=(\d+(?:\.\d+)?)", f.read())
+    except OSError:
+        return default
+    return int(float(found.group(1))) if found else default
+
+def design_filter(up, down, zero_crossings, beta, rolloff):
+    # Cut-off just below the lower of the two Nyquist rates, relative to the upsampled
+    # rate; the model's filterbank stops at 7.6 kHz anyway
+    cutoff = rolloff / max(up, down)
+    half = zero_crossings * max(up, down)
+    n = np.arange(-half, half + 1)
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(len(n), beta)
+    # Unity gain per phase after zero-stuffing by `up`
+    return taps * (up / taps.sum())
+
+def to_pcm(samples):
+    return np.clip(np.rint(samples), -32768, 32767).astype(np.int16).tobytes()
+
+class Resampler:
+    def __init__(self, in_rate, out_rate, zero_crossings=16, beta=8.0, rolloff=0.95):
+        divisor = gcd(int(in_rate), int(out_rate))
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.up = self.out_rate // divisor
+        self.down = self.in_rate // divisor
+        taps = design_filter(self.up, self.down, zero_crossings, beta, rolloff)
+        self.delay = (len(taps) - 1) // 2
+        # bank[phase, k] multiplies input sample (i - k) for an output at i * up + phase
+        per_phase = -(-len(taps) // self.up)
+        padded = np.zeros(per_phase * self.up, dtype=np.float32)
+        padded[:len(taps)] = taps
+        self.bank = np.ascontiguousarray(padded.reshape(per_phase, self.up).T)
+        self.offsets = np.arange(per_phase)
+        self.history = np.zeros(per_phase - 1, dtype=np.float32)
+        # Next output position in upsampled units, counted from history[0]; starting
+        # past the filter delay lines output sample 0 up with input sample 0
+        self.next_t = len(self.history) * self.up + self.delay
+
+    def process(self, block):
+        samples = np.frombuffer(block, dtype=np.int16, count=len(block) // 2)
+        return to_pcm(self.process_samples(samples.astype(np.float32)))
+
+    def process_samples(self, samples):
+        x = np.concatenate((self.history, samples))
+        t = np.arange(self.next_t, len(x) * self.up, self.down)
+        if len(t):
+            index = t // self.up
+            out = np.einsum("nk,nk->n", self.bank[t % self.up], x[index[:, None] - self.offsets])
+            self.next_t = int(t[-1]) + self.down
+        else:
+            out = np.zeros(0, dtype=np.float32)
+        keep = len(self.history)
+        consumed = len(x) - keep
+        self.history = x[consumed:] if keep else x[:0]
+        self.next_t -= consumed * self.up
+        return out
+
+    # Pushes the filter delay worth of silence through so the last input samples come out
+    def flush(self):
+        pad = np.zeros(-(-self.delay // self.up) + 1, dtype=np.float32)
+        return to_pcm(self.process_samples(pad))
+
+# None when the input is already at the model rate (or RESAMPLE=0), so callers can skip the stage
+def create_resampler(in_rate, out_rate, enabled=RESAMPLE):
+    if not enabled or int(in_rate) == int(out_rate):
+        return None
+    return Resampler(in_rate, out_rate)
@@ -0,0 +1,106 @@
+# ============================ One-Shot Slot Parser ============================
+# Pulls every slot a customer gives in one breath ("a large iced latte with less
+# sugar") out of a single transcript: the drink, the drink size and a size per
+# ingredient of that drink, so the dialog can skip straight to whatever is still
+# missing. Phrases are matched word for word (the recognizer only emits grammar
+# words), longest first, so "milk tea" is never read as the ingredient "milk".
+#
+# Ingredient sizes come from the Size keywords or from amount words ("less",
+# "extra"); they bind to the ingredient they stand next to. Whether sizes come
+# before ("large milk") or after ("milk large") the ingredients is decided by
+# the first ingredient mentioned and tried first for the rest of the utterance.
+# ==============================================================================
+SIZE_MODIFIERS = {
+    "S": ["less", "a little", "little", "light", "low"],
+    "M": ["normal", "regular"],
+    "L": ["more", "extra", "a lot of", "lots of"],
+}
+# Allowed between an amount and its ingredient: "less of the sugar", "a bit more milk"
+FILLER_WORDS = {"a", "an", "the", "of", "some", "bit", "please"}
+CONNECTOR_WORDS = ["with", "and", "a", "an", "the", "of", "some", "bit", "please", "but"]
+
+def find_phrases(tokens, phrases, used):
+    found = []
+    for phrase, label in sorted(phrases.items(), key=lambda item: -len(item[0])):
+        words = phrase.split()
+        width = len(words)
+        for start in range(len(tokens) - width + 1):
+            if tokens[start:start + width] == words and not any(used[start:start + width]):
+                used[start:start + width] = [True] * width
+                found.append((start, start + width, label))
+    return sorted(found)
+
+class SlotParser:
+    def __init__(self, keywords, components, modifiers=SIZE_MODIFIERS):
+        self.drinks = {kw: label for label, kw_list in keywords.get("Drink", {}).items() for kw in kw_list}
+        self.sizes = {kw: label for label, kw_list in keywords.get("Size", {}).items() for kw in kw_list}
+        self.modifiers = {kw: label for label, kw_list in modifiers.items() for kw in kw_list
+                          if label in keywords.get("Size", {})}
+        # Catalog ingredients are keyed by the catalog name, drink labels are normalized
+        self.components = {" ".join(name.lower().split()): list(comps) for name, comps in components.items()}
+
+    def drink_components(self, drink):
+        return self.components.get(drink, [])
+
+    # Returns {"drink", "size", "components": {ingredient: size}}; unknown slots are None / empty
+    def parse(self, text, drink=None):
+        tokens = text.split()
+        used = [False] * len(tokens)
+        slots = {"drink": drink, "size": None, "components": {}}
+        drinks = find_phrases(tokens, self.drinks, used)
+        if drink is None:
+            labels = {label for _, _, label in drinks}
+            # Two different drinks in one breath is not something to guess at
+            if len(labels) != 1:
+                return slots
+            drink = slots["drink"] = labels.pop()
+
+        comps = self.drink_components(drink)
+        mentions = find_phrases(tokens, {" ".join(c.lower().split()): c for c in comps}, used)
+        sizes = find_phrases(tokens, self.sizes, used)
+        amounts = find_phrases(tokens, self.modifiers, used)
+        # size start index -> (end index, label, can stand alone as the drink size)
+        size_at = {start: (end, label, True) for start, end, label in sizes}
+        size_at.update({start: (end, label, False) for start, end, label in amounts})
+        size_end = {end: start for start, (end, _, _) in size_at.items()}
+        bound = set()
+
+        def before(start):
+            index = start
+            while index > 0 and index not in size_end and tokens[index - 1] in FILLER_WORDS:
+                index -= 1
+            origin = size_end.get(index)
+            return origin if origin is not None and origin not in bound else None
+
+        def after(end):
+            index = end
+            while index < len(tokens) and index not in size_at and tokens[index] in FILLER_WORDS:
+                index += 1
+            return index if index in size_at and index not in bound else None
+
+        prefix = None
+        for start, end, comp in mentions:
+            if prefix is None:
+                prefix = before(start) is not None or after(end) is None
+            origin = before(start) if prefix else after(end)
+            if origin is None:
+                origin = after(end) if prefix else before(start)
+            if origin is None:
+                continue
+            bound.add(origin)
+            slots["components"][comp] = size_at[origin][1]
+
+        free = {size_at[origin][1] for origin in size_at if origin not in bound and size_at[origin][2]}
+        if len(free) == 1:
+            slots["size"] = free.pop()
+        slots["components"] = {comp: slots["components"][comp] for comp in comps if comp in slots["components"]}
+        return slots
+
+    # Words a compound answer can contain besides the step's own keywords, so the
+    # step grammars do not turn them into [unk]
+    def grammar_phrases(self):
+        comps = {" ".join(c.lower().split()) for comp_list in self.components.values() for c in comp_list}
+        return {
+            "Drink": list(self.sizes) + list(self.modifiers) + sorted(comps) + CONNECTOR_WORDS,
+            "Size": list(self.modifiers) + sorted(comps) + CONNECTOR_WORDS,
+        }
@@ -0,0 +1,117 @@
+# ========================== Text-To-Speech Prompt Cache ==========================
+# Prompts are addressed by a hash of (engine, language, text). Decoded PCM lives in
+# a bounded in-memory LRU, backed by WAV files on disk, so a repeated prompt never
+# goes back to the TTS backend (see Speech_TTSBackends) again.
+# =================================================================================
+import hashlib
+import os
+import threading
+import wave
+from collections import OrderedDict
+
+from pydub import AudioSegment
+
+import Speech_Metrics as metrics
+from Speech_TTSBackends import create_backend
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MEMORY_BYTES = int(os.environ.get("TTS_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+
+TTS_CACHE_LOOKUPS = metrics.counter("speech_tts_cache_lookups_total", "Prompt lookups by where they were found", ["tier"])
+
+class PromptCache:
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_memory_bytes=TTS_CACHE_MEMORY_BYTES,
+                 lang="en", backend=None):
+        backend = backend or create_backend()
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.lang = lang
+        self.engine = backend.name
+        self.synthesize = backend.synthesize
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0, "synth": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.engine}\0{self.lang}\0{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".wav")
+
+    def get(self, text):
+        key = self.key(text)
+        with self.lock:
+            sound = self.memory.get(key)
+            if sound is not None:
+                self.memory.move_to_end(key)
+                self.hits["memory"] += 1
+                TTS_CACHE_LOOKUPS.labels(tier="memory").inc()
+                return sound
+
+        sound = self.load(key)
+        if sound is not None:
+            self.hits["disk"] += 1
+            TTS_CACHE_LOOKUPS.labels(tier="disk").inc()
+        else:
+            sound = self.synthesize(text, self.lang)
+            self.store(key, sound)
+            self.hits["synth"] += 1
+            TTS_CACHE_LOOKUPS.labels(tier="synth").inc()
+        self.remember(key, sound)
+        return sound
+
+    def load(self, key):
+        try:
+            with wave.open(self.path(key), "rb") as wf:
+                return AudioSegment(
+                    data=wf.readframes(wf.getnframes()),
+                    sample_width=wf.getsampwidth(),
+                    frame_rate=wf.getframerate(),
+                    channels=wf.getnchannels(),
+                )
+        except (FileNotFoundError, EOFError, wave.Error):
+            return None
+
+    def store(self, key, sound):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write beside the final file and rename so readers never see a partial WAV
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with wave.open(tmp_path, "wb") as wf:
+            wf.setnchannels(sound.channels)
+            wf.setsampwidth(sound.sample_width)
+            wf.setframerate(sound.frame_rate)
+            wf.writeframes(sound.raw_data)
+        os.replace(tmp_path, path)
+
+    def remember(self, key, sound):
+        size = len(sound.raw_data)
+        if size > self.max_memory_bytes:
+            return
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return
+            self.memory[key] = sound
+            self.memory_bytes += size
+            while self.memory_bytes > self.max_memory_bytes:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted.raw_data)
+
+    def warm(self, texts):
+        warmed = 0
+        for text in dict.fromkeys(t for t in texts if t.strip()):
+            try:
+                self.get(text)
+                warmed += 1
+            except Exception as e:
+                print(f"TTS warm-up failed for '{text}':", str(e))
+        print(f"TTS cache warmed with {warmed} prompts. Hits: {self.hits}")
+        return warmed
+
+    def warm_in_background(self, texts):
+        thread = threading.Thread(target=self.warm, args=(list(texts),), daemon=True)
+        thread.start()
+        return thread
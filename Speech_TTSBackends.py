@@ -0,0 +1,119 @@
+# ============================== Text-To-Speech Backends ==============================
+# Every backend turns a prompt into an AudioSegment of PCM in memory; the prompt
+# cache in Speech_TTS sits in front of whichever one TTS_ENGINE selects:
+#   gtts   - Google Translate TTS over the network, MP3 decoded through ffmpeg
+#   espeak - espeak-ng (or espeak) run locally, WAV read straight from its stdout
+#   piper  - piper neural voices run locally (PIPER_MODEL), raw PCM from its stdout
+# The backend name goes into the cache key, so switching engine or voice never
+# plays audio cached from another one.
+# =====================================================================================
+import io
+import json
+import os
+import shutil
+import struct
+import subprocess
+
+from pydub import AudioSegment
+
+import Speech_Metrics as metrics
+
+TTS_ENGINE = os.environ.get("TTS_ENGINE", "gtts")
+# espeak voice; defaults to the prompt language
+TTS_VOICE = os.environ.get("TTS_VOICE", "")
+TTS_RATE = int(os.environ.get("TTS_RATE", 160))
+PIPER_MODEL = os.environ.get("PIPER_MODEL", "")
+PIPER_COMMAND = os.environ.get("PIPER_COMMAND", "piper")
+TTS_TIMEOUT = float(os.environ.get("TTS_TIMEOUT", 30))
+
+TTS_SYNTH_SECONDS = metrics.histogram("speech_tts_synthesis_seconds", "Synthesis time for one prompt", ["engine"])
+TTS_DECODE_SECONDS = metrics.histogram("speech_tts_mp3_decode_seconds", "MP3 to PCM decode time for one gTTS prompt")
+
+def run_engine(command, text):
+    completed = subprocess.run(command, input=text.encode("utf-8"), stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, timeout=TTS_TIMEOUT, check=False)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{command[0]} exited with {completed.returncode}: "
+                           f"{completed.stderr.decode('utf-8', 'replace').strip()}")
+    return completed.stdout
+
+# WAV written to a pipe cannot be patched up afterwards, so the RIFF and data sizes
+# are placeholders; take the format from "fmt " and everything after "data"
+def segment_from_wav(wav):
+    if wav[:4] != b"RIFF" or wav[8:12] != b"WAVE":
+        raise ValueError("TTS engine did not return WAV audio")
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(wav):
+        chunk_id, size = wav[offset:offset + 4], struct.unpack("<I", wav[offset + 4:offset + 8])[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            _, channels, frame_rate, _, _, bits = struct.unpack("<HHIIHH", wav[body:body + 16])
+            fmt = (channels, frame_rate, bits // 8)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data before its format chunk")
+            channels, frame_rate, sample_width = fmt
+            data = wav[body:body + size] if body + size <= len(wav) else wav[body:]
+            frame_bytes = channels * sample_width
+            data = data[:len(data) - len(data) % frame_bytes]
+            return AudioSegment(data=data, sample_width=sample_width, frame_rate=frame_rate, channels=channels)
+        offset = body + size + (size & 1)
+    raise ValueError("WAV audio without a data chunk")
+
+class GTTSBackend:
+    name = "gtts"
+
+    def synthesize(self, text, lang):
+        from gtts import gTTS
+        mp3 = io.BytesIO()
+        with TTS_SYNTH_SECONDS.labels(engine=self.name).timer():
+            gTTS(text=text, lang=lang).write_to_fp(mp3)
+        mp3.seek(0)
+        with TTS_DECODE_SECONDS.timer():
+            return AudioSegment.from_file(mp3, format="mp3")
+
+class EspeakBackend:
+    def __init__(self, voice=TTS_VOICE, rate=TTS_RATE):
+        self.command = shutil.which("espeak-ng") or shutil.which("espeak")
+        if self.command is None:
+            raise RuntimeError("TTS_ENGINE=espeak needs espeak-ng or espeak on PATH")
+        self.voice = voice
+        self.rate = rate
+        self.name = f"espeak:{voice}:{rate}"
+        self.metric = TTS_SYNTH_SECONDS.labels(engine="espeak")
+
+    def synthesize(self, text, lang):
+        # Text goes in on stdin so a prompt starting with "-" is never read as an option
+        command = [self.command, "--stdout", "-v", self.voice or lang, "-s", str(self.rate)]
+        with self.metric.timer():
+            wav = run_engine(command, text)
+        return segment_from_wav(wav)
+
+class PiperBackend:
+    def __init__(self, model=PIPER_MODEL, command=PIPER_COMMAND):
+        if not model:
+            raise RuntimeError("TTS_ENGINE=piper needs PIPER_MODEL set to a voice .onnx file")
+        with open(f"{model}.json", encoding="utf-8") as f:
+            self.frame_rate = int(json.load(f)["audio"]["sample_rate"])
+        self.model = model
+        self.command = command
+        self.name = f"piper:{os.path.basename(model)}"
+        self.metric = TTS_SYNTH_SECONDS.labels(engine="piper")
+
+    # The voice follows PIPER_MODEL, so the prompt language is not used here
+    def synthesize(self, text, lang):
+        command = [self.command, "--model", self.model, "--output-raw"]
+        with self.metric.timer():
+            pcm = run_engine(command, text.replace("\n", " ") + "\n")
+        return AudioSegment(data=pcm[:len(pcm) - len(pcm) % 2], sample_width=2,
+                            frame_rate=self.frame_rate, channels=1)
+
+TTS_BACKENDS = {"gtts": GTTSBackend, "espeak": EspeakBackend, "piper": PiperBackend}
+
+def create_backend(engine=TTS_ENGINE):
+    try:
+        backend = TTS_BACKENDS[engine]
+    except KeyError:
+        raise ValueError(f"TTS_ENGINE must be one of {sorted(TTS_BACKENDS)}, not {engine!r}") from None
+    return backend()
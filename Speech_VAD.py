@@ -0,0 +1,110 @@
+# ============================ Voice Activity Gate ============================
+# Sits between capture and the recognizer so silence and steady background hum
+# between customers are never decoded. Each block is split into 10 ms frames and
+# scored in one NumPy pass:
+#   energy - frame RMS in dBFS against an adaptive noise floor
+#   ZCR    - zero-crossing rate, so broadband hiss near the threshold is not speech
+# The gate opens on speech and replays a pre-roll of the blocks just before it,
+# so the leading syllable is not lost, and stays open for a hangover after the
+# last speech frame so Vosk still sees the trailing silence it endpoints on.
+# =============================================================================
+import os
+from collections import deque
+
+import numpy as np
+
+VAD_ENABLED = os.environ.get("VAD", "1") == "1"
+
+class VoiceActivityGate:
+    def __init__(self, sample_rate, frame_ms=10, margin_db=10.0, min_energy_db=-55.0,
+                 max_zcr=0.35, loud_margin_db=20.0, min_speech_ms=30,
+                 preroll_ms=500, hangover_ms=800, initial_floor_db=-60.0, floor_rise=0.1):
+        self.frame_samples = max(1, int(sample_rate * frame_ms / 1000))
+        self.sample_rate = sample_rate
+        self.margin_db = margin_db
+        self.min_energy_db = min_energy_db
+        self.max_zcr = max_zcr
+        self.loud_margin_db = loud_margin_db
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.preroll_samples = int(sample_rate * preroll_ms / 1000)
+        self.hangover_samples = int(sample_rate * hangover_ms / 1000)
+        # Starts at a quiet room so a customer already talking at startup still opens the gate
+        self.noise_floor_db = initial_floor_db
+        self.floor_rise = floor_rise
+        self.preroll = deque()
+        self.preroll_size = 0
+        self.open = False
+        self.silence_samples = 0
+        self.blocks = {"total": 0, "decoded": 0}
+
+    def frame_features(self, samples):
+        usable = len(samples) - len(samples) % self.frame_samples
+        if usable == 0:
+            frames = samples.reshape(1, -1)
+        else:
+            frames = samples[:usable].reshape(-1, self.frame_samples)
+        frames = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        energy_db = 20.0 * np.log10(rms + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(1, frames.shape[1] - 1)
+        return energy_db, zcr
+
+    def is_speech(self, energy_db, zcr):
+        above = energy_db - self.noise_floor_db
+        speech = (energy_db > self.min_energy_db) & (above > self.margin_db) & \
+                 ((zcr < self.max_zcr) | (above > self.loud_margin_db))
+        # Track the room from the quietest frames of every block (even within speech
+        # there are pauses): follow drops at once, rises slowly, so steady hum or a
+        # fan that starts later is absorbed within a few seconds
+        level = float(np.percentile(energy_db, 10))
+        if level < self.noise_floor_db:
+            self.noise_floor_db = level
+        else:
+            self.noise_floor_db += self.floor_rise * (level - self.noise_floor_db)
+        return int(np.count_nonzero(speech)) >= min(self.min_speech_frames, len(speech))
+
+    # Returns (audio to decode, speech_ended). Audio is b"" while the gate is closed;
+    # speech_ended is True on the block where the hangover runs out. An open gate
+    # passes the block through as given (a capture ring view stays a view), only
+    # the pre-roll keeps its own copies.
+    def process(self, block):
+        samples = np.frombuffer(block, dtype=np.int16, count=len(block) // 2)
+        self.blocks["total"] += 1
+        speech = self.is_speech(*self.frame_features(samples))
+
+        if self.open:
+            self.blocks["decoded"] += 1
+            if speech:
+                self.silence_samples = 0
+                return block, False
+            self.silence_samples += len(samples)
+            if self.silence_samples >= self.hangover_samples:
+                self.open = False
+                self.silence_samples = 0
+                return block, True
+            return block, False
+
+        if speech:
+            self.open = True
+            self.silence_samples = 0
+            self.blocks["decoded"] += 1 + len(self.preroll)
+            self.preroll.append(block)
+            audio = b"".join(self.preroll)
+            self.preroll.clear()
+            self.preroll_size = 0
+            return audio, False
+
+        self.preroll.append(bytes(block))
+        self.preroll_size += len(samples)
+        while self.preroll and self.preroll_size - len(self.preroll[0]) // 2 >= self.preroll_samples:
+            self.preroll_size -= len(self.preroll.popleft()) // 2
+        return b"", False
+
+    # Takes effect from the next block, also in the middle of an utterance
+    def set_hangover(self, seconds):
+        self.hangover_samples = int(self.sample_rate * seconds)
+
+    def skipped_ratio(self):
+        total = self.blocks["total"]
+        return 1.0 - self.blocks["decoded"] / total if total else 0.0
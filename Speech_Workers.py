@@ -0,0 +1,283 @@
+# ========================== Recognition Worker Pool ==========================
+# Runs Kaldi decoding in separate processes so decoding scales with cores and
+# never competes with the event loop, JSON handling or fuzzy matching for the
+# GIL. Every worker keeps its own ModelRegistry (Speech_Models): the default
+# language is loaded at start, others on first use. A recognizer is opened on
+# the least busy worker, preferring one that already has its language loaded so
+# not every worker pays for every model, and stays there for its whole session.
+# Audio goes over the pipe as raw bytes (no pickling) and the final result comes
+# back with the AcceptWaveform answer, so a chunk costs one round trip.
+# A maintenance thread restarts workers that died (their sessions are lost, new
+# ones go elsewhere meanwhile) and frees the recognizers of closed sessions on
+# workers that have gone quiet.
+#
+#   RECOGNITION_WORKERS=0   decode in-process (default)
+#   RECOGNITION_WORKERS=8   decode in 8 worker processes
+# =============================================================================
+import itertools
+import multiprocessing
+import os
+import threading
+import weakref
+
+from Speech_Models import ModelRegistry, load_vosk_model, open_vosk_recognizer
+
+RECOGNITION_WORKERS = int(os.environ.get("RECOGNITION_WORKERS", 0))
+# A worker that has the language loaded is used unless it has this many more
+# streams than the least busy worker
+LANGUAGE_AFFINITY_SLACK = 4
+# How often dead workers are looked for and released recognizers flushed
+WORKER_CHECK_SECONDS = 2.0
+
+# ============================== Worker Process ==============================
+def worker_main(model_paths, language, conn, loader=load_vosk_model, opener=open_vosk_recognizer):
+    try:
+        registry = ModelRegistry(model_paths, default=language, loader=loader, opener=opener)
+        registry.preload()
+    except Exception as e:
+        conn.send((False, f"{type(e).__name__}: {e}"))
+        return
+    conn.send((True, os.getpid()))
+
+    recognizers = {}
+    while True:
+        try:
+            op, stream_id, arg, released = conn.recv()
+        except EOFError:
+            return
+        for closed_id in released:
+            recognizers.pop(closed_id, None)
+        try:
+            if op == "accept":
+                data = conn.recv_bytes()
+                rec = recognizers[stream_id]
+                if rec.AcceptWaveform(data):
+                    reply = (True, rec.Result())
+                else:
+                    reply = (False, None)
+            elif op == "open":
+                sample_rate, grammar, language = arg
+                recognizers[stream_id] = registry.create_recognizer(sample_rate, grammar, language)
+                # Lets the parent route later sessions to where their model already is
+                reply = registry.loaded_languages()
+            elif op == "release":
+                reply = None
+            elif op == "stop":
+                conn.send((True, None))
+                return
+            else:
+                # Result, PartialResult, FinalResult, SetGrammar, SetWords, SetMaxAlternatives,
+                # SetEndpointerDelays, Reset
+                method = getattr(recognizers[stream_id], op)
+                reply = method(*arg) if arg else method()
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+            continue
+        conn.send((True, reply))
+
+# ============================== Parent Side ==============================
+class RecognitionWorker:
+    def __init__(self, ctx, model_paths, language, index, loader=load_vosk_model, opener=open_vosk_recognizer):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main, args=(model_paths, language, child_conn, loader, opener),
+                                   name=f"recognizer-{index}", daemon=True)
+        self.child_conn = child_conn
+        # One request/reply in flight per worker; the worker is single threaded anyway
+        self.lock = threading.Lock()
+        self.streams = set()
+        self.released = []
+        self.languages = {language}
+        self.exited = False
+
+    def start(self):
+        self.process.start()
+        self.child_conn.close()
+
+    def wait_ready(self):
+        try:
+            ok, value = self.conn.recv()
+        except EOFError:
+            ok, value = False, f"exit code {self.process.exitcode}"
+        if not ok:
+            raise RuntimeError(f"Recognition worker {self.process.name} failed to start: {value}")
+
+    def call(self, op, stream_id, arg=None, payload=None):
+        with self.lock:
+            # Recognizers dropped since the last call are freed piggybacked on this one
+            released, self.released = self.released, []
+            try:
+                self.conn.send((op, stream_id, arg, released))
+                if payload is not None:
+                    self.conn.send_bytes(payload)
+                ok, value = self.conn.recv()
+            except (EOFError, OSError):
+                self.exited = True
+                raise RuntimeError(f"Recognition worker {self.process.name} exited") from None
+        if not ok:
+            raise RuntimeError(value)
+        return value
+
+    def alive(self):
+        return not self.exited and self.process.is_alive()
+
+    def release(self, stream_id):
+        self.streams.discard(stream_id)
+        self.released.append(stream_id)
+
+    # Sends the pending releases on their own, for a worker no session is talking to
+    def flush_released(self):
+        if self.released:
+            self.call("release", None)
+
+    def stop(self, timeout=5):
+        try:
+            self.call("stop", None)
+        except RuntimeError:
+            pass
+        self.process.join(timeout)
+
+# Stands in for a vosk.KaldiRecognizer that lives in a worker process
+class RecognizerProxy:
+    def __init__(self, worker, stream_id):
+        self.worker = worker
+        self.stream_id = stream_id
+        self.pending_result = None
+        weakref.finalize(self, worker.release, stream_id)
+
+    def AcceptWaveform(self, data):
+        accepted, result = self.worker.call("accept", self.stream_id, payload=data)
+        self.pending_result = result
+        return accepted
+
+    def Result(self):
+        if self.pending_result is not None:
+            result, self.pending_result = self.pending_result, None
+            return result
+        return self.worker.call("Result", self.stream_id)
+
+    def PartialResult(self):
+        return self.worker.call("PartialResult", self.stream_id)
+
+    def FinalResult(self):
+        self.pending_result = None
+        return self.worker.call("FinalResult", self.stream_id)
+
+    def SetGrammar(self, grammar):
+        self.worker.call("SetGrammar", self.stream_id, (grammar,))
+
+    def SetWords(self, enabled):
+        self.worker.call("SetWords", self.stream_id, (enabled,))
+
+    def SetMaxAlternatives(self, alternatives):
+        self.worker.call("SetMaxAlternatives", self.stream_id, (alternatives,))
+
+    def SetEndpointerDelays(self, start_max, end, max_length):
+        self.worker.call("SetEndpointerDelays", self.stream_id, (start_max, end, max_length))
+
+    def Reset(self):
+        self.pending_result = None
+        self.worker.call("Reset", self.stream_id)
+
+# report(error) is called with a message while a worker is down and with None once
+# every worker is running again
+class RecognitionPool:
+    def __init__(self, model_paths, language, workers=RECOGNITION_WORKERS, report=None,
+                 check_seconds=WORKER_CHECK_SECONDS, loader=load_vosk_model, opener=open_vosk_recognizer):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.model_paths = model_paths
+        self.language = language
+        self.loader = loader
+        self.opener = opener
+        self.workers = [self.new_worker(i) for i in range(workers)]
+        self.stream_ids = itertools.count(1)
+        self.report = report
+        self.check_seconds = check_seconds
+        self.error = None
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def new_worker(self, index):
+        return RecognitionWorker(self.ctx, self.model_paths, self.language, index, self.loader, self.opener)
+
+    # Workers load the model in parallel; returns once every one of them is ready
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        for worker in self.workers:
+            worker.wait_ready()
+        print(f"Recognition pool ready with {len(self.workers)} workers.")
+        self.thread = threading.Thread(target=self.maintain, daemon=True, name="recognition-pool")
+        self.thread.start()
+
+    def set_error(self, error):
+        if error == self.error:
+            return
+        self.error = error
+        if self.report:
+            self.report(error)
+
+    def maintain(self):
+        while not self.stopping.wait(self.check_seconds):
+            for index, worker in enumerate(self.workers):
+                if not worker.alive():
+                    self.respawn(index)
+                    continue
+                try:
+                    worker.flush_released()
+                except RuntimeError as e:
+                    print("Releasing recognizers failed:", str(e))
+            if all(worker.alive() for worker in self.workers):
+                self.set_error(None)
+
+    # Sessions on the dead worker are gone; its replacement starts empty
+    def respawn(self, index):
+        old = self.workers[index]
+        old.process.join(0)
+        self.set_error(f"Recognition worker {old.process.name} exited (code {old.process.exitcode}), restarting")
+        print(f"Recognition worker {old.process.name} exited with {len(old.streams)} streams, restarting it")
+        worker = self.new_worker(index)
+        worker.start()
+        try:
+            worker.wait_ready()
+        except RuntimeError as e:
+            print(str(e))
+            return
+        self.workers[index] = worker
+
+    def pick_worker(self, language):
+        workers = [w for w in self.workers if w.alive()]
+        if not workers:
+            raise RuntimeError("No recognition worker is running")
+        least_busy = min(workers, key=lambda w: len(w.streams))
+        holders = [w for w in workers if language in w.languages]
+        if holders:
+            holder = min(holders, key=lambda w: len(w.streams))
+            if len(holder.streams) <= len(least_busy.streams) + LANGUAGE_AFFINITY_SLACK:
+                return holder
+        return least_busy
+
+    # A worker that dies during the open is skipped and the next one tried
+    def create_recognizer(self, sample_rate, grammar=None, language=None):
+        while True:
+            worker = self.pick_worker(language)
+            stream_id = next(self.stream_ids)
+            worker.streams.add(stream_id)
+            try:
+                worker.languages = set(worker.call("open", stream_id, (sample_rate, grammar, language)))
+            except RuntimeError:
+                worker.streams.discard(stream_id)
+                if worker.alive():
+                    raise
+                continue
+            return RecognizerProxy(worker, stream_id)
+
+    def load(self):
+        return {worker.process.name: len(worker.streams) for worker in self.workers}
+
+    def languages(self):
+        return {worker.process.name: sorted(worker.languages) for worker in self.workers}
+
+    def stop(self):
+        self.stopping.set()
+        for worker in self.workers:
+            worker.stop()
@@ -1,27 +1,39 @@
-# ============================================ Nguyen Hien ============================================ 
+# ============================================ Nguyen Hien ============================================
 # Developer: Trần Nguyên Hiền
 # Faculty: Electronics and Communication Engineering
 # =====================================================================================================
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 import threading
 import uvicorn
-from typing import List
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-import sounddevice as sd
-import queue
 import json
 import re
 import os
-import tempfile
-from vosk import Model, KaldiRecognizer
-from rapidfuzz import fuzz
-from gtts import gTTS
-from pydub import AudioSegment
-from pydub.playback import play
 import time
-from Installsubabase import supabase
+from Installsubabase import get_supabase
+from Speech_TTS import PromptCache
+from Speech_Output import SpeechOutput
+from Speech_Grammar import build_grammars, strip_unk, GrammarSwitcher
+from Speech_Endpointing import EndpointSwitcher
+from Speech_Matcher import KeywordMatcher
+from Speech_SlotParser import SlotParser
+from Speech_Confidence import ConfirmationPolicy, evidence_from_result, RECOGNIZER_ALTERNATIVES
+from Speech_Catalog import Catalog
+from Speech_Startup import Readiness, warm_up_recognizers
+from Speech_Workers import RecognitionPool, RECOGNITION_WORKERS
+from Speech_VAD import VoiceActivityGate, VAD_ENABLED
+from Speech_Persistence import OrderWriter
+from Speech_Recording import SessionRecorder
+from Speech_Capture import create_ring, device_latency, waveform_buffer
+from Speech_Resample import create_resampler
+from Speech_Models import ModelRegistry, SPEECH_LANGUAGE, language_from_text, trigger_phrases
+import Speech_Metrics as metrics
+from Speech_Partials import PartialTracker
+from Speech_Broadcast import Broadcaster
 
 app = FastAPI(title="Voice Ordering System")
 app.add_middleware(
@@ -31,82 +43,132 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-active_websockets: List[WebSocket] = []
-is_speaking = False
-latest_order = None
+# The microphone is optional: a box without one still serves kiosks and files
+readiness = Readiness(["catalog", "model", "warmup", "orders", "workers", "microphone"],
+                      required=["catalog", "model", "warmup", "orders", "workers"])
+broadcaster = Broadcaster()
 drink_prices = {}
+components = {}
+grammars = {}
+catalog_lock = threading.Lock()
 # ============= From Supabase Import Drink and Ingredient =============
-def fetch_drinks_from_supabase():
-    try:
-        response = supabase.table("drinkdata").select("drink_name,price").execute()
-        drink_list = []
-        for item in response.data:
-            name = item.get('drink_name', '').lower()
-            price = item.get('price', 0)
-            if name:
-                drink_list.append({"name": name, "price": price})
-        return drink_list
-    except Exception as e:
-        print("Error fetching drinks from Supabase:", str(e))
-        return []
-
-def fetch_components_from_supabase():
-    try:
-        response = supabase.table("drinkdata").select("drink_name,ingredients").execute()
-        comp_dict = {}
-        for item in response.data:
-            name = item.get("drink_name", "").lower()
-            ing = item.get("ingredients", "")
-            if name and isinstance(ing, str):
-                ing = ing.strip("{}") 
-                comp_dict[name] = [i.strip().lower() for i in ing.split(",") if i.strip()]
-        return comp_dict
-    except Exception as e:
-        print("Error fetching ingredients from Supabase:", str(e))
-        return {}
-
-def update_drink_keywords(drink_data):
-    keywords["Drink"] = {}
-    for item in drink_data:
-        name = item["name"]
-        price = item["price"]
-        clean_name = normalize_text(name)
-        keywords["Drink"][clean_name] = [clean_name]
-        drink_prices[clean_name] = price
+# The new tables, matcher and grammars are built first and then swapped in
+# together under catalog_lock, which the dialog holds while handling a turn
+def apply_catalog(snapshot, warm_prompts=True):
+    global drink_prices, components, matcher, slot_parser
+    drink_keywords, prices, comps = {}, {}, {}
+    for item in snapshot["drinks"]:
+        clean_name = normalize_text(item["name"])
+        drink_keywords[clean_name] = [clean_name]
+        prices[clean_name] = item["price"]
+        if item["ingredients"]:
+            comps[item["name"]] = item["ingredients"]
+    new_keywords = {**keywords, "Drink": drink_keywords}
+    new_matcher = KeywordMatcher(new_keywords, TRIGGER_KEYWORDS + LANGUAGE_TRIGGER_KEYWORDS)
+    new_slot_parser = SlotParser(new_keywords, comps)
+    new_grammars = build_grammars(new_keywords, TRIGGER_KEYWORDS + LANGUAGE_TRIGGER_KEYWORDS, new_slot_parser.grammar_phrases())
+    with catalog_lock:
+        keywords["Drink"] = drink_keywords
+        drink_prices = prices
+        components = comps
+        matcher = new_matcher
+        slot_parser = new_slot_parser
+        grammars.clear()
+        grammars.update(new_grammars)
+    print("Updated drink keywords:", keywords["Drink"])
+    print("Updated components from Supabase:", components)
+    session_recorder.catalog(snapshot)
+    if warm_prompts:
+        tts_cache.warm_in_background(catalog_prompts())
+    if drink_keywords and not readiness.is_ready("catalog"):
+        readiness.mark("catalog")
 
 # ========================== Text-To-Speech ===========================
+tts_cache = PromptCache(lang='en')
+speech_output = SpeechOutput(tts_cache)
+# With barge-in the microphone stays open during prompts so the customer can interrupt
+# Off by default: without echo cancellation the prompt itself reaches the microphone,
+# and is_echo() can only recognize the transcripts it leaves, not every one
+BARGE_IN = os.environ.get("BARGE_IN", "0") == "1"
+
 def speak(text):
-    global is_speaking
     if not text.strip():
-        return
-    is_speaking = True
+        return None
     print(f"[TTS]: {text}")
-    tts = gTTS(text=text, lang='en')
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as fp:
-        tts.save(fp.name)
-        sound = AudioSegment.from_mp3(fp.name)
-        play(sound)
-    os.unlink(fp.name)
-    time.sleep(0.3)
-    is_speaking = False
+    return speech_output.say(text)
 
 # ========================= Voice Recognition =========================
-q = queue.Queue()
-model_en = Model("vosk-model-small-en-us-0.15")
-device_info = sd.query_devices(sd.default.device[0], 'input')
-samplerate = int(device_info['default_samplerate'])
-rec = KaldiRecognizer(model_en, samplerate)
-rec.SetWords(True)
+# Filled by the audio callback once the microphone stream is open
+audio_ring = None
+# One model per language (SPEECH_MODELS), loaded on first use and shared
+model_registry = ModelRegistry()
+# Rate the default model computes features at; other input rates are resampled to it
+MODEL_SAMPLE_RATE = model_registry.sample_rate(SPEECH_LANGUAGE)
+recognition_pool = None
+
+# A recognition worker that died takes the box out of /ready until it is restarted
+def report_recognition_workers(error):
+    if error is None:
+        readiness.mark("workers")
+    else:
+        readiness.fail("workers", error)
+
+# Loads the default language up front; with RECOGNITION_WORKERS set the worker processes load it instead
+def load_model():
+    global recognition_pool
+    if RECOGNITION_WORKERS > 0:
+        pool = RecognitionPool(model_registry.paths, SPEECH_LANGUAGE, RECOGNITION_WORKERS,
+                               report=report_recognition_workers)
+        pool.start()
+        recognition_pool = pool
+    else:
+        model_registry.preload(SPEECH_LANGUAGE)
+    readiness.mark("workers")
+
+# Recognizers of one language share its model, only the decoder state is per stream
+def create_recognizer(sample_rate, grammar=None, language=SPEECH_LANGUAGE):
+    if recognition_pool:
+        recognizer = recognition_pool.create_recognizer(sample_rate, grammar, language)
+    else:
+        recognizer = model_registry.create_recognizer(sample_rate, grammar, language)
+    # n-best alternatives feed the confirmation policy; Vosk then leaves out word confidences
+    if RECOGNIZER_ALTERNATIVES > 0:
+        recognizer.SetMaxAlternatives(RECOGNIZER_ALTERNATIVES)
+    return recognizer
+
+# ============================= Metrics =============================
+AUDIO_QUEUE_DEPTH = metrics.gauge("speech_audio_queue_depth", "Captured blocks waiting for the recognizer", function=lambda: audio_ring.depth() if audio_ring else 0)
+AUDIO_DROPPED_BLOCKS = metrics.counter("speech_audio_dropped_blocks_total", "Input overflows reported by the audio device")
+MODELS_LOADED = metrics.gauge("speech_models_loaded", "Speech models loaded in this process", function=lambda: len(model_registry.loaded_languages()))
+MODEL_MEMORY_BYTES = metrics.gauge("speech_model_memory_bytes", "Size of the speech models loaded in this process", function=model_registry.memory_bytes)
+ACCEPT_WAVEFORM_SECONDS = metrics.histogram("speech_accept_waveform_seconds", "AcceptWaveform time per audio chunk", ["source"])
+MATCH_SECONDS = metrics.histogram("speech_match_seconds", "Keyword matcher time per call", ["kind"])
+TURN_SECONDS = metrics.histogram("speech_turn_seconds", "From the block that ended an utterance to the dialog's reaction", ["source"])
+MIC_ACCEPT_SECONDS = ACCEPT_WAVEFORM_SECONDS.labels(source="microphone")
+MIC_TURN_SECONDS = TURN_SECONDS.labels(source="microphone")
+BEST_MATCH_SECONDS = MATCH_SECONDS.labels(kind="best")
+CONFIDENT_MATCH_SECONDS = MATCH_SECONDS.labels(kind="confident")
+KIOSK_ACCEPT_SECONDS = ACCEPT_WAVEFORM_SECONDS.labels(source="kiosk")
+KIOSK_TURN_SECONDS = TURN_SECONDS.labels(source="kiosk")
+
+def accept_waveform(rec, data, histogram):
+    if not data:
+        return False
+    if isinstance(data, memoryview) and recognition_pool is None:
+        data = waveform_buffer(data)
+    with histogram.timer():
+        return rec.AcceptWaveform(data)
 
 def callback(indata, frames, time_, status):
-    global is_speaking
     if status:
         print("Audio Error:", status)
-    if not is_speaking:
-        q.put(bytes(indata))
+        if status.input_overflow:
+            AUDIO_DROPPED_BLOCKS.inc()
+    if BARGE_IN or not speech_output.is_speaking():
+        audio_ring.write(indata)
 
 def normalize_text(text):
-    text = text.lower()
+    text = strip_unk(text.lower())
     text = re.sub(r"[^\w\s]", "", text)
     text = re.sub(r"\s+", " ", text).strip()
     return text
@@ -125,243 +187,621 @@ keywords = {
     }
 }
 TRIGGER_KEYWORDS = ["hey dispenser", "dispenser", "hey you", "hey you"]
+# Languages the keyword tables and prompts of this dialog are written in. A session
+# only switches to a language that has both a model and these: on any other model
+# the customer could never say "yes" to the first confirmation.
+DIALOG_LANGUAGES = ["en"]
+
+def dialog_languages():
+    return [language for language in model_registry.languages()
+            if language in DIALOG_LANGUAGES or language == SPEECH_LANGUAGE]
+
+# "hey dispenser vietnamese" picks the customer's language; listing the whole phrase
+# keeps an early commit from acting on "hey dispenser" before the language is said
+LANGUAGE_TRIGGER_KEYWORDS = [f"{kw} {phrase}" for kw in dict.fromkeys(TRIGGER_KEYWORDS)
+                             for phrase in trigger_phrases(dialog_languages())]
 
 def detect_best_match(text, category, threshold=80):
-    best_match = {"score": 0, "label": None, "length": 0}
-    for label, kw_list in keywords[category].items():
-        for kw in kw_list:
-            score = fuzz.partial_ratio(text, kw)
-            if score > best_match["score"] or (
-                score == best_match["score"] and len(kw.split()) > best_match["length"]
-            ):
-                best_match.update({"score": score, "label": label, "length": len(kw.split())})
-    if best_match["score"] >= threshold:
-        return best_match["label"]
-    return None
+    with BEST_MATCH_SECONDS.timer():
+        return matcher.best_match(text, category, threshold)
 
 def is_valid_speech(text):
-    if not text:
-        return False
-    if any(kw in text for kw in TRIGGER_KEYWORDS):
-        return True
-    for category in keywords.values():
-        for kw_list in category.values():
-            for kw in kw_list:
-                if kw in text:
-                    return True
-    return False
-
-def reset_state():
-    global selected_drink, selected_size, component_sizes
-    global customizing, current_component_index
-    global step, waiting_confirmation, pending_value, pending_category
-
-    selected_drink = None
-    selected_size = None
-    component_sizes.clear()
-    customizing = False
-    current_component_index = 0
-    step = 1
-    waiting_confirmation = False
-    pending_value = None
-    pending_category = None
+    return matcher.is_valid(text)
+
+# Thresholds come from CONFIRM_* (see Speech_Confidence)
+confirmation_policy = ConfirmationPolicy()
+
+def is_confident(evidence, category, label):
+    return confirmation_policy.confident(evidence, category, label, matcher)
+
+def detect_confident_match(text, category):
+    with CONFIDENT_MATCH_SECONDS.timer():
+        return matcher.confident_match(text, category)
+
+matcher = KeywordMatcher(keywords, TRIGGER_KEYWORDS + LANGUAGE_TRIGGER_KEYWORDS)
+slot_parser = SlotParser(keywords, components)
+
+# Every fixed prompt plus each catalog template the dialog below can produce
+def catalog_prompts():
+    prompts = [
+        "Yes,I'm here. What would you like to drink?",
+        "You can answer yes or no.",
+        "Sorry, I did not catch that. What would you like to drink?",
+        "Sorry, could you say the size again?",
+        "Sorry, I did not quite get the drink. Mind saying it one more time?",
+        "Sorry, I did not quite get the size. Mind saying it one more time?",
+        "If you want to order again, just say Autobarista.",
+    ]
+    for drink in keywords["Drink"]:
+        price = drink_prices.get(drink, "unknown")
+        prompts += [
+            f"You said {drink}, did you mean a drink {drink}?",
+            f"You chose {drink}. Would you like to customize the ingredients?",
+            f"You chose {drink}. What size would you like?",
+            f"Please say again, what size for your {drink}?",
+            f"Order successful! Enjoy your {drink}.",
+        ]
+        prompts += [
+            f"Confirm: {drink} - size {size}. The price is {price} vnd. Does this seem right to you?"
+            for size in keywords["Size"]
+        ]
+    for comp in sorted({comp for comps in components.values() for comp in comps}):
+        prompts += [
+            f"What size for {comp}?",
+            f"No worries — let try again. What size {comp} would you like?",
+        ]
+    return prompts
 
 # ============ Initialize Keywords And Data ============
-drink_data = fetch_drinks_from_supabase()
-update_drink_keywords(drink_data)
-components = fetch_components_from_supabase()
+catalog = Catalog(get_supabase, on_change=apply_catalog)
+# Finished orders are journaled locally and saved to Supabase in the background;
+# while the journal cannot be written the box reports itself not ready
+def report_order_journal(error):
+    if error is None:
+        readiness.mark("orders")
+    else:
+        readiness.fail("orders", error)
+
+order_writer = OrderWriter(get_supabase, report=report_order_journal)
+# With RECORD_SESSIONS=1 audio, results and dialog turns are captured for Speech_Replay.py
+session_recorder = SessionRecorder()
+
+# ================== ORDER SESSION (ONE PER AUDIO SOURCE) ==================
+# say(text) delivers a prompt to the customer, notify(message) publishes dialog events
+class OrderSession:
+    def __init__(self, say=None, notify=None, language=SPEECH_LANGUAGE):
+        self.say = say or speak
+        self.notify = notify or (lambda message: None)
+        # Recognizer language; the trigger phrase can switch it for one customer
+        self.default_language = language
+        self.language = language
+        self.component_sizes = {}
+        self.listening_for_trigger = True
+        self.latest_order = None
+        self.reset_state()
+
+    def reset_state(self):
+        self.selected_drink = None
+        self.selected_size = None
+        self.component_sizes.clear()
+        self.customizing = False
+        self.current_component_index = 0
+        self.step = 1
+        self.waiting_confirmation = False
+        self.pending_value = None
+        self.pending_category = None
+
+    # Back to waiting for the wake phrase. The next customer starts in the default
+    # language: the trigger grammar only exists for SPEECH_LANGUAGE's recognizer
+    def wait_for_trigger(self):
+        self.reset_state()
+        self.listening_for_trigger = True
+        self.language = self.default_language
+
+    # Keyword category the next utterance is matched against, drives the grammar
+    def expected_category(self):
+        if self.listening_for_trigger:
+            return "Trigger"
+        if self.waiting_confirmation:
+            return "YesNo"
+        if self.step == 1:
+            return "Drink"
+        return "Size"
+
+    # Category a partial may be committed early against; None while the answer can carry
+    # several slots (the drink with its sizes, several ingredient sizes), which a pause
+    # after the first of them would cut short
+    def early_commit_category(self):
+        if not self.listening_for_trigger and not self.waiting_confirmation and self.step in (1, 3):
+            return None
+        return self.expected_category()
+
+    # evidence is the recognizer result behind the text, None for early commits
+    def handle_text(self, text, evidence=None):
+        if self.listening_for_trigger:
+            if text.startswith("autobarista") or any(kw in text for kw in TRIGGER_KEYWORDS):
+                self.language = language_from_text(text, dialog_languages()) or self.default_language
+                self.notify({"type": "start"})
+                self.say("Yes,I'm here. What would you like to drink?")
+                print("Yes, 'm here. What would you like to drink?")
+                self.listening_for_trigger = False
+                self.step = 1
+            else:
+                print("Waiting for trigger word...")
+            return
+
+        if self.waiting_confirmation:
+            answer = detect_best_match(text, "YesNo")
+            if answer == "Yes":
+                if self.pending_category == "Drink":
+                    self.accept_drink(self.pending_value)
+                elif self.pending_category == "CustomizeChoice":
+                    self.customizing = True
+                    self.current_component_index = 0
+                    self.component_sizes.clear()
+                    comp = components[self.selected_drink][self.current_component_index]
+                    self.say(f"What size for {comp}?")
+                    self.step = 3
+                    self.waiting_confirmation = False
+                elif self.pending_category == "Size":
+                    self.selected_size = self.pending_value
+                    price = drink_prices.get(self.selected_drink, "unknown")
+                    self.say(f"Confirm: {self.selected_drink} - size {self.selected_size}. The price is {price} vnd. Does this seem right to you?")
+                    self.latest_order = {
+                        "price": price,
+                        "drink": self.selected_drink,
+                        "size": self.selected_size
+                    }
+                    self.pending_category = "FinalConfirmation"
+                elif self.pending_category == "FinalConfirmation":
+                    self.say(f"Order successful! Enjoy your {self.selected_drink}.")
+                    self.notify({
+                        "type": "voiceOrderResult",
+                        "data": self.latest_order
+                    })
+                    self.wait_for_trigger()
+                    self.say("If you want to order again, just say Autobarista.")
+            elif answer == "No":
+                if self.pending_category == "Drink":
+                    self.say("Sorry, I did not catch that. What would you like to drink?")
+                    self.step = 1
+                    self.waiting_confirmation = False
+                elif self.pending_category == "CustomizeChoice":
+                    self.say(f"Please say again, what size for your {self.selected_drink}?")
+                    self.step = 2
+                    self.waiting_confirmation = False
+                elif self.pending_category == "FinalConfirmation":
+                    if self.customizing:
+                        self.current_component_index = 0
+                        self.component_sizes.clear()
+                        comp = components[self.selected_drink][self.current_component_index]
+                        self.say(f"No worries — let try again. What size {comp} would you like?")
+                        self.step = 3
+                    else:
+                        self.say("Sorry, could you say the size again?")
+                        self.step = 2
+                    self.waiting_confirmation = False
+            else:
+                self.say("You can answer yes or no.")
+            return
 
-print("Updated drink keywords:", keywords["Drink"])
-print("Updated components from Supabase:", components)
+        if self.step == 1:
+            # "A large iced latte with less sugar" fills several slots at once
+            slots = slot_parser.parse(text)
+            if slots["drink"] and (slots["size"] or slots["components"]):
+                self.fill_slots(slots)
+                return
+            drink = detect_best_match(text, "Drink")
+            if drink and is_confident(evidence, "Drink", drink):
+                self.accept_drink(drink)
+            elif drink:
+                self.say(f"You said {drink}, did you mean a drink {drink}?")
+                self.pending_value = drink
+                self.pending_category = "Drink"
+                self.waiting_confirmation = True
+            else:
+                self.say("Sorry, I did not quite get the drink. Mind saying it one more time?")
+
+        elif self.step == 2:
+            size = detect_best_match(text, "Size")
+            if size:
+                self.confirm_size(size)
+            else:
+                self.say("Sorry, I did not quite get the size. Mind saying it one more time?")
+
+        elif self.step == 3:
+            # "Milk large, sugar small" answers several ingredients in one go
+            given = slot_parser.parse(text, drink=self.selected_drink)["components"]
+            if given:
+                self.component_sizes.update(given)
+                self.ask_next_component()
+                return
+            size = detect_best_match(text, "Size")
+            if size:
+                comp = components[self.selected_drink][self.current_component_index]
+                self.component_sizes[comp] = size
+                self.ask_next_component()
+            else:
+                self.say("Sorry, I did not quite get the size. Mind saying it one more time?")
+
+    def accept_drink(self, drink):
+        self.selected_drink = drink
+        if self.selected_drink in components:
+            self.say(f"You chose {self.selected_drink}. Would you like to customize the ingredients?")
+            self.pending_category = "CustomizeChoice"
+            self.waiting_confirmation = True
+        else:
+            self.say(f"You chose {self.selected_drink}. What size would you like?")
+            self.step = 2
+            self.waiting_confirmation = False
+
+    # Takes every slot of a one-shot utterance and asks only for what is missing
+    def fill_slots(self, slots):
+        self.selected_drink = slots["drink"]
+        self.selected_size = slots["size"]
+        self.component_sizes.clear()
+        if slots["components"] and self.selected_drink in components:
+            self.customizing = True
+            self.component_sizes.update(slots["components"])
+            self.ask_next_component()
+        else:
+            self.confirm_size(slots["size"])
+
+    def confirm_size(self, size):
+        self.selected_size = size
+        price = drink_prices.get(self.selected_drink, "unknown")
+        self.say(f"Confirm: {self.selected_drink} - size {self.selected_size}. The price is {price} vnd. Does this seem right to you?")
+        self.latest_order = {
+            "price": price,
+            "drink": self.selected_drink,
+            "size": self.selected_size
+        }
+        self.pending_category = "FinalConfirmation"
+        self.waiting_confirmation = True
+
+    def ask_next_component(self):
+        missing = [comp for comp in components[self.selected_drink] if comp not in self.component_sizes]
+        if missing:
+            self.current_component_index = components[self.selected_drink].index(missing[0])
+            self.say(f"What size for {missing[0]}?")
+            self.step = 3
+            self.waiting_confirmation = False
+            return
+        # Read back in catalog order, however the customer listed them
+        ordered = {comp: self.component_sizes[comp] for comp in components[self.selected_drink]}
+        self.component_sizes.clear()
+        self.component_sizes.update(ordered)
+        price = drink_prices.get(self.selected_drink, "unknown")
+        final_text = f"Confirm: {self.selected_drink} with " + \
+                     ", ".join([f"{k} size {v}" for k, v in self.component_sizes.items()])
+        self.say(f"{final_text}. The price is {price} vnd. Is this correct?")
+        self.latest_order = {
+            "drink": self.selected_drink,
+            "details": {
+                "price": price,
+                **self.component_sizes.copy(),
+            }
+        }
+        # Drink size from a one-shot order, the ingredient sizes alone do not carry it
+        if self.selected_size:
+            self.latest_order["size"] = self.selected_size
+        self.pending_category = "FinalConfirmation"
+        self.waiting_confirmation = True
 
 # ============= MAIN VOICE ORDER FUNCTION ==============
+# Resampler, recognizer, grammar and endpointing switchers and VAD for one audio source in
+# one language. The step grammars are built from the catalog for SPEECH_LANGUAGE; other
+# models decode freely. Endpointing profiles go by category, so they apply to every language.
+def open_decoder(sample_rate, language, category):
+    model_rate = model_registry.sample_rate(language)
+    resampler = create_resampler(sample_rate, model_rate)
+    decode_rate = model_rate if resampler else sample_rate
+    grammar_switcher = GrammarSwitcher(grammars if language == SPEECH_LANGUAGE else {})
+    rec = create_recognizer(decode_rate, grammar_switcher.initial(category), language)
+    vad_gate = VoiceActivityGate(decode_rate) if VAD_ENABLED else None
+    endpoint_switcher = EndpointSwitcher(vad_gate)
+    endpoint_switcher.apply(rec, category)
+    return resampler, decode_rate, rec, grammar_switcher, endpoint_switcher, vad_gate
+
 def Voice_Ordering_System():
-    global step, selected_drink, selected_size
-    global waiting_confirmation, pending_value, pending_category
-    global customizing, current_component_index, component_sizes
-    global listening_for_trigger, latest_order
-
-    trigger_keywords = TRIGGER_KEYWORDS
-    print(f"Listening... (Sample Rate = {samplerate})")
-
-    step = 1
-    selected_drink = None
-    selected_size = None
-    waiting_confirmation = False
-    pending_value = None
-    pending_category = None
-    customizing = False
-    current_component_index = 0
-    component_sizes = {}
-    listening_for_trigger = True
-    latest_order = None
-
-    with sd.RawInputStream(samplerate=samplerate, blocksize=4000, dtype='int16', channels=1, callback=callback):
+    import sounddevice as sd
+    device_info = sd.query_devices(sd.default.device[0], 'input')
+    samplerate = int(device_info['default_samplerate'])
+    session = OrderSession(say=speak, notify=lambda message: publish_dialog_event(message, "microphone"))
+    language = session.language
+    resampler, decode_rate, rec, grammar_switcher, endpoint_switcher, vad_gate = open_decoder(samplerate, language, session.expected_category())
+    print(f"Listening... (Sample Rate = {samplerate}, decoding at {decode_rate})")
+    partials = PartialTracker(broadcast_to_clients, detect_confident_match)
+    recording = session_recorder.open_stream("microphone", samplerate, language)
+
+    global audio_ring
+    block_frames, audio_ring = create_ring(samplerate)
+
+    with sd.RawInputStream(samplerate=samplerate, blocksize=block_frames, latency=device_latency(),
+                           dtype='int16', channels=1, callback=callback):
+        readiness.mark("microphone")
         while True:
-            data = q.get()
-            if rec.AcceptWaveform(data):
-                result = json.loads(rec.Result())
-                text = normalize_text(result.get("text", ""))
+            data = audio_ring.read()
+            block_at = time.perf_counter()
+            session_recorder.audio(recording, data)
+            if resampler:
+                data = resampler.process(data)
+            speech_ended = False
+            if vad_gate:
+                # Silence is not decoded at all; flush when the speaker stops
+                data, speech_ended = vad_gate.process(data)
+                if speech_ended:
+                    print(f"[VAD] {vad_gate.skipped_ratio():.0%} of audio skipped so far")
+            accepted = accept_waveform(rec, data, MIC_ACCEPT_SECONDS)
+            if accepted or speech_ended:
+                raw_result = rec.Result() if accepted else rec.FinalResult()
+                session_recorder.result(recording, raw_result)
+                evidence = evidence_from_result(json.loads(raw_result), normalize_text)
+                text, heard = evidence.text, evidence.heard
                 print(f"Detected: {text}")
-
-                if is_speaking or not text or not is_valid_speech(text):
-                    print("Ignored noise or system playback.")
+                if partials.final():
+                    # Already acted on from a partial, only the grammar switch was waiting
+                    with catalog_lock:
+                        grammar_switcher.apply(rec, session.expected_category())
+                    endpoint_switcher.apply(rec, session.expected_category())
                     continue
-
-                if listening_for_trigger:
-                    if text.startswith("autobarista") or any(kw in text for kw in trigger_keywords):
-                        asyncio.run(broadcast_to_clients({"type": "start"}))
-                        speak("Yes,I'm here. What would you like to drink?")
-                        print("Yes, 'm here. What would you like to drink?")
-                        listening_for_trigger = False
-                        step = 1
-                    else:
-                        print("Waiting for trigger word...")
+            elif data:
+                heard = json.loads(rec.PartialResult()).get("partial", "")
+                text = partials.partial(normalize_text(heard), session.early_commit_category())
+                if not text:
                     continue
+                evidence = None
+                print(f"Early commit: {text}")
+            else:
+                continue
 
-                if waiting_confirmation:
-                    answer = detect_best_match(text, "YesNo")
-                    if answer == "Yes":
-                        if pending_category == "Drink":
-                            selected_drink = pending_value
-                            if selected_drink in components:
-                                speak(f"You chose {selected_drink}. Would you like to customize the ingredients?")
-                                pending_category = "CustomizeChoice"
-                                waiting_confirmation = True
-                            else:
-                                speak(f"You chose {selected_drink}. What size would you like?")
-                                step = 2
-                                waiting_confirmation = False
-                        elif pending_category == "CustomizeChoice":
-                            customizing = True
-                            current_component_index = 0
-                            component_sizes.clear()
-                            comp = components[selected_drink][current_component_index]
-                            speak(f"What size for {comp}?")
-                            step = 3
-                            waiting_confirmation = False
-                        elif pending_category == "Size":
-                            selected_size = pending_value
-                            price = drink_prices.get(selected_drink, "unknown")
-                            speak(f"Confirm: {selected_drink} - size {selected_size}. The price is {price} vnd. Does this seem right to you?")
-                            latest_order = {
-                                "price": price,
-                                "drink": selected_drink,
-                                "size": selected_size
-                            }
-                            pending_category = "FinalConfirmation"
-                        elif pending_category == "FinalConfirmation":
-                            price = drink_prices.get(selected_drink, "unknown")
-                            speak(f"Order successful! Enjoy your {selected_drink}.")
-                            asyncio.run(broadcast_to_clients({
-                                "type": "voiceOrderResult",
-                                "data": latest_order
-                            }))
-                            reset_state()
-                            listening_for_trigger = True
-                            speak("If you want to order again, just say Autobarista.")
-                    elif answer == "No":
-                        if pending_category == "Drink":
-                            speak("Sorry, I did not catch that. What would you like to drink?")
-                            step = 1
-                            waiting_confirmation = False
-                        elif pending_category == "CustomizeChoice":
-                            speak(f"Please say again, what size for your {selected_drink}?")
-                            step = 2
-                            waiting_confirmation = False
-                        elif pending_category == "FinalConfirmation":
-                            if customizing:
-                                current_component_index = 0
-                                component_sizes.clear()
-                                comp = components[selected_drink][current_component_index]
-                                speak(f"No worries — let try again. What size {comp} would you like?")
-                                step = 3
-                            else:
-                                speak("Sorry, could you say the size again?")
-                                step = 2
-                            waiting_confirmation = False
-                    else:
-                        speak("You can answer yes or no.")
-                    continue
+            if not text or not is_valid_speech(text):
+                print("Ignored noise or system playback.")
+                continue
+            # The end of a prompt is only finalized once the endpointer has waited out its silence
+            if speech_output.is_echo(heard, tail=endpoint_switcher.trailing_silence() + block_frames / samplerate):
+                print("Ignored system playback.")
+                session_recorder.ignored(recording, text, "echo")
+                continue
+            if speech_output.is_speaking():
+                print("Barge-in, stopping prompt.")
+                speech_output.cancel()
+            if evidence is None:
+                partials.accept()
 
-                if step == 1:
-                    drink = detect_best_match(text, "Drink")
-                    if drink:
-                        speak(f"You said {drink}, did you mean a drink {drink}?")
-                        pending_value = drink
-                        pending_category = "Drink"
-                        waiting_confirmation = True
-                    else:
-                        speak("Sorry, I did not quite get the drink. Mind saying it one more time?")
-
-                elif step == 2:
-                    size = detect_best_match(text, "Size")
-                    if size:
-                        selected_size = size
-                        price = drink_prices.get(selected_drink, "unknown")
-                        speak(f"Confirm: {selected_drink} - size {selected_size}. The price is {price} vnd. Does this seem right to you?")
-                        latest_order = {
-                            "price": price,
-                            "drink": selected_drink,
-                            "size": selected_size
-                        }
-                        pending_category = "FinalConfirmation"
-                        waiting_confirmation = True
-                    else:
-                        speak("Sorry, I did not quite get the size. Mind saying it one more time?")
-
-                elif step == 3:
-                    size = detect_best_match(text, "Size")
-                    if size:
-                        comp = components[selected_drink][current_component_index]
-                        component_sizes[comp] = size
-                        current_component_index += 1
-                        
-                        if current_component_index < len(components[selected_drink]):
-                            next_comp = components[selected_drink][current_component_index]
-                            speak(f"What size for {next_comp}?")
-                        else:
-                            price = drink_prices.get(selected_drink, "unknown")
-                            final_text = f"Confirm: {selected_drink} with " + \
-                                         ", ".join([f"{k} size {v}" for k, v in component_sizes.items()])
-                            speak(f"{final_text}. The price is {price} vnd. Is this correct?")
-                            latest_order = {
-                                "drink": selected_drink,
-                                "details": {
-                                    "price": price,
-                                    **component_sizes.copy(),
-                                }
-                            }
-                            pending_category = "FinalConfirmation"
-                            waiting_confirmation = True
-                    else:
-                        speak("Sorry, I did not quite get the size. Mind saying it one more time?")
+            with catalog_lock:
+                session.handle_text(text, evidence)
+                session_recorder.transition(recording, session, text, early=evidence is None)
+                if (accepted or speech_ended) and session.language == language:
+                    grammar_switcher.apply(rec, session.expected_category())
+                    endpoint_switcher.apply(rec, session.expected_category())
+            MIC_TURN_SECONDS.observe(time.perf_counter() - block_at)
+            if session.language != language:
+                # Loading another model can take seconds, so not under catalog_lock
+                language = session.language
+                resampler, decode_rate, rec, grammar_switcher, endpoint_switcher, vad_gate = open_decoder(samplerate, language, session.expected_category())
+                partials.final()
+                print(f"Recognizer switched to {language} (decoding at {decode_rate})")
 
 # ======================== WEBSOCKET ========================
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    active_websockets.append(websocket)
+    broadcaster.register(websocket)
     try:
         while True:
-            await websocket.receive_text()  
+            await websocket.receive_text()
     except WebSocketDisconnect:
-        active_websockets.remove(websocket)
         print("Client disconnected")
+    finally:
+        broadcaster.unregister(websocket)
+
+# Safe to call from the recognition thread: queues the message on the server loop
+def broadcast_to_clients(message: dict):
+    broadcaster.publish(message)
+
+def publish_dialog_event(message: dict, source):
+    broadcast_to_clients(message)
+    if message.get("type") == "voiceOrderResult":
+        order_writer.submit(message["data"], source=source)
+
+@app.get("/ws/stats")
+def websocket_stats():
+    return broadcaster.stats()
+
+# ==================== KIOSK AUDIO STREAMING ====================
+# Kiosks stream mono int16 PCM as binary frames to /ws/audio?sample_rate=16000
+# and send the text frame "eof" to flush the last utterance.
+# Vosk releases the GIL while decoding (and with RECOGNITION_WORKERS the threads
+# only wait on a worker process), so one thread per core is enough.
+decode_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="kiosk-decode")
+
+class KioskStream:
+    def __init__(self, sample_rate, language=SPEECH_LANGUAGE):
+        self.outbox = []
+        self.sample_rate = sample_rate
+        self.session = OrderSession(say=self.prompt, notify=self.outbox.append, language=language)
+        self.language = language
+        self.resampler, _, self.rec, self.grammar_switcher, self.endpoint_switcher, self.vad_gate = \
+            open_decoder(sample_rate, language, self.session.expected_category())
+        self.partials = PartialTracker(self.outbox.append, detect_confident_match)
+        self.recording = session_recorder.open_stream("kiosk", sample_rate, language)
+
+    # Called after every turn; a trigger phrase may have picked another language
+    def follow_language(self):
+        if self.session.language == self.language:
+            return
+        self.language = self.session.language
+        self.resampler, _, self.rec, self.grammar_switcher, self.endpoint_switcher, self.vad_gate = \
+            open_decoder(self.sample_rate, self.language, self.session.expected_category())
+        self.partials.final()
+        self.outbox.append({"type": "language", "language": self.language})
+
+    def prompt(self, text):
+        print(f"[Kiosk TTS]: {text}")
+        self.outbox.append({"type": "prompt", "text": text})
+
+    def feed(self, data):
+        self.block_at = time.perf_counter()
+        session_recorder.audio(self.recording, data)
+        if self.resampler:
+            data = self.resampler.process(data)
+        speech_ended = False
+        if self.vad_gate:
+            data, speech_ended = self.vad_gate.process(data)
+        if accept_waveform(self.rec, data, KIOSK_ACCEPT_SECONDS):
+            self.handle_result(self.rec.Result())
+        elif speech_ended:
+            self.handle_result(self.rec.FinalResult())
+        elif data:
+            self.handle_partial(self.rec.PartialResult())
+        return self.drain()
+
+    def finish(self):
+        self.block_at = time.perf_counter()
+        session_recorder.end_of_input(self.recording)
+        self.handle_result(self.rec.FinalResult())
+        self.outbox.append({"type": "eof"})
+        return self.drain()
+
+    def handle_partial(self, raw_partial):
+        partial = normalize_text(json.loads(raw_partial).get("partial", ""))
+        text = self.partials.partial(partial, self.session.early_commit_category())
+        if text and is_valid_speech(text):
+            self.partials.accept()
+            self.outbox.append({"type": "transcript", "text": text, "early": True})
+            with catalog_lock:
+                self.session.handle_text(text)
+                session_recorder.transition(self.recording, self.session, text, early=True)
+            KIOSK_TURN_SECONDS.observe(time.perf_counter() - self.block_at)
+            self.follow_language()
+
+    def handle_result(self, raw_result):
+        session_recorder.result(self.recording, raw_result)
+        evidence = evidence_from_result(json.loads(raw_result), normalize_text)
+        text = evidence.text
+        if self.partials.final():
+            with catalog_lock:
+                self.grammar_switcher.apply(self.rec, self.session.expected_category())
+            self.endpoint_switcher.apply(self.rec, self.session.expected_category())
+            return
+        if not text:
+            return
+        self.outbox.append({"type": "transcript", "text": text})
+        if is_valid_speech(text):
+            with catalog_lock:
+                self.session.handle_text(text, evidence)
+                session_recorder.transition(self.recording, self.session, text)
+                self.grammar_switcher.apply(self.rec, self.session.expected_category())
+            self.endpoint_switcher.apply(self.rec, self.session.expected_category())
+            KIOSK_TURN_SECONDS.observe(time.perf_counter() - self.block_at)
+            self.follow_language()
 
-async def broadcast_to_clients(message: dict):
-    for ws in active_websockets:
-        try:
-            await ws.send_json(message)
-        except Exception as e:
-            print("WebSocket Send Error:", e)
+    def drain(self):
+        messages = self.outbox[:]
+        self.outbox.clear()
+        return messages
+
+    def close(self):
+        session_recorder.close_stream(self.recording)
+
+@app.websocket("/ws/audio")
+async def kiosk_audio_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    if not readiness.is_ready("model"):
+        await websocket.close(code=1013, reason="Speech model is still loading")
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        sample_rate = int(websocket.query_params.get("sample_rate", MODEL_SAMPLE_RATE))
+    except ValueError:
+        sample_rate = 0
+    if sample_rate <= 0:
+        await websocket.close(code=1003, reason="sample_rate must be a positive integer")
+        return
+    # Kiosks that know their customer's language say so up front: /ws/audio?lang=vi
+    language = websocket.query_params.get("lang", SPEECH_LANGUAGE)
+    if language not in model_registry.paths:
+        await websocket.close(code=1008, reason=f"No speech model for language {language!r}")
+        return
+    if language not in dialog_languages():
+        await websocket.close(code=1008, reason=f"No dialog for language {language!r}")
+        return
+    stream = await loop.run_in_executor(decode_executor, KioskStream, sample_rate, language)
+    print(f"Kiosk connected (Sample Rate = {sample_rate}, language {language})")
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                replies = await loop.run_in_executor(decode_executor, stream.feed, message["bytes"])
+            elif message.get("text") == "eof":
+                replies = await loop.run_in_executor(decode_executor, stream.finish)
+            else:
+                continue
+            for reply in replies:
+                await websocket.send_json(reply)
+                if reply["type"] in ("start", "voiceOrderResult"):
+                    publish_dialog_event(reply, "kiosk")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream.close()
+    print("Kiosk disconnected")
+
+# ======================== STARTUP ========================
+# Everything heavy runs here, off the startup hook, so uvicorn binds the port straight away
+def initialize():
+    catalog_thread = threading.Thread(target=catalog.start, daemon=True)
+    catalog_thread.start()
+    order_writer.start()
+    session_recorder.start()
+    for language in model_registry.languages():
+        if language not in dialog_languages():
+            print(f"[Models] {language} has a model but no dialog tables, sessions will not switch to it")
+    readiness.run("model", load_model)
+    catalog_thread.join()
+    if not readiness.is_ready("catalog"):
+        readiness.fail("catalog", "No snapshot and Supabase unreachable, retrying in background")
+    if not readiness.is_ready("model"):
+        return
+    readiness.run("warmup", warm_up_recognizers, create_recognizer, MODEL_SAMPLE_RATE, list(grammars.values()))
+    try:
+        Voice_Ordering_System()
+    except Exception as e:
+        readiness.fail("microphone", e)
 
 @app.on_event("startup")
 def start_background_thread():
-    thread = threading.Thread(target=Voice_Ordering_System, daemon=True)
+    thread = threading.Thread(target=initialize, daemon=True)
     thread.start()
-    print("Voice System Started In Background.")
+    print(f"Voice System Started In Background ({time.monotonic() - readiness.started:.2f}s after import).")
+
+@app.get("/metrics")
+def get_metrics():
+    if not metrics.METRICS_ENABLED:
+        return Response("Metrics are disabled (METRICS=0)\n", status_code=404, media_type="text/plain")
+    return Response(metrics.render_metrics(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/models")
+def speech_models():
+    status = {"default": SPEECH_LANGUAGE, "configured": model_registry.languages(), "dialog": dialog_languages()}
+    if recognition_pool:
+        status["workers"] = recognition_pool.languages()
+    else:
+        status["loaded"] = model_registry.stats()
+    return status
+
+@app.get("/ready")
+def ready():
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.post("/catalog/refresh")
+def refresh_catalog():
+    catalog.trigger_refresh()
+    return {"Status": "Refresh_Scheduled", "Version": catalog.snapshot["version"]}
 
 if __name__ == "__main__":
     uvicorn.run("WebSocket_Speech_VoskAPI:app", host="0.0.0.0", port=8086, reload=False)
-    
\ No newline at end of file
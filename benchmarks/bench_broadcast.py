@@ -0,0 +1,110 @@
+# ======================= WebSocket Broadcast Benchmark =======================
+# In-process fan-out test with simulated screens: fast clients, slow clients
+# (each send takes --slow-ms) and dead clients (a send never completes).
+# A publisher thread stands in for the recognition thread and sends --messages
+# events. Compares the old path (publisher awaits every socket in turn) with
+# Broadcaster (per-client queues on the server loop), reporting how long the
+# publisher was blocked and the publish-to-delivery latency on fast clients.
+#
+#   python -m benchmarks.bench_broadcast --fast 20 --slow 2 --dead 1
+# =============================================================================
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+from Speech_Broadcast import Broadcaster
+
+class FakeSocket:
+    def __init__(self, delay, kind):
+        self.delay = delay
+        self.kind = kind
+        self.latencies = []
+
+    async def send_json(self, message):
+        if self.kind == "dead":
+            await asyncio.Event().wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.latencies.append(time.perf_counter() - message["sent_at"])
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+def make_clients(args):
+    return ([FakeSocket(0, "fast") for _ in range(args.fast)]
+            + [FakeSocket(args.slow_ms / 1000, "slow") for _ in range(args.slow)]
+            + [FakeSocket(0, "dead") for _ in range(args.dead)])
+
+async def sequential_send(clients, message, timeout):
+    for ws in clients:
+        try:
+            await asyncio.wait_for(ws.send_json(message), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+def run(mode, args):
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    clients = make_clients(args)
+    broadcaster = Broadcaster(max_queue=args.queue, send_timeout=args.timeout)
+
+    async def register_all():
+        for ws in clients:
+            broadcaster.register(ws)
+
+    async def unregister_all():
+        tasks = [channel.task for channel in broadcaster.clients.values()]
+        for ws in clients:
+            broadcaster.unregister(ws)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if mode == "queued":
+        asyncio.run_coroutine_threadsafe(register_all(), loop).result()
+
+    blocked = []
+    for i in range(args.messages):
+        message = {"type": "partial", "text": f"message {i}", "sent_at": time.perf_counter()}
+        started = time.perf_counter()
+        if mode == "sequential":
+            asyncio.run_coroutine_threadsafe(sequential_send(clients, message, args.timeout), loop).result()
+        else:
+            broadcaster.publish(message)
+        blocked.append(time.perf_counter() - started)
+        time.sleep(args.interval_ms / 1000)
+    time.sleep(max(args.timeout, args.slow_ms / 1000) + 0.5)
+    asyncio.run_coroutine_threadsafe(unregister_all(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+    fast = [l for ws in clients if ws.kind == "fast" for l in ws.latencies]
+    return {
+        "blocked_ms": 1000 * statistics.mean(blocked),
+        "fast_p50_ms": 1000 * statistics.median(fast) if fast else float("nan"),
+        "fast_p95_ms": 1000 * sorted(fast)[int(0.95 * (len(fast) - 1))] if fast else float("nan"),
+        "delivered": sum(len(ws.latencies) for ws in clients),
+        "dropped": broadcaster.counts["dropped_clients"] if mode == "queued" else 0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Broadcast fan-out latency with slow and dead clients")
+    parser.add_argument("--fast", type=int, default=20)
+    parser.add_argument("--slow", type=int, default=2)
+    parser.add_argument("--dead", type=int, default=1)
+    parser.add_argument("--slow-ms", type=float, default=50)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--interval-ms", type=float, default=20)
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{args.fast} fast, {args.slow} slow ({args.slow_ms:.0f} ms/send), {args.dead} dead clients; "
+          f"{args.messages} messages every {args.interval_ms:.0f} ms")
+    print(f"{'mode':>12} {'blocked_ms':>11} {'fast_p50':>9} {'fast_p95':>9} {'delivered':>10} {'dropped':>8}")
+    for mode in ("sequential", "queued"):
+        r = run(mode, args)
+        print(f"{mode:>12} {r['blocked_ms']:>11.2f} {r['fast_p50_ms']:>9.2f} {r['fast_p95_ms']:>9.2f} "
+              f"{r['delivered']:>10} {r['dropped']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# ======================== Dialog Replay Benchmark ========================
+# Drives an app's OrderSession through scripted scenarios with the microphone
+# and TTS stubbed out, and reports:
+#   rtf              - decode wall time / audio duration (WAV turns only)
+#   decode ms        - per-utterance decode time, and the final-result latency
+#   matcher us       - detect_best_match time per call
+#   turns-to-order   - turns until the order was published
+#   slot accuracy    - drink / size / ingredient sizes against the expected order
+#
+# Scenarios: one JSON object per line, turns are either a transcript or a WAV
+# (paths relative to the scenario file), e.g.
+#   {"name": "plain", "turns": [{"text": "hey dispenser"}, {"wav": "clips/latte.wav"}, ...],
+#    "expected": {"drink": "iced latte", "size": "L"}}
+# A transcript turn with "conf" is treated as recognized with that word confidence,
+# so the confirmation policy (Speech_Confidence) can skip the read-back.
+#
+#   python -m benchmarks.bench_dialog --app WebSocket_Speech_VoskAPI --scenarios benchmarks/scenarios/websocket_dialog.jsonl
+#   python -m benchmarks.bench_dialog --app Http_Speech_VoskAPI --scenarios benchmarks/scenarios/http_dialog.jsonl
+# =========================================================================
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import statistics
+import time
+
+from Speech_Batch import read_wav
+from Speech_Confidence import Evidence, evidence_from_result
+
+CHUNK_FRAMES = 4000
+DEFAULT_CATALOG = os.path.join(os.path.dirname(__file__), "scenarios", "catalog.json")
+
+def load_scenarios(path):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        scenarios = [json.loads(line) for line in f if line.strip()]
+    for scenario in scenarios:
+        for turn in scenario["turns"]:
+            if "wav" in turn:
+                turn["wav"] = os.path.join(base, turn["wav"])
+    return scenarios
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class Timings:
+    def __init__(self):
+        self.audio_seconds = 0.0
+        self.decode_seconds = []
+        self.final_seconds = []
+        self.matcher_seconds = []
+        self.dialog_seconds = []
+
+def time_matcher(app, timings):
+    detect = app.detect_best_match
+    def timed(text, category, threshold=80):
+        started = time.perf_counter()
+        try:
+            return detect(text, category, threshold)
+        finally:
+            timings.matcher_seconds.append(time.perf_counter() - started)
+    app.detect_best_match = timed
+
+def decode_turn(app, path, grammar, timings):
+    sample_rate, pcm = read_wav(path)
+    rec = app.create_recognizer(sample_rate, grammar)
+    results = []
+    chunk_bytes = CHUNK_FRAMES * 2
+    started = time.perf_counter()
+    for offset in range(0, len(pcm), chunk_bytes):
+        if rec.AcceptWaveform(pcm[offset:offset + chunk_bytes]):
+            results.append(evidence_from_result(json.loads(rec.Result()), app.normalize_text))
+    final_started = time.perf_counter()
+    results.append(evidence_from_result(json.loads(rec.FinalResult()), app.normalize_text))
+    finished = time.perf_counter()
+    timings.audio_seconds += len(pcm) / 2 / sample_rate
+    timings.decode_seconds.append(finished - started)
+    timings.final_seconds.append(finished - final_started)
+    heard = [evidence for evidence in results if evidence.text]
+    if len(heard) == 1:
+        return heard[0]
+    # Several segments: their words still count, n-best lists do not line up
+    return Evidence(" ".join(evidence.text for evidence in heard),
+                    [word for evidence in heard for word in evidence.words])
+
+def scripted_evidence(text, conf):
+    return Evidence(text, [{"word": word, "conf": conf} for word in text.split()])
+
+def order_slots(order):
+    if order is None:
+        return {}
+    slots = {"drink": order.get("drink")}
+    if "details" in order:
+        slots["ingredients"] = {k: v for k, v in order["details"].items() if k != "price"}
+    else:
+        slots["size"] = order.get("size")
+    return slots
+
+def score_slots(expected, actual):
+    total = correct = 0
+    for name, value in expected.items():
+        if name == "ingredients":
+            for ingredient, size in value.items():
+                total += 1
+                correct += actual.get("ingredients", {}).get(ingredient) == size
+        else:
+            total += 1
+            correct += actual.get(name) == value
+    return correct, total
+
+def run_scenario(app, scenario, timings):
+    orders = []
+    def collect_order(message):
+        if message.get("type") == "voiceOrderResult":
+            orders.append(message["data"])
+
+    session = app.OrderSession(say=lambda text: None, notify=collect_order)
+    grammar_switcher = app.GrammarSwitcher(app.grammars)
+    turns_to_order = None
+    for turn_number, turn in enumerate(scenario["turns"], 1):
+        if "wav" in turn:
+            grammar = grammar_switcher.initial(session.expected_category())
+            evidence = decode_turn(app, turn["wav"], grammar, timings)
+            text = evidence.text
+        else:
+            text = app.normalize_text(turn["text"])
+            evidence = scripted_evidence(text, turn["conf"]) if "conf" in turn else None
+        if not text or not app.is_valid_speech(text):
+            continue
+        started = time.perf_counter()
+        session.handle_text(text, evidence)
+        timings.dialog_seconds.append(time.perf_counter() - started)
+        if orders and turns_to_order is None:
+            turns_to_order = turn_number
+
+    actual = order_slots(orders[0] if orders else None)
+    correct, total = score_slots(scenario.get("expected", {}), actual)
+    return {
+        "name": scenario.get("name", "?"),
+        "turns": len(scenario["turns"]),
+        "turns_to_order": turns_to_order,
+        "slots_correct": correct,
+        "slots_total": total,
+        "order": actual,
+    }
+
+def ms(values, pct):
+    return f"{1000 * percentile(values, pct):.2f}" if values else "-"
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay scripted dialogs through OrderSession")
+    parser.add_argument("--app", default="WebSocket_Speech_VoskAPI")
+    parser.add_argument("--scenarios", required=True)
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG, help="catalog snapshot to apply (default: the bundled test menu)")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios)
+    app = importlib.import_module(args.app)
+    with open(args.catalog, encoding="utf-8") as f:
+        app.apply_catalog(json.load(f), warm_prompts=False)
+    if any("wav" in turn for s in scenarios for turn in s["turns"]):
+        app.load_model()
+
+    timings = Timings()
+    time_matcher(app, timings)
+    results = []
+    # The dialog prints every prompt; keep that out of the report and the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(args.repeat):
+            results = [run_scenario(app, scenario, timings) for scenario in scenarios]
+
+    print(f"{len(scenarios)} scenarios x {args.repeat}, app: {args.app}")
+    print(f"{'scenario':<32} {'turns':>6} {'to order':>9} {'slots':>7}")
+    for r in results:
+        to_order = r["turns_to_order"] if r["turns_to_order"] is not None else "-"
+        print(f"{r['name']:<32} {r['turns']:>6} {to_order:>9} {r['slots_correct']:>3}/{r['slots_total']:<3}")
+
+    completed = [r["turns_to_order"] for r in results if r["turns_to_order"] is not None]
+    correct = sum(r["slots_correct"] for r in results)
+    total = sum(r["slots_total"] for r in results)
+    print(f"orders completed: {len(completed)}/{len(results)}"
+          + (f", turns-to-order mean {statistics.mean(completed):.1f}" if completed else ""))
+    print(f"slot accuracy:    {correct / total:.1%}" if total else "slot accuracy:    -")
+    if timings.decode_seconds:
+        print(f"rtf:              {sum(timings.decode_seconds) / timings.audio_seconds:.4f}")
+        print(f"decode ms:        p50 {ms(timings.decode_seconds, 50)}  p95 {ms(timings.decode_seconds, 95)}  "
+              f"final p95 {ms(timings.final_seconds, 95)}")
+    matcher_us = [1e6 * s for s in timings.matcher_seconds]
+    if matcher_us:
+        print(f"matcher us:       p50 {percentile(matcher_us, 50):.1f}  p95 {percentile(matcher_us, 95):.1f}  "
+              f"({len(matcher_us)} calls)")
+    print(f"dialog turn ms:   p50 {ms(timings.dialog_seconds, 50)}  p95 {ms(timings.dialog_seconds, 95)}")
+
+if __name__ == "__main__":
+    main()
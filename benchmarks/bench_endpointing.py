@@ -0,0 +1,80 @@
+# ======================== Endpointing Profile Benchmark ========================
+# Replays session captures (Speech_Recording) twice with Speech_Replay.py, once
+# with ENDPOINTING=0 (Vosk's default delays for every step) and once with the
+# profiles under test, and reports per expected category how long turns waited
+# after their last word, and how much of that the profiles saved. Sessions whose
+# dialog ended differently are listed: a trailing silence set too short splits an
+# utterance ("iced ... latte") and the customer ends up repeating it.
+#
+# Each replay runs in its own process because the settings are read at import.
+#
+#   python -m benchmarks.bench_endpointing recordings/ --app WebSocket_Speech_VoskAPI \
+#       --profiles "YesNo=0.3,Size=0.4,Drink=0.8"
+# ===============================================================================
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from Speech_Endpointing import ENDPOINT_PROFILES_SPEC
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def replay(inputs, app, settings, work_dir, name):
+    output = os.path.join(work_dir, f"{name}.jsonl")
+    cmd = [sys.executable, "-m", "Speech_Replay", *map(os.path.abspath, inputs), "--app", app, "--output", output]
+    for setting in settings:
+        cmd += ["--set", setting]
+    subprocess.run(cmd, check=True, cwd=REPO_DIR, stdout=subprocess.DEVNULL)
+    with open(output, encoding="utf-8") as f:
+        return {report["session"]: report for report in map(json.loads, f)}
+
+def delays_by_category(reports):
+    delays = {}
+    for report in reports.values():
+        for turn in report["turns"]:
+            delays.setdefault(turn["category"], []).append(turn["endpoint_delay"])
+    return delays
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn latency with and without per-step endpointing profiles")
+    parser.add_argument("inputs", nargs="+", help="capture segments or directories of them")
+    parser.add_argument("--app", default="WebSocket_Speech_VoskAPI")
+    parser.add_argument("--profiles", default=ENDPOINT_PROFILES_SPEC, help="ENDPOINT_PROFILES to compare against none")
+    parser.add_argument("--vad-margin", help="ENDPOINT_VAD_MARGIN for the profiled run")
+    args = parser.parse_args()
+
+    profiled = ["ENDPOINTING=1", f"ENDPOINT_PROFILES={args.profiles}"]
+    if args.vad_margin is not None:
+        profiled.append(f"ENDPOINT_VAD_MARGIN={args.vad_margin}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        baseline = replay(args.inputs, args.app, ["ENDPOINTING=0"], work_dir, "baseline")
+        candidate = replay(args.inputs, args.app, profiled, work_dir, "profiled")
+
+    before, after = delays_by_category(baseline), delays_by_category(candidate)
+    print(f"{len(baseline)} sessions, profiles {args.profiles}")
+    print(f"{'category':<16} {'turns':>6} {'default s':>10} {'profiled s':>11} {'saved s':>8}")
+    saved_total = 0.0
+    for category in sorted(set(before) | set(after)):
+        old, new = before.get(category, []), after.get(category, [])
+        saved = mean(old) - mean(new)
+        saved_total += sum(old) - sum(new)
+        print(f"{category:<16} {len(new):>6} {mean(old):>10.3f} {mean(new):>11.3f} {saved:>8.3f}")
+    turns = sum(len(values) for values in before.values())
+    print(f"saved {saved_total:.2f}s of waiting over {turns} turns ({saved_total / max(1, turns):.3f}s per turn)")
+
+    changed = [name for name, report in baseline.items()
+               if name in candidate and candidate[name]["final_state"] != report["final_state"]]
+    print(f"sessions with a different outcome: {len(changed)}")
+    for name in changed:
+        print(f"  {name}: {baseline[name]['transitions']} turns -> {candidate[name]['transitions']}, "
+              f"last heard {(baseline[name]['final_state'] or {}).get('text')!r} -> "
+              f"{(candidate[name]['final_state'] or {}).get('text')!r}")
+
+if __name__ == "__main__":
+    main()
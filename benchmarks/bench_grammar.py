@@ -0,0 +1,89 @@
+# ===================== Constrained Grammar Benchmark =====================
+# Decodes labelled utterances twice, once against the full vocabulary and once
+# with the step grammar for their category, and compares real-time factor,
+# per-chunk decode time and how often the keyword matcher gets the label right
+# (a miss means the kiosk would have to re-prompt).
+#
+# Manifest: one JSON object per line
+#   {"wav": "clips/latte.wav", "category": "Drink", "expected": "iced latte"}
+#
+#   python -m benchmarks.bench_grammar --app WebSocket_Speech_VoskAPI --manifest clips.jsonl
+# =========================================================================
+import argparse
+import importlib
+import json
+import time
+import wave
+
+CHUNK_FRAMES = 4000
+
+def load_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def decode(app, path, grammar):
+    with wave.open(path, "rb") as wf:
+        sample_rate = wf.getframerate()
+        audio_seconds = wf.getnframes() / sample_rate
+        recognizer = app.create_recognizer(sample_rate, grammar)
+        chunk_times = []
+        texts = []
+        while True:
+            data = wf.readframes(CHUNK_FRAMES)
+            if not data:
+                break
+            started = time.perf_counter()
+            if recognizer.AcceptWaveform(data):
+                texts.append(json.loads(recognizer.Result()).get("text", ""))
+            chunk_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        texts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+        chunk_times.append(time.perf_counter() - started)
+    return app.normalize_text(" ".join(texts)), audio_seconds, chunk_times
+
+def run_mode(app, utterances, constrained):
+    audio_total = 0.0
+    decode_total = 0.0
+    chunks = 0
+    correct = 0
+    misses = 0
+    for utt in utterances:
+        grammar = app.grammars.get(utt["category"]) if constrained else None
+        text, audio_seconds, chunk_times = decode(app, utt["wav"], grammar)
+        audio_total += audio_seconds
+        decode_total += sum(chunk_times)
+        chunks += len(chunk_times)
+        if utt["category"] == "Trigger":
+            label = utt["expected"] if utt["expected"] in text else None
+        else:
+            label = app.detect_best_match(text, utt["category"])
+        if label is None:
+            misses += 1
+        elif label == utt["expected"]:
+            correct += 1
+    return {
+        "rtf": decode_total / audio_total if audio_total else 0.0,
+        "chunk_ms": 1000 * decode_total / chunks if chunks else 0.0,
+        "accuracy": correct / len(utterances),
+        "reprompts": misses,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Real-time factor with and without step grammars")
+    parser.add_argument("--app", default="WebSocket_Speech_VoskAPI")
+    parser.add_argument("--manifest", required=True)
+    args = parser.parse_args()
+
+    app = importlib.import_module(args.app)
+    app.load_model()
+    app.catalog.start()
+    utterances = load_manifest(args.manifest)
+    print(f"{len(utterances)} utterances, app: {args.app}")
+    print(f"{'mode':>12} {'rtf':>8} {'chunk_ms':>9} {'accuracy':>9} {'reprompts':>10}")
+    for name, constrained in (("full", False), ("grammar", True)):
+        stats = run_mode(app, utterances, constrained)
+        print(f"{name:>12} {stats['rtf']:>8.4f} {stats['chunk_ms']:>9.2f} "
+              f"{stats['accuracy']:>9.1%} {stats['reprompts']:>10}")
+
+if __name__ == "__main__":
+    main()
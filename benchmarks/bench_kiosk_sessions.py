@@ -0,0 +1,80 @@
+# ===================== Kiosk Streaming Concurrency Benchmark =====================
+# Streams the same WAV file from N simulated kiosks at once into /ws/audio, as
+# fast as the server accepts it, and reports how fast each session is decoded.
+# A session keeps up with a live kiosk while its real-time factor
+# (decode wall time / audio duration) stays below 1.
+#
+# Run the server once with RECOGNITION_WORKERS=0 (in-process decoding) and once
+# with RECOGNITION_WORKERS=<cores> to compare.
+#
+#   RECOGNITION_WORKERS=8 python WebSocket_Speech_VoskAPI.py
+#   python -m benchmarks.bench_kiosk_sessions --wav order.wav --sessions 1 4 8 16 32 --server-cores 8
+# =================================================================================
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import wave
+
+import websockets
+
+def read_wav(path):
+    with wave.open(path, "rb") as wf:
+        if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise SystemExit("WAV file must be mono 16-bit PCM")
+        return wf.getframerate(), wf.readframes(wf.getnframes())
+
+async def run_session(url, sample_rate, pcm, chunk_bytes):
+    async with websockets.connect(f"{url}?sample_rate={sample_rate}", max_size=None) as ws:
+        started = time.perf_counter()
+        for offset in range(0, len(pcm), chunk_bytes):
+            await ws.send(pcm[offset:offset + chunk_bytes])
+        await ws.send("eof")
+        while True:
+            message = json.loads(await ws.recv())
+            if message["type"] == "eof":
+                break
+        return time.perf_counter() - started
+
+async def run_level(url, sample_rate, pcm, chunk_bytes, sessions):
+    tasks = [run_session(url, sample_rate, pcm, chunk_bytes) for _ in range(sessions)]
+    started = time.perf_counter()
+    elapsed = await asyncio.gather(*tasks)
+    return elapsed, time.perf_counter() - started
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent kiosk sessions per core on /ws/audio")
+    parser.add_argument("--url", default="ws://localhost:8086/ws/audio")
+    parser.add_argument("--wav", required=True, help="mono 16-bit PCM recording of one order")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--chunk-ms", type=int, default=250)
+    parser.add_argument("--server-cores", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    sample_rate, pcm = read_wav(args.wav)
+    audio_seconds = len(pcm) / 2 / sample_rate
+    chunk_bytes = int(sample_rate * args.chunk_ms / 1000) * 2
+    print(f"Audio: {audio_seconds:.2f}s @ {sample_rate} Hz, server cores: {args.server_cores}")
+    print(f"{'sessions':>8} {'rtf_p50':>8} {'rtf_p95':>8} {'audio_s/wall_s':>15} {'per_core':>9}")
+
+    best = 0
+    for sessions in args.sessions:
+        elapsed, wall = asyncio.run(run_level(args.url, sample_rate, pcm, chunk_bytes, sessions))
+        rtf = [e / audio_seconds for e in elapsed]
+        throughput = sessions * audio_seconds / wall
+        print(f"{sessions:>8} {statistics.median(rtf):>8.3f} {percentile(rtf, 95):>8.3f} "
+              f"{throughput:>15.2f} {throughput / args.server_cores:>9.2f}")
+        if percentile(rtf, 95) < 1.0:
+            best = sessions
+
+    print(f"Max real-time sessions (p95 RTF < 1): {best} -> {best / args.server_cores:.2f} per core")
+
+if __name__ == "__main__":
+    main()
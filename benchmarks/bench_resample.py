@@ -0,0 +1,96 @@
+# ===================== Capture-Side Resampling Benchmark =====================
+# Plays a recorded order as if it came from a microphone running at
+# --device-rate (the recording is converted to that rate first) and decodes it
+# twice: at the device rate, as before, and through the streaming Resampler at
+# the model's rate from conf/mfcc.conf. Reports CPU seconds per second of audio,
+# i.e. the share of one core each live stream needs, plus the resampler's own
+# share and the transcripts. --resampler-only times the resampler alone, which
+# needs no model; its cost does not depend on what the recording says.
+#
+#   python -m benchmarks.bench_resample --app WebSocket_Speech_VoskAPI --wav order.wav --device-rate 48000
+#   python -m benchmarks.bench_resample --wav order.wav --device-rate 44100 --resampler-only
+# =============================================================================
+import argparse
+import importlib
+import json
+import time
+
+from Speech_Batch import read_wav
+from Speech_Resample import Resampler
+
+def blocks(pcm, sample_rate, block_ms):
+    block_bytes = int(sample_rate * block_ms / 1000) * 2
+    for offset in range(0, len(pcm), block_bytes):
+        yield pcm[offset:offset + block_bytes]
+
+def decode(app, device_rate, pcm, block_ms, resample):
+    resampler = Resampler(device_rate, app.MODEL_SAMPLE_RATE) if resample else None
+    rec = app.create_recognizer(app.MODEL_SAMPLE_RATE if resample else device_rate)
+    texts = []
+    resample_cpu = 0.0
+    cpu_started = time.process_time()
+    for data in blocks(pcm, device_rate, block_ms):
+        if resampler:
+            started = time.process_time()
+            data = resampler.process(data)
+            resample_cpu += time.process_time() - started
+        if rec.AcceptWaveform(data):
+            texts.append(json.loads(rec.Result()).get("text", ""))
+    texts.append(json.loads(rec.FinalResult()).get("text", ""))
+    return {
+        "cpu": time.process_time() - cpu_started,
+        "resample_cpu": resample_cpu,
+        "text": app.normalize_text(" ".join(texts)),
+    }
+
+def resample_only(device_rate, model_rate, pcm, block_ms):
+    resampler = Resampler(device_rate, model_rate)
+    cpu_started = time.process_time()
+    for data in blocks(pcm, device_rate, block_ms):
+        resampler.process(data)
+    return time.process_time() - cpu_started
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognizer CPU per stream with and without capture-side resampling")
+    parser.add_argument("--app", default="WebSocket_Speech_VoskAPI")
+    parser.add_argument("--wav", required=True, help="recorded order, 16-bit PCM")
+    parser.add_argument("--device-rate", type=int, default=48000)
+    parser.add_argument("--block-ms", type=float, default=250)
+    parser.add_argument("--repeat", type=int, default=3, help="decode each way this many times, best run counts")
+    parser.add_argument("--resampler-only", action="store_true", help="time the resampler alone, no model needed")
+    parser.add_argument("--model-rate", type=int, default=16000, help="target rate for --resampler-only")
+    args = parser.parse_args()
+
+    sample_rate, pcm = read_wav(args.wav)
+    if sample_rate != args.device_rate:
+        converter = Resampler(sample_rate, args.device_rate)
+        pcm = converter.process(pcm) + converter.flush()
+    seconds = len(pcm) / 2 / args.device_rate
+    if args.resampler_only:
+        cpu = min(resample_only(args.device_rate, args.model_rate, pcm, args.block_ms) for _ in range(args.repeat))
+        blocks_per_second = 1000 / args.block_ms
+        print(f"{seconds:.1f}s of audio, {args.device_rate} -> {args.model_rate} Hz, {args.block_ms:.0f} ms blocks")
+        print(f"resampler: {cpu / seconds:.2%} of a core per stream, "
+              f"{1000 * cpu / seconds / blocks_per_second:.2f} ms per block")
+        return
+
+    app = importlib.import_module(args.app)
+    app.load_model()
+    print(f"{seconds:.1f}s of audio at {args.device_rate} Hz, model rate {app.MODEL_SAMPLE_RATE} Hz, "
+          f"{args.block_ms:.0f} ms blocks")
+
+    results = {}
+    for name, resample in (("native", False), ("resampled", True)):
+        runs = [decode(app, args.device_rate, pcm, args.block_ms, resample) for _ in range(args.repeat)]
+        results[name] = min(runs, key=lambda r: r["cpu"])
+    print(f"{'mode':>10} {'cpu_s':>8} {'core/stream':>12} {'resample':>9}  text")
+    for name, stats in results.items():
+        print(f"{name:>10} {stats['cpu']:>8.3f} {stats['cpu'] / seconds:>12.2%} "
+              f"{stats['resample_cpu'] / seconds:>9.2%}  {stats['text']}")
+    native, resampled = results["native"], results["resampled"]
+    if native["cpu"]:
+        print(f"CPU per stream saved: {1 - resampled['cpu'] / native['cpu']:.1%}")
+    print("transcripts match" if native["text"] == resampled["text"] else "TRANSCRIPTS DIFFER")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# ========================== Startup Time Benchmark ==========================
+# Starts an app in a fresh process and measures, from process launch:
+#   listening - the HTTP port accepts connections
+#   ready     - /ready returns 200 (catalog, model and warm-up all done)
+# Repeat a few runs; the first one also pays for a cold disk cache.
+#
+#   python -m benchmarks.bench_startup --app Http_Speech_VoskAPI --port 8000 --runs 3
+# ============================================================================
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+def wait_for_port(port, deadline):
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.05):
+                return True
+        except OSError:
+            time.sleep(0.01)
+    return False
+
+def wait_for_ready(port, deadline):
+    status = None
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            status = json.loads(e.read())
+        except OSError:
+            pass
+        time.sleep(0.05)
+    return status
+
+def run_once(app, port, timeout):
+    cmd = [sys.executable, "-m", "uvicorn", f"{app}:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    started = time.monotonic()
+    process = subprocess.Popen(cmd, cwd=os.getcwd(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = started + timeout
+        listening = time.monotonic() - started if wait_for_port(port, deadline) else None
+        status = wait_for_ready(port, deadline)
+        ready = time.monotonic() - started if status and status.get("ready") else None
+        return listening, ready, status
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Process launch to listening / ready time")
+    parser.add_argument("--app", default="WebSocket_Speech_VoskAPI")
+    parser.add_argument("--port", type=int, default=8086)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    listening_times, ready_times = [], []
+    for run in range(1, args.runs + 1):
+        listening, ready, status = run_once(args.app, args.port, args.timeout)
+        print(f"run {run}: listening {listening if listening is None else f'{listening:.2f}s'}, "
+              f"ready {ready if ready is None else f'{ready:.2f}s'}")
+        if status:
+            for name, state in status["components"].items():
+                print(f"    {name:<10} ready={state['ready']} at={state['seconds']} error={state['error']}")
+        if listening is not None:
+            listening_times.append(listening)
+        if ready is not None:
+            ready_times.append(ready)
+
+    if listening_times:
+        print(f"listening median: {statistics.median(listening_times):.2f}s")
+    if ready_times:
+        print(f"ready median:     {statistics.median(ready_times):.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# ===================== Voice Activity Gate Benchmark =====================
+# Simulates an idle kiosk: room noise, then a recorded order, then more noise.
+# Decodes the stream once ungated and once through VoiceActivityGate and
+# compares recognizer CPU time, the share of audio actually decoded, and the
+# transcripts (a leading syllable cut off by the gate shows up as a diff).
+#
+#   python -m benchmarks.bench_vad --app WebSocket_Speech_VoskAPI --wav order.wav --idle-seconds 60
+# =========================================================================
+import argparse
+import importlib
+import json
+import time
+
+import numpy as np
+
+from Speech_Batch import read_wav
+from Speech_VAD import VoiceActivityGate
+
+BLOCK_FRAMES = 4000
+
+def room_noise(sample_rate, seconds, level_db, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = int(sample_rate * seconds)
+    amplitude = 32768 * 10 ** (level_db / 20)
+    hum = np.sin(2 * np.pi * 50 * np.arange(samples) / sample_rate)
+    noise = amplitude * (rng.standard_normal(samples) + 0.5 * hum)
+    return np.clip(noise, -32768, 32767).astype(np.int16).tobytes()
+
+def decode(app, sample_rate, pcm, gate):
+    rec = app.create_recognizer(sample_rate)
+    texts = []
+    decoded_bytes = 0
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    for offset in range(0, len(pcm), BLOCK_FRAMES * 2):
+        data = pcm[offset:offset + BLOCK_FRAMES * 2]
+        speech_ended = False
+        if gate:
+            data, speech_ended = gate.process(data)
+        decoded_bytes += len(data)
+        if data and rec.AcceptWaveform(data):
+            texts.append(json.loads(rec.Result()).get("text", ""))
+        elif speech_ended:
+            texts.append(json.loads(rec.FinalResult()).get("text", ""))
+    texts.append(json.loads(rec.FinalResult()).get("text", ""))
+    return {
+        "cpu": time.process_time() - cpu_started,
+        "wall": time.perf_counter() - wall_started,
+        "decoded": decoded_bytes / len(pcm),
+        "text": app.normalize_text(" ".join(texts)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognizer CPU with and without the voice activity gate")
+    parser.add_argument("--app", default="WebSocket_Speech_VoskAPI")
+    parser.add_argument("--wav", required=True, help="recorded order, 16-bit PCM")
+    parser.add_argument("--idle-seconds", type=float, default=60, help="room noise before and after the order")
+    parser.add_argument("--noise-db", type=float, default=-50, help="room noise level in dBFS")
+    args = parser.parse_args()
+
+    app = importlib.import_module(args.app)
+    app.load_model()
+    sample_rate, speech = read_wav(args.wav)
+    noise = room_noise(sample_rate, args.idle_seconds, args.noise_db)
+    pcm = noise + speech + noise
+    print(f"{len(pcm) / 2 / sample_rate:.1f}s of audio, {len(speech) / 2 / sample_rate:.1f}s of it speech")
+
+    ungated = decode(app, sample_rate, pcm, None)
+    gated = decode(app, sample_rate, pcm, VoiceActivityGate(sample_rate))
+    print(f"{'mode':>8} {'cpu_s':>8} {'wall_s':>8} {'decoded':>8}  text")
+    for name, stats in (("ungated", ungated), ("gated", gated)):
+        print(f"{name:>8} {stats['cpu']:>8.2f} {stats['wall']:>8.2f} {stats['decoded']:>8.1%}  {stats['text']}")
+    if ungated["cpu"]:
+        print(f"CPU saved: {1 - gated['cpu'] / ungated['cpu']:.1%}")
+    print("transcripts match" if gated["text"] == ungated["text"] else "TRANSCRIPTS DIFFER")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# ===================== WebSocket Fan-Out Load And Soak Test =====================
+# Starts the WebSocket app in a child process with recognition stubbed out (no
+# model, microphone or catalog; only /ws and the Broadcaster run), opens
+# thousands of real /ws clients from a few client processes, and has a thread
+# in the server, standing in for the recognition thread, publish synthetic
+# "start" / "voiceOrderResult" events through broadcast_to_clients. Reports:
+#   delivery ms      - publish to client receive, p50 / p95 / p99 / max
+#   loss             - events a connected, reading client never got
+#   server KB/conn   - server RSS growth per open connection
+#   dropped          - clients the server closed (slow readers are meant to be)
+#
+# --soak runs connect / publish / disconnect cycles for that many seconds with
+# a mix of clean closes, aborted TCP connections (no close frame) and clients
+# that stop reading, and checks after every cycle that the server's client
+# table, task count and RSS go back down, so leaks show up as a trend.
+#
+#   python -m benchmarks.bench_ws_fanout --clients 2000 --messages 200 --rate 50
+#   python -m benchmarks.bench_ws_fanout --clients 500 --slow 20 --soak 1800
+# ================================================================================
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+import websockets
+
+END = "loadtest_end"
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+# ============================== Server Side ==============================
+def publish_events(publish, count, rate):
+    interval = 1 / rate if rate > 0 else 0
+    started = time.perf_counter()
+    for seq in range(count):
+        message = {"type": "start" if seq % 2 == 0 else "voiceOrderResult", "seq": seq, "sent_at": time.time()}
+        if message["type"] == "voiceOrderResult":
+            message["data"] = {"drink": "iced latte", "size": "L", "price": 45000}
+        publish(message)
+        delay = started + (seq + 1) * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    publish({"type": END, "count": count, "sent_at": time.time()})
+
+def serve(args):
+    import uvicorn
+    app_module = importlib.import_module(args.app)
+    # Only the broadcast path is under test
+    app_module.initialize = lambda: None
+    api = app_module.app
+
+    @api.get("/loadtest/stats")
+    async def loadtest_stats():
+        return {"rss_bytes": rss_bytes(), "tasks": len(asyncio.all_tasks()), **app_module.broadcaster.stats()}
+
+    @api.post("/loadtest/publish")
+    def loadtest_publish(count: int, rate: float):
+        threading.Thread(target=publish_events, args=(app_module.broadcast_to_clients, count, rate),
+                         daemon=True).start()
+        return {"publishing": count}
+
+    uvicorn.run(api, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096)
+
+class Server:
+    def __init__(self, app, port):
+        self.base = f"http://127.0.0.1:{port}"
+        self.url = f"ws://127.0.0.1:{port}/ws"
+        self.process = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_ws_fanout", "--serve",
+                                         "--app", app, "--port", str(port)])
+
+    def request(self, path, method="GET"):
+        with urllib.request.urlopen(urllib.request.Request(self.base + path, method=method), timeout=10) as r:
+            return json.loads(r.read())
+
+    def wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f"server exited with {self.process.returncode}")
+            try:
+                return self.stats()
+            except OSError:
+                time.sleep(0.2)
+        raise SystemExit("server did not come up")
+
+    def stats(self):
+        return self.request("/loadtest/stats")
+
+    def publish(self, count, rate):
+        return self.request(f"/loadtest/publish?count={count}&rate={rate}", method="POST")
+
+    # Until the server's client table reaches `clients`, or stops changing
+    def wait_clients(self, clients, timeout):
+        deadline = time.monotonic() + timeout
+        stats = self.stats()
+        while stats["clients"] != clients and time.monotonic() < deadline:
+            time.sleep(0.2)
+            stats = self.stats()
+        return stats
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# ============================== Client Side ==============================
+# kind: "read" (reads everything, closes cleanly), "abort" (reads everything, then
+# drops the TCP connection without a close frame), "slow" (never reads)
+async def client(url, kind, result, connect_slots, hold_seconds, timeout):
+    async with connect_slots:
+        try:
+            ws = await websockets.connect(url, max_size=None, open_timeout=timeout, ping_interval=None,
+                                          close_timeout=1)
+        except Exception:
+            result["connect_failed"] += 1
+            return
+    result["connected"] += 1
+    try:
+        if kind == "slow":
+            await asyncio.sleep(hold_seconds)
+            return
+        while True:
+            message = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+            if message["type"] == END:
+                break
+            result["latencies"].append(time.time() - message["sent_at"])
+            result["received"] += 1
+    except websockets.ConnectionClosed:
+        result["closed_by_server"] += 1
+    except asyncio.TimeoutError:
+        result["timed_out"] += 1
+    finally:
+        if kind == "abort":
+            ws.transport.abort()
+        else:
+            await ws.close()
+
+async def run_group(url, kinds, hold_seconds, timeout, handshakes):
+    result = {"connected": 0, "connect_failed": 0, "received": 0, "closed_by_server": 0,
+              "timed_out": 0, "latencies": [], "readers": kinds.count("read") + kinds.count("abort")}
+    connect_slots = asyncio.Semaphore(handshakes)
+    await asyncio.gather(*(client(url, kind, result, connect_slots, hold_seconds, timeout) for kind in kinds))
+    return result
+
+def client_group(url, kinds, hold_seconds, timeout, handshakes):
+    return asyncio.run(run_group(url, kinds, hold_seconds, timeout, handshakes))
+
+def client_kinds(args, abort_share):
+    readers = args.clients - args.slow
+    aborts = int(readers * abort_share)
+    kinds = ["abort"] * aborts + ["read"] * (readers - aborts) + ["slow"] * args.slow
+    random.shuffle(kinds)
+    return kinds
+
+def run_cycle(args, server, pool, abort_share):
+    kinds = client_kinds(args, abort_share)
+    groups = [kinds[i::args.processes] for i in range(args.processes)]
+    before = server.stats()
+    # Slow clients hold their socket until every reader is done and the server has had time to drop them
+    hold = args.messages / args.rate + 3 * args.send_timeout + 5 if args.rate > 0 else 30
+    futures = [pool.submit(client_group, server.url, group, hold, args.timeout, args.handshakes)
+               for group in groups if group]
+    connected = server.wait_clients(before["clients"] + len(kinds), args.timeout)
+    started = time.perf_counter()
+    server.publish(args.messages, args.rate)
+    results = [future.result() for future in futures]
+    wall = time.perf_counter() - started
+    # Every client is gone now; whatever is still registered has leaked
+    after = server.wait_clients(0, args.settle)
+    latencies = [l for r in results for l in r["latencies"]]
+    readers = sum(r["readers"] for r in results)
+    received = sum(r["received"] for r in results)
+    return {
+        "clients": len(kinds),
+        "connected": sum(r["connected"] for r in results),
+        "connect_failed": sum(r["connect_failed"] for r in results),
+        "kb_per_conn": (connected["rss_bytes"] - before["rss_bytes"]) / 1024 / max(1, connected["clients"] - before["clients"]),
+        "expected": readers * args.messages,
+        "received": received,
+        "closed_by_server": sum(r["closed_by_server"] for r in results),
+        "timed_out": sum(r["timed_out"] for r in results),
+        "latencies": latencies,
+        "wall": wall,
+        "dropped": after["dropped_clients"] - before["dropped_clients"],
+        "left_clients": after["clients"],
+        "tasks": after["tasks"],
+        "rss_mb": after["rss_bytes"] / 2**20,
+    }
+
+def ms(values, pct):
+    return f"{1000 * percentile(values, pct):.1f}" if values else "-"
+
+def report(cycle):
+    lost = cycle["expected"] - cycle["received"]
+    print(f"clients:        {cycle['connected']}/{cycle['clients']} connected, {cycle['connect_failed']} failed")
+    print(f"delivery ms:    p50 {ms(cycle['latencies'], 50)}  p95 {ms(cycle['latencies'], 95)}  "
+          f"p99 {ms(cycle['latencies'], 99)}  max {ms(cycle['latencies'], 100)}")
+    print(f"messages:       {cycle['received']}/{cycle['expected']} to reading clients, "
+          f"loss {lost / cycle['expected']:.3%}" if cycle["expected"] else "messages:       -")
+    print(f"throughput:     {cycle['received'] / cycle['wall']:.0f} deliveries/s")
+    print(f"server:         {cycle['kb_per_conn']:.1f} KB RSS per connection, {cycle['dropped']} clients dropped, "
+          f"{cycle['left_clients']} still registered after disconnect")
+
+def soak(args, server, pool):
+    print(f"{'cycle':>5} {'elapsed_s':>9} {'p95_ms':>7} {'loss':>7} {'dropped':>7} "
+          f"{'left':>5} {'tasks':>6} {'rss_mb':>7}")
+    started = time.monotonic()
+    rows = []
+    while time.monotonic() - started < args.soak:
+        cycle = run_cycle(args, server, pool, abort_share=args.abort_share)
+        rows.append(cycle)
+        lost = (cycle["expected"] - cycle["received"]) / cycle["expected"] if cycle["expected"] else 0
+        print(f"{len(rows):>5} {time.monotonic() - started:>9.0f} {ms(cycle['latencies'], 95):>7} {lost:>7.2%} "
+              f"{cycle['dropped']:>7} {cycle['left_clients']:>5} {cycle['tasks']:>6} {cycle['rss_mb']:>7.1f}")
+    # The first cycles warm allocator pools; judge growth on the second half
+    tail = rows[len(rows) // 2:]
+    if len(tail) >= 2:
+        xs = list(range(len(tail)))
+        slope = statistics.linear_regression(xs, [r["rss_mb"] for r in tail]).slope
+        print(f"RSS trend over the last {len(tail)} cycles: {slope * 1024:+.1f} KB per cycle")
+    leaked = rows[-1]["left_clients"] if rows else 0
+    print("client table back to empty after every cycle" if all(r["left_clients"] == 0 for r in rows)
+          else f"LEAK: {leaked} clients still registered after the last cycle")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan-out load and soak test for /ws")
+    parser.add_argument("--app", default="WebSocket_Speech_VoskAPI")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=0, help="clients that never read")
+    parser.add_argument("--abort-share", type=float, default=None,
+                        help="share of reading clients that drop TCP without a close frame (default 0, soak 0.25)")
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=20, help="events per second, 0 = as fast as possible")
+    parser.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1), help="client processes")
+    parser.add_argument("--handshakes", type=int, default=200, help="concurrent connection attempts per process")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--settle", type=float, default=10, help="seconds to wait for the server to forget closed clients")
+    parser.add_argument("--soak", type=float, default=0, help="run cycles for this many seconds")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    if args.abort_share is None:
+        args.abort_share = 0.25 if args.soak else 0.0
+    args.send_timeout = float(os.environ.get("BROADCAST_SEND_TIMEOUT", 2.0))
+    server = Server(args.app, args.port or free_port())
+    try:
+        idle = server.wait_ready()
+        print(f"server up, {idle['rss_bytes'] / 2**20:.1f} MB RSS idle; {args.clients} clients "
+              f"({args.slow} slow) over {args.processes} processes, {args.messages} events at "
+              f"{args.rate or 'max'}/s")
+        with ProcessPoolExecutor(args.processes) as pool:
+            if args.soak:
+                soak(args, server, pool)
+            else:
+                report(run_cycle(args, server, pool, abort_share=args.abort_share))
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
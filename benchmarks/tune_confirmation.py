@@ -0,0 +1,112 @@
+# ===================== Confirmation Threshold Tuning =====================
+# Replays labelled answers through the recognizer and the confirmation policy
+# (Speech_Confidence) and sweeps its thresholds. For every setting it reports
+# how many answers would be taken without a "did you mean" turn and how many of
+# those would be wrong, so CONFIRM_* can be set to the most skipping that
+# stays at (or under) the wrong-answer budget.
+#
+# Input: one JSON object per line, either a recording or a stored Vosk result:
+#   {"wav": "clips/latte_01.wav", "category": "Drink", "expected": "iced latte"}
+#   {"result": {"text": "size l", "result": [...]}, "category": "Size", "expected": "L"}
+# WAV paths are relative to the file. Run with RECOGNIZER_ALTERNATIVES=3 to tune
+# the n-best margin instead of word confidences.
+#
+#   python -m benchmarks.tune_confirmation --app Http_Speech_VoskAPI --clips recordings/labels.jsonl
+# ========================================================================
+import argparse
+import importlib
+import itertools
+import json
+import os
+
+from Speech_Batch import read_wav
+from Speech_Confidence import CONFIRM_NBEST_MARGIN, ConfirmationPolicy, evidence_from_result
+from benchmarks.bench_dialog import CHUNK_FRAMES, DEFAULT_CATALOG
+
+WORD_CONF_STEPS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98]
+MATCH_SCORE_STEPS = [80, 90, 95, 100]
+MARGIN_STEPS = [0.0, 1.0, 2.0, 5.0, 10.0]
+
+def load_clips(path):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        clips = [json.loads(line) for line in f if line.strip()]
+    for clip in clips:
+        if "wav" in clip:
+            clip["wav"] = os.path.join(base, clip["wav"])
+    return clips
+
+# The answer as the live dialog would hear it: decoded with the step's grammar
+def decode_clip(app, clip):
+    if "result" in clip:
+        return evidence_from_result(clip["result"], app.normalize_text)
+    sample_rate, pcm = read_wav(clip["wav"])
+    rec = app.create_recognizer(sample_rate, app.grammars.get(clip["category"]))
+    chunk_bytes = CHUNK_FRAMES * 2
+    heard = None
+    for offset in range(0, len(pcm), chunk_bytes):
+        if rec.AcceptWaveform(pcm[offset:offset + chunk_bytes]):
+            evidence = evidence_from_result(json.loads(rec.Result()), app.normalize_text)
+            heard = evidence if evidence.text else heard
+    evidence = evidence_from_result(json.loads(rec.FinalResult()), app.normalize_text)
+    return evidence if evidence.text else heard
+
+def sweep(app, decoded):
+    rows = []
+    # Without n-best lists the margin never matters, so it is not swept
+    nbest = any(evidence and len(evidence.alternatives) > 1 for _, evidence, _ in decoded)
+    margins = MARGIN_STEPS if nbest else [CONFIRM_NBEST_MARGIN]
+    for word_conf, score, margin in itertools.product(WORD_CONF_STEPS, MATCH_SCORE_STEPS, margins):
+        policy = ConfirmationPolicy(enabled=True, min_word_conf=word_conf, min_match_score=score, nbest_margin=margin)
+        auto = wrong = 0
+        for clip, evidence, label in decoded:
+            if label is None or not policy.decide(evidence, clip["category"], label, app.matcher)[0]:
+                continue
+            auto += 1
+            wrong += label != clip["expected"]
+        rows.append({"word_conf": word_conf, "score": score, "margin": margin, "auto": auto, "wrong": wrong})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep confirmation-skipping thresholds over labelled answers")
+    parser.add_argument("--app", default="Http_Speech_VoskAPI")
+    parser.add_argument("--clips", required=True)
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG, help="catalog snapshot to apply (default: the bundled test menu)")
+    parser.add_argument("--max-wrong", type=float, default=0.0, help="wrong auto-confirms allowed, as a share of all answers")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips)
+    app = importlib.import_module(args.app)
+    with open(args.catalog, encoding="utf-8") as f:
+        app.apply_catalog(json.load(f), warm_prompts=False)
+    if any("wav" in clip for clip in clips):
+        app.load_model()
+
+    decoded = []
+    matched = 0
+    for clip in clips:
+        evidence = decode_clip(app, clip)
+        label = app.matcher.best_match(evidence.text, clip["category"]) if evidence else None
+        matched += label == clip["expected"]
+        decoded.append((clip, evidence, label))
+    total = len(decoded)
+    print(f"{total} answers, matcher right on {matched} ({matched / total:.1%}) before any confirmation")
+
+    rows = sweep(app, decoded)
+    allowed = [r for r in rows if r["wrong"] <= args.max_wrong * total]
+    # Most skipping first; among equals the strictest setting is the safest bet
+    allowed.sort(key=lambda r: (-r["auto"], r["wrong"], -r["word_conf"], -r["score"], -r["margin"]))
+    print(f"{'word_conf':>9} {'score':>6} {'margin':>7} {'auto':>7} {'wrong':>6}")
+    for r in allowed[:args.top]:
+        print(f"{r['word_conf']:>9.2f} {r['score']:>6.0f} {r['margin']:>7.1f} "
+              f"{r['auto'] / total:>7.1%} {r['wrong']:>6}")
+    if not allowed:
+        print("no setting stays within --max-wrong")
+    else:
+        best = allowed[0]
+        print(f"CONFIRM_MIN_WORD_CONF={best['word_conf']} CONFIRM_MIN_MATCH_SCORE={best['score']} "
+              f"CONFIRM_NBEST_MARGIN={best['margin']}")
+
+if __name__ == "__main__":
+    main()
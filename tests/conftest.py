@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Stands in for a KaldiRecognizer: a chunk b"TEXT:<words>" ends an utterance with
+# those words, b"PART:<words>" makes them the current partial
+class FakeRecognizer:
+    def __init__(self, model, sample_rate, grammar=None):
+        self.model = model
+        self.partial = ""
+        self.result = {"text": ""}
+
+    def AcceptWaveform(self, data):
+        data = bytes(data)
+        if data.startswith(b"PART:"):
+            self.partial = data[5:].decode()
+            return False
+        if not data.startswith(b"TEXT:"):
+            return False
+        words = data[5:].decode().split()
+        self.partial = ""
+        self.result = {"text": " ".join(words),
+                       "result": [{"word": w, "conf": 1.0, "start": 0.0, "end": 0.1} for w in words]}
+        return True
+
+    def Result(self):
+        return json.dumps(self.result)
+
+    def FinalResult(self):
+        return json.dumps({"text": ""})
+
+    def PartialResult(self):
+        return json.dumps({"partial": self.partial})
+
+    def SetGrammar(self, grammar):
+        pass
+
+    def SetMaxAlternatives(self, alternatives):
+        pass
+
+# Opens KioskStreams of the WebSocket app on fake en and vi models
+@pytest.fixture
+def open_kiosk(monkeypatch):
+    import WebSocket_Speech_VoskAPI as ws
+    registry = ws.ModelRegistry(paths={"en": "en-model", "vi": "vi-model"}, default="en",
+                                loader=lambda path: path, opener=FakeRecognizer)
+    registry.sample_rates.update(en=16000, vi=16000)
+    monkeypatch.setattr(ws, "model_registry", registry)
+    monkeypatch.setattr(ws, "VAD_ENABLED", False)
+    monkeypatch.setattr(ws, "SPEECH_LANGUAGE", "en")
+    streams = []
+
+    def open_kiosk(snapshot, language="en"):
+        ws.apply_catalog(snapshot, warm_prompts=False)
+        streams.append(ws.KioskStream(16000, language))
+        return streams[-1]
+
+    yield open_kiosk
+    for stream in streams:
+        stream.close()
@@ -0,0 +1,60 @@
+import io
+import os
+import wave
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import Http_Speech_VoskAPI as http_app
+
+def wav_bytes(seconds=0.1, rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b"\0\0" * int(seconds * rate))
+    return buffer.getvalue()
+
+@pytest.fixture
+def client(monkeypatch):
+    seen = []
+
+    def transcribe_paths(pool, paths):
+        seen.extend(paths)
+        return [{"file": path, "text": "", "seconds": 0.1} for path in paths]
+
+    monkeypatch.setattr(http_app, "get_batch_pool", lambda: None)
+    monkeypatch.setattr(http_app.Speech_Batch, "transcribe_paths", transcribe_paths)
+    monkeypatch.setattr(http_app.Speech_Batch, "summarize", lambda results, seconds: {"files": len(results)})
+    client = TestClient(http_app.app)
+    client.seen = seen
+    return client
+
+def chunks(data, size=1000):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def test_archive_is_streamed_extracted_and_cleaned_up(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("night/a.wav", wav_bytes())
+        z.writestr("night/b.wav", wav_bytes())
+    response = client.post("/batch/transcribe", content=chunks(archive.getvalue()))
+    assert response.status_code == 200
+    files = sorted(result["file"] for result in response.json()["results"])
+    assert [name.split("/", 1)[1] for name in files] == ["night/a.wav", "night/b.wav"]
+    # The work directory is gone once the response is out
+    assert not any(os.path.exists(path) for path in client.seen)
+
+def test_single_wav_upload(client):
+    response = client.post("/batch/transcribe", content=wav_bytes())
+    assert response.status_code == 200
+    assert [result["file"] for result in response.json()["results"]] == ["upload.wav"]
+
+def test_empty_and_unknown_uploads_are_rejected(client):
+    assert client.post("/batch/transcribe", content=b"").status_code == 400
+    response = client.post("/batch/transcribe", content=b"not an archive")
+    assert response.status_code == 400
+    assert "Unsupported archive" in response.json()["Message"]
@@ -0,0 +1,44 @@
+import pytest
+
+SNAPSHOT = {"drinks": [
+    {"name": "iced latte", "price": 45000, "ingredients": ["milk", "sugar", "coffee"]},
+    {"name": "black coffee", "price": 30000, "ingredients": []},
+]}
+
+@pytest.fixture
+def kiosk(open_kiosk):
+    stream = open_kiosk(SNAPSHOT)
+    stream.feed(b"TEXT:hey dispenser")
+    return stream
+
+def pause_after(stream, partial, blocks=4):
+    replies = []
+    for _ in range(blocks):
+        replies += stream.feed(b"PART:" + partial.encode())
+    return replies
+
+def test_pause_after_the_drink_keeps_the_rest_of_a_compound_order(kiosk):
+    replies = pause_after(kiosk, "iced latte")
+    assert {"type": "partial", "text": "iced latte"} in replies
+    assert not any(reply.get("early") for reply in replies)
+
+    kiosk.feed(b"TEXT:iced latte large with less sugar")
+    session = kiosk.session
+    assert session.selected_drink == "iced latte"
+    assert session.selected_size == "L"
+    assert session.component_sizes == {"sugar": "S"}
+
+def test_ingredient_sizes_are_not_cut_short_either(kiosk):
+    kiosk.feed(b"TEXT:iced latte")
+    kiosk.feed(b"TEXT:yes")
+    assert kiosk.session.step == 3
+    pause_after(kiosk, "milk large")
+    kiosk.feed(b"TEXT:milk large sugar small")
+    assert kiosk.session.component_sizes == {"milk": "L", "sugar": "S"}
+
+def test_yes_no_answers_still_commit_early(kiosk):
+    kiosk.feed(b"TEXT:iced latte")
+    assert kiosk.session.expected_category() == "YesNo"
+    replies = pause_after(kiosk, "yes")
+    assert {"type": "transcript", "text": "yes", "early": True} in replies
+    assert kiosk.session.step == 3
@@ -0,0 +1,94 @@
+import sys
+import types
+
+import pytest
+
+import Http_Speech_VoskAPI as http_app
+from conftest import FakeRecognizer
+
+SNAPSHOT = {"drinks": [
+    {"name": "iced latte", "price": 45000, "ingredients": ["milk", "sugar", "coffee"]},
+    {"name": "black coffee", "price": 30000, "ingredients": []},
+]}
+
+class EndOfScript(Exception):
+    pass
+
+# Hands the microphone loop scripted blocks instead of captured audio
+class ScriptedRing:
+    def __init__(self, blocks):
+        self.blocks = list(blocks)
+
+    def read(self, timeout=None):
+        if not self.blocks:
+            raise EndOfScript()
+        return self.blocks.pop(0)
+
+    def depth(self):
+        return len(self.blocks)
+
+class FakeInputStream:
+    def __init__(self, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+@pytest.fixture
+def run_microphone(monkeypatch):
+    registry = http_app.ModelRegistry(paths={"en": "en-model"}, default="en",
+                                      loader=lambda path: path, opener=FakeRecognizer)
+    registry.sample_rates.update(en=16000)
+    monkeypatch.setattr(http_app, "model_registry", registry)
+    monkeypatch.setattr(http_app, "recognition_pool", None)
+    monkeypatch.setattr(http_app, "MODEL_SAMPLE_RATE", 16000)
+    monkeypatch.setattr(http_app, "VAD_ENABLED", False)
+    sounddevice = types.SimpleNamespace(default=types.SimpleNamespace(device=[0, 0]),
+                                        query_devices=lambda device, kind: {"default_samplerate": 16000},
+                                        RawInputStream=FakeInputStream)
+    monkeypatch.setitem(sys.modules, "sounddevice", sounddevice)
+    prompts, orders = [], []
+    monkeypatch.setattr(http_app, "speak", prompts.append)
+    monkeypatch.setattr(http_app, "publish_order", orders.append)
+    http_app.apply_catalog(SNAPSHOT, warm_prompts=False)
+
+    def run(blocks):
+        monkeypatch.setattr(http_app, "create_ring", lambda rate: (1600, ScriptedRing(blocks)))
+        with pytest.raises(EndOfScript):
+            http_app.Voice_Ordering_System()
+        return prompts, orders
+    return run
+
+def held(partial, blocks=3):
+    return [b"PART:" + partial.encode()] * blocks
+
+def test_yes_commits_from_the_partial_and_its_final_is_dropped(run_microphone):
+    prompts, _ = run_microphone([b"TEXT:iced latte", *held("yes")])
+    assert prompts[-1] == "What size for milk?"
+    # The final result of the same "yes" must not answer the next question
+    prompts, _ = run_microphone([b"TEXT:iced latte", *held("yes"), b"TEXT:yes"])
+    assert prompts[-1] == "What size for milk?"
+    assert "Please say yes or no." not in prompts
+
+def test_whole_order_of_early_commits_places_it_once(run_microphone):
+    prompts, orders = run_microphone([b"TEXT:black coffee", *held("no"), b"TEXT:no",
+                                      *held("size l"), b"TEXT:size l", *held("yes"), b"TEXT:yes"])
+    assert prompts.count("What size do you want?") == 1
+    # A partial carries no word confidences, so the size is still confirmed
+    assert prompts.count("Did you mean size L? Please say yes or no.") == 1
+    assert [order["data"] for order in orders if order["type"] == "voiceOrderResult"] == \
+        [{"price": 30000, "drink": "black coffee", "size": "L"}]
+
+def test_pause_after_the_drink_keeps_the_rest_of_a_compound_order(run_microphone):
+    prompts, _ = run_microphone([*held("iced latte"), b"TEXT:iced latte size l with s sugar"])
+    assert not any(prompt.startswith("You chose drink") for prompt in prompts)
+    assert not any(prompt.startswith("Did you mean drink") for prompt in prompts)
+    assert prompts[-1] == "What size for milk?"
+
+def test_partials_are_ignored_with_early_commit_off(run_microphone, monkeypatch):
+    monkeypatch.setattr(http_app.PartialTracker.__init__, "__defaults__", (2, False))
+    prompts, _ = run_microphone([b"TEXT:iced latte", *held("yes")])
+    assert prompts[-1].startswith("You chose drink: iced latte")
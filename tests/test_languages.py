@@ -0,0 +1,50 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import WebSocket_Speech_VoskAPI as ws
+
+SNAPSHOT = {"drinks": [{"name": "black coffee", "price": 30000, "ingredients": []}]}
+
+@pytest.fixture
+def kiosk(open_kiosk):
+    return open_kiosk(SNAPSHOT)
+
+def say(stream, text):
+    return stream.feed(b"TEXT:" + text.encode())
+
+def test_language_without_dialog_tables_is_not_switched_to(kiosk):
+    assert ws.dialog_languages() == ["en"]
+    replies = say(kiosk, "hey dispenser vietnamese")
+    assert {"type": "start"} in replies
+    assert not any(reply["type"] == "language" for reply in replies)
+    assert kiosk.session.language == "en"
+    assert kiosk.rec.model == "en-model"
+
+def test_kiosk_asking_for_a_language_without_dialog_is_refused(open_kiosk, monkeypatch):
+    open_kiosk(SNAPSHOT)
+    monkeypatch.setattr(ws.readiness, "is_ready", lambda name=None: True)
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with TestClient(ws.app).websocket_connect("/ws/audio?lang=vi") as socket:
+            socket.receive_json()
+    assert closed.value.code == 1008
+    assert "dialog" in closed.value.reason
+
+def test_next_customer_after_vietnamese_order_starts_in_english(kiosk, monkeypatch):
+    # As if the dialog had Vietnamese tables
+    monkeypatch.setattr(ws, "DIALOG_LANGUAGES", ["en", "vi"])
+    replies = say(kiosk, "hey dispenser vietnamese")
+    assert {"type": "language", "language": "vi"} in replies
+    assert kiosk.rec.model == "vi-model"
+
+    say(kiosk, "black coffee")
+    say(kiosk, "size large")
+    replies = say(kiosk, "yes")
+    assert any(reply["type"] == "voiceOrderResult" for reply in replies)
+    assert kiosk.session.listening_for_trigger
+    assert kiosk.session.language == "en"
+    assert kiosk.rec.model == "en-model"
+
+    replies = say(kiosk, "hey dispenser")
+    assert {"type": "start"} in replies
+    assert kiosk.session.language == "en"
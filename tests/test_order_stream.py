@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import pytest
+
+import Http_Speech_VoskAPI as http_app
+from Speech_OrderFeed import OrderFeed
+
+class FakeRequest:
+    def __init__(self, last_event_id=None, polls=1):
+        self.headers = {"last-event-id": last_event_id} if last_event_id else {}
+        self.polls = polls
+
+    async def is_disconnected(self):
+        self.polls -= 1
+        return self.polls < 0
+
+def read_events(request, since=None):
+    async def collect():
+        response = await http_app.stream_orders(request, since)
+        return [chunk async for chunk in response.body_iterator]
+    events = []
+    for chunk in asyncio.run(collect()):
+        fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+@pytest.fixture
+def feed(monkeypatch):
+    feed = OrderFeed(max_orders=2)
+    monkeypatch.setattr(http_app, "order_feed", feed)
+    return feed
+
+def test_resuming_past_the_buffer_is_told_what_it_missed(feed):
+    for n in range(4):
+        feed.append({"n": n})
+    events = read_events(FakeRequest(last_event_id="1"))
+    assert events[0] == ("missed", {"since": 1, "last_id": 4})
+    assert [data["id"] for kind, data in events[1:]] == [3, 4]
+
+def test_resuming_within_the_buffer_misses_nothing(feed):
+    for n in range(3):
+        feed.append({"n": n})
+    events = read_events(FakeRequest(last_event_id="2"))
+    assert events == [("order", feed.since(2)[0][0])]
+
+def test_event_id_from_before_a_restart_starts_over(feed):
+    feed.append({"n": 0})
+    events = read_events(FakeRequest(last_event_id="57"))
+    assert events[0] == ("missed", {"since": 57, "last_id": 1})
+    assert [data["id"] for kind, data in events[1:]] == [1]
@@ -0,0 +1,82 @@
+import asyncio
+
+from Speech_Broadcast import Broadcaster
+
+class FakeSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed = None
+
+    async def send_json(self, message):
+        await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=""):
+        self.closed = code
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+def test_every_client_gets_every_message():
+    async def scenario():
+        broadcaster = Broadcaster(max_queue=8, send_timeout=1.0)
+        sockets = [FakeSocket(), FakeSocket()]
+        for socket in sockets:
+            broadcaster.register(socket)
+        for n in range(5):
+            broadcaster.publish({"n": n})
+        await asyncio.sleep(0.05)
+        return broadcaster, sockets
+    broadcaster, sockets = run(scenario)
+    for socket in sockets:
+        assert [m["n"] for m in socket.sent] == list(range(5))
+    assert broadcaster.stats()["sent"] == 10
+    assert broadcaster.stats()["dropped_clients"] == 0
+
+def test_client_with_a_full_queue_is_dropped_without_holding_up_the_others():
+    async def scenario():
+        broadcaster = Broadcaster(max_queue=2, send_timeout=10.0)
+        slow, fast = FakeSocket(delay=5.0), FakeSocket()
+        broadcaster.register(slow)
+        broadcaster.register(fast)
+        # The slow sender is stuck on the first message; two more fill its queue
+        # and the fourth overflows it
+        for n in range(4):
+            broadcaster.publish({"n": n})
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        return broadcaster, slow, fast
+    broadcaster, slow, fast = run(scenario)
+    assert slow not in broadcaster.clients
+    assert slow.closed == 1013
+    assert slow.sent == []
+    assert [m["n"] for m in fast.sent] == [0, 1, 2, 3]
+    assert broadcaster.stats()["dropped_clients"] == 1
+
+def test_client_whose_send_times_out_is_dropped():
+    async def scenario():
+        broadcaster = Broadcaster(max_queue=8, send_timeout=0.05)
+        slow, fast = FakeSocket(delay=1.0), FakeSocket()
+        broadcaster.register(slow)
+        broadcaster.register(fast)
+        broadcaster.publish({"n": 0})
+        await asyncio.sleep(0.2)
+        broadcaster.publish({"n": 1})
+        await asyncio.sleep(0.05)
+        return broadcaster, slow, fast
+    broadcaster, slow, fast = run(scenario)
+    assert slow not in broadcaster.clients
+    assert slow.closed == 1013
+    assert [m["n"] for m in fast.sent] == [0, 1]
+    assert broadcaster.stats()["clients"] == 1
+
+def test_publish_from_another_thread_reaches_the_loop():
+    async def scenario():
+        broadcaster = Broadcaster()
+        socket = FakeSocket()
+        broadcaster.register(socket)
+        await asyncio.get_running_loop().run_in_executor(None, broadcaster.publish, {"n": 7})
+        await asyncio.sleep(0.05)
+        return socket
+    assert run(scenario).sent == [{"n": 7}]
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from Speech_Capture import AudioRing, create_ring
+
+def block(n, size=4):
+    return bytes([n]) * size
+
+def drain(ring):
+    blocks = []
+    while True:
+        view = ring.read(timeout=0)
+        if view is None:
+            return blocks
+        blocks.append(bytes(view))
+
+def test_blocks_come_back_in_order():
+    ring = AudioRing(4, 3)
+    for n in range(3):
+        assert ring.write(block(n))
+    assert drain(ring) == [block(0), block(1), block(2)]
+    assert ring.read(timeout=0) is None
+
+def test_drop_oldest_keeps_the_newest_blocks():
+    ring = AudioRing(4, 3, overflow="drop_oldest")
+    for n in range(5):
+        assert ring.write(block(n))
+    assert ring.depth() == 3
+    assert ring.counts == {"written": 5, "dropped": 2}
+    assert drain(ring) == [block(2), block(3), block(4)]
+
+def test_drop_newest_keeps_what_is_queued():
+    ring = AudioRing(4, 3, overflow="drop_newest")
+    results = [ring.write(block(n)) for n in range(5)]
+    assert results == [True, True, True, False, False]
+    assert ring.counts == {"written": 3, "dropped": 2}
+    assert drain(ring) == [block(0), block(1), block(2)]
+
+def test_held_slot_is_not_overwritten_until_the_next_read():
+    ring = AudioRing(4, 2, overflow="drop_oldest")
+    ring.write(block(0))
+    held = ring.read(timeout=0)
+    # The writer laps the ring several times while the reader holds block 0
+    for n in range(1, 8):
+        ring.write(block(n))
+    assert bytes(held) == block(0)
+    assert drain(ring) == [block(6), block(7)]
+
+def test_short_and_oversized_writes_are_clamped_to_the_block():
+    ring = AudioRing(4, 2)
+    ring.write(b"\x01\x02")
+    ring.write(b"\x03" * 10)
+    assert drain(ring) == [b"\x01\x02", b"\x03" * 4]
+
+def test_read_waits_for_the_writer():
+    ring = AudioRing(4, 2)
+    timer = threading.Timer(0.05, ring.write, [block(9)])
+    timer.start()
+    try:
+        assert bytes(ring.read(timeout=2)) == block(9)
+    finally:
+        timer.cancel()
+    assert ring.read(timeout=0.01) is None
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        AudioRing(4, 2, overflow="drop_everything")
+
+def test_create_ring_sizes_blocks_and_slots_from_milliseconds():
+    frames, ring = create_ring(16000, block_ms=250, max_lag_ms=2000)
+    assert frames == 4000
+    assert ring.block_bytes == 8000
+    assert ring.max_blocks == 8
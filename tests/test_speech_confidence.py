@@ -0,0 +1,105 @@
+import pytest
+
+from Speech_Confidence import ConfirmationPolicy, Evidence, evidence_from_result, phrase_confidence
+from Speech_Matcher import KeywordMatcher
+
+KEYWORDS = {
+    "Drink": {name: [name] for name in ["iced latte", "latte", "milk tea", "espresso"]},
+    "Size": {
+        "S": ["size s", "size small", "small"],
+        "M": ["size m", "size medium", "medium"],
+        "L": ["size l", "size large", "large"],
+    },
+}
+
+@pytest.fixture
+def matcher():
+    return KeywordMatcher(KEYWORDS)
+
+@pytest.fixture
+def policy():
+    return ConfirmationPolicy(enabled=True, min_word_conf=0.9, min_match_score=95, nbest_margin=2.0)
+
+def words(*pairs):
+    return [{"word": word, "conf": conf, "start": 0.0, "end": 0.0} for word, conf in pairs]
+
+@pytest.mark.parametrize("conf,auto", [(0.95, True), (0.9, True), (0.89, False), (0.4, False)])
+def test_word_confidence_threshold(policy, matcher, conf, auto):
+    evidence = Evidence("size large", words(("size", 1.0), ("large", conf)))
+    assert policy.decide(evidence, "Size", "L", matcher)[0] is auto
+
+def test_weakest_word_of_the_phrase_decides(policy, matcher):
+    evidence = Evidence("iced latte", words(("iced", 0.5), ("latte", 1.0)))
+    auto, details = policy.decide(evidence, "Drink", "iced latte", matcher)
+    assert not auto
+    assert details["word_conf"] == 0.5
+
+def test_words_outside_the_phrase_do_not_count(policy, matcher):
+    evidence = Evidence("um large", words(("um", 0.2), ("large", 0.97)))
+    assert policy.decide(evidence, "Size", "L", matcher)[0]
+
+def test_phrase_not_heard_word_for_word_is_confirmed(policy, matcher):
+    evidence = Evidence("lattes", words(("lattes", 1.0)))
+    assert not policy.decide(evidence, "Drink", "latte", matcher)[0]
+
+def test_fuzzy_score_below_the_threshold_is_confirmed(matcher):
+    policy = ConfirmationPolicy(enabled=True, min_match_score=101)
+    evidence = Evidence("latte", words(("latte", 1.0)))
+    auto, details = policy.decide(evidence, "Drink", "latte", matcher)
+    assert not auto
+    assert details["score"] == 100
+
+def test_label_the_matcher_did_not_pick_is_confirmed(policy, matcher):
+    evidence = Evidence("espresso", words(("espresso", 1.0)))
+    assert not policy.decide(evidence, "Drink", "latte", matcher)[0]
+
+@pytest.mark.parametrize("rival,auto", [(-10.0, True), (-2.0, True), (-1.5, False)])
+def test_nbest_margin_threshold(policy, matcher, rival, auto):
+    evidence = Evidence("size large", alternatives=[("size large", 0.0), ("size small", rival)])
+    auto_taken, details = policy.decide(evidence, "Size", "L", matcher)
+    assert auto_taken is auto
+    assert details["margin"] == -rival
+
+def test_alternatives_reading_as_the_same_label_are_not_rivals(policy, matcher):
+    evidence = Evidence("size large", alternatives=[
+        ("size large", 0.0), ("large", -0.1), ("size small", -5.0)])
+    auto, details = policy.decide(evidence, "Size", "L", matcher)
+    assert auto
+    assert details["margin"] == 5.0
+
+def test_no_acoustic_signal_is_never_taken(policy, matcher):
+    assert not policy.decide(Evidence("latte"), "Drink", "latte", matcher)[0]
+    assert not policy.decide(Evidence("latte", alternatives=[("latte", 0.0)]), "Drink", "latte", matcher)[0]
+
+def test_disabled_policy_and_missing_evidence_always_confirm(matcher):
+    evidence = Evidence("latte", words(("latte", 1.0)))
+    assert not ConfirmationPolicy(enabled=False).decide(evidence, "Drink", "latte", matcher)[0]
+    assert not ConfirmationPolicy(enabled=True).decide(None, "Drink", "latte", matcher)[0]
+
+def test_utterance_needs_every_word_certain(policy):
+    sure = Evidence("large latte", words(("large", 0.95), ("latte", 0.99)))
+    unsure = Evidence("large latte", words(("large", 0.95), ("latte", 0.7)))
+    assert policy.decide_utterance(sure)[0]
+    assert not policy.decide_utterance(unsure)[0]
+    assert not policy.decide_utterance(Evidence(""))[0]
+
+def test_utterance_margin_against_a_different_reading(policy):
+    close = Evidence("large latte", alternatives=[("large latte", 0.0), ("large latte", -0.5),
+                                                  ("small latte", -1.0)])
+    clear = Evidence("large latte", alternatives=[("large latte", 0.0), ("small latte", -3.0)])
+    assert not policy.decide_utterance(close)[0]
+    assert policy.decide_utterance(clear)[0]
+
+def test_evidence_from_both_result_shapes():
+    plain = evidence_from_result({"text": "[unk] Latte", "result": words(("latte", 0.9))}, str.lower)
+    assert (plain.text, plain.heard, plain.word_confidences()) == ("[unk] latte", "[unk] Latte", [("latte", 0.9)])
+    nbest = evidence_from_result({"alternatives": [{"text": "Latte", "confidence": 3.0, "result": []},
+                                                   {"text": "Espresso", "confidence": 1.0}]}, str.lower)
+    assert nbest.text == "latte"
+    assert nbest.alternatives == [("latte", 3.0), ("espresso", 1.0)]
+    assert nbest.word_confidences() == []
+
+def test_phrase_confidence_prefers_the_longest_phrase():
+    confs = [("size", 0.6), ("large", 0.99)]
+    assert phrase_confidence(confs, ["large", "size large"]) == 0.6
+    assert phrase_confidence(confs, ["small"]) is None
@@ -0,0 +1,14 @@
+import json
+
+from Speech_Grammar import UNK, build_grammars, strip_unk
+import WebSocket_Speech_VoskAPI as ws
+
+def test_every_step_grammar_ends_in_unk():
+    grammars = build_grammars({"YesNo": {"Yes": ["yes"], "No": ["no"]}}, ["hey dispenser"])
+    assert json.loads(grammars["YesNo"]) == ["yes", "no", UNK]
+    assert json.loads(grammars["Trigger"]) == ["hey dispenser", UNK]
+
+def test_unk_tokens_do_not_reach_the_matcher():
+    assert strip_unk("[unk] yes [unk]").split() == ["yes"]
+    assert ws.normalize_text("[unk] Yes [unk] no") == "yes no"
+    assert ws.detect_best_match(ws.normalize_text("[unk] large [unk]"), "Size") == "L"
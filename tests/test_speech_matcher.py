@@ -0,0 +1,75 @@
+import random
+
+from rapidfuzz import fuzz
+
+from Speech_Matcher import KeywordMatcher
+
+KEYWORDS = {
+    "Drink": {name: [name] for name in ["iced latte", "latte", "latte macchiato", "black coffee",
+                                        "green tea", "milk tea", "hot chocolate", "espresso"]},
+    "Size": {
+        "S": ["size s", "size small", "small"],
+        "M": ["size m", "size medium", "medium"],
+        "L": ["size l", "size large", "large"],
+    },
+    "YesNo": {
+        "Yes": ["yes", "yeah", "correct", "sure", "right"],
+        "No": ["no", "nope", "not", "incorrect", "wrong"],
+    },
+}
+TRIGGERS = ["hey dispenser", "dispenser", "hey you"]
+
+# The per-phrase loops the matcher replaced
+def loop_best_match(text, category, threshold=80):
+    best_match = {"score": 0, "label": None, "length": 0}
+    for label, kw_list in KEYWORDS[category].items():
+        for kw in kw_list:
+            score = fuzz.partial_ratio(text, kw)
+            if score > best_match["score"] or (
+                score == best_match["score"] and len(kw.split()) > best_match["length"]
+            ):
+                best_match.update({"score": score, "label": label, "length": len(kw.split())})
+    if best_match["score"] >= threshold:
+        return best_match["label"]
+    return None
+
+def loop_is_valid(text):
+    if not text:
+        return False
+    if any(kw in text for kw in TRIGGERS):
+        return True
+    return any(kw in text for table in KEYWORDS.values() for kw_list in table.values() for kw in kw_list)
+
+def utterances(count=1500, seed=7):
+    rng = random.Random(seed)
+    vocabulary = [word for table in KEYWORDS.values() for kw_list in table.values()
+                  for kw in kw_list for word in kw.split()]
+    vocabulary += ["please", "uh", "um", "a", "the", "with", "lattes", "coffe", "tee", "yess", "hey"]
+    for _ in range(count):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(0, 5))]
+        text = " ".join(words)
+        if text and rng.random() < 0.3:
+            # Misspell one character, the way a recognizer slip would
+            index = rng.randrange(len(text))
+            text = text[:index] + rng.choice("aeioust ") + text[index + 1:]
+        yield text
+
+def test_best_match_agrees_with_the_loop():
+    matcher = KeywordMatcher(KEYWORDS, TRIGGERS)
+    for text in utterances():
+        for category in KEYWORDS:
+            for threshold in (60, 80, 90):
+                assert matcher.best_match(text, category, threshold) == loop_best_match(text, category, threshold), \
+                    (text, category, threshold)
+
+def test_is_valid_agrees_with_the_loop():
+    matcher = KeywordMatcher(KEYWORDS, TRIGGERS)
+    for text in utterances():
+        assert matcher.is_valid(text) == loop_is_valid(text), text
+
+def test_confident_match_waits_for_a_phrase_that_can_still_grow():
+    matcher = KeywordMatcher(KEYWORDS, TRIGGERS)
+    assert matcher.confident_match("a latte", "Drink") is None
+    assert matcher.confident_match("latte macchiato please", "Drink") == "latte macchiato"
+    assert matcher.confident_match("iced latte", "Drink") == "iced latte"
+    assert matcher.confident_match("yes no", "YesNo") is None
@@ -0,0 +1,39 @@
+import asyncio
+
+from Speech_OrderFeed import OrderFeed
+
+def test_since_returns_orders_after_the_id():
+    feed = OrderFeed()
+    for n in range(3):
+        feed.append({"n": n})
+    entries, missed = feed.since(1)
+    assert [entry["id"] for entry in entries] == [2, 3]
+    assert not missed
+
+def test_overflow_is_reported_as_missed():
+    feed = OrderFeed(max_orders=2)
+    for n in range(4):
+        feed.append({"n": n})
+    entries, missed = feed.since(0)
+    assert [entry["id"] for entry in entries] == [3, 4]
+    assert missed
+
+def test_id_from_before_a_restart_returns_the_whole_buffer():
+    feed = OrderFeed()
+    feed.append({"n": 0})
+    feed.append({"n": 1})
+    entries, missed = feed.since(57)
+    assert [entry["id"] for entry in entries] == [1, 2]
+    assert missed
+
+def test_waiting_reader_with_stale_id_is_answered_straight_away():
+    feed = OrderFeed()
+    entries, missed = asyncio.run(feed.wait_since(57, timeout=5))
+    assert entries == [] and missed
+
+def test_etag_differs_between_processes_with_the_same_last_id():
+    before, after = OrderFeed(), OrderFeed()
+    before.append({"n": 0})
+    after.append({"n": 0})
+    assert before.last_id == after.last_id
+    assert before.etag() != after.etag()
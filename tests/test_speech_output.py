@@ -0,0 +1,56 @@
+import time
+
+from Speech_Output import Prompt, SpeechOutput
+
+def playing(text):
+    output = SpeechOutput(cache=None, play=lambda sound, prompt: None)
+    output.current = Prompt(text)
+    return output
+
+def test_answer_word_inside_prompt_is_not_echo():
+    output = playing("Did you mean size L for milk? Please say yes or no.")
+    assert not output.is_echo("yes")
+    assert not output.is_echo("no")
+    assert not output.is_echo("l")
+
+def test_single_letter_size_during_any_prompt_is_not_echo():
+    output = playing("You chose iced latte. What size would you like?")
+    for size in ("s", "m", "l"):
+        assert not output.is_echo(size)
+
+def test_prompt_leaking_back_is_echo():
+    output = playing("You can answer yes or no.")
+    assert output.is_echo("you can answer yes or no")
+    output = playing("Did you mean size L for milk? Please say yes or no.")
+    assert output.is_echo("please say yes or no")
+
+def test_finished_prompt_is_no_longer_echo_after_the_tail():
+    output = playing("You can answer yes or no.")
+    prompt = output.current
+    output.current = None
+    output.last_prompt = prompt
+    prompt.finished_at = 0.0
+    assert not output.is_echo("you can answer yes or no")
+
+def test_prompt_projected_onto_a_step_grammar_is_echo():
+    output = playing("Did you mean size L for milk? Please say yes or no.")
+    assert output.is_echo("[unk] yes [unk] no")
+    assert output.is_echo("[unk] [unk] yes [unk] no [unk]")
+    output = playing("Confirm: black coffee - size L. The price is 30000 vnd. Does this seem right to you?")
+    assert output.is_echo("[unk] right [unk]")
+
+def test_projected_words_not_in_the_prompt_are_not_echo():
+    output = playing("You chose iced latte. What size would you like?")
+    assert not output.is_echo("[unk] large")
+    output = playing("Please say yes or no.")
+    assert not output.is_echo("[unk] no yes")
+
+def test_echo_finalized_after_the_endpointer_delay_is_still_echo():
+    output = playing("Please say yes or no.")
+    prompt = output.current
+    output.current = None
+    output.last_prompt = prompt
+    prompt.finished_at = time.monotonic() - 0.6
+    assert not output.is_echo("please say yes or no")
+    assert output.is_echo("please say yes or no", tail=0.8 + 0.25)
+    assert output.is_echo("[unk] yes [unk] no", tail=0.8 + 0.25)
@@ -0,0 +1,27 @@
+from Speech_Partials import PartialTracker
+
+def tracker():
+    return PartialTracker(lambda message: None, lambda text, category: text, enabled=True)
+
+def test_rejected_early_commit_leaves_the_final_result_to_the_dialog():
+    partials = tracker()
+    assert partials.partial("yes", "YesNo") is None
+    assert partials.partial("yes", "YesNo") == "yes"
+    # The caller turned it down (echo, noise) and did not accept()
+    assert partials.partial("yes", "YesNo") is None
+    assert partials.final() is False
+
+def test_accepted_early_commit_drops_the_final_result():
+    partials = tracker()
+    partials.partial("yes", "YesNo")
+    assert partials.partial("yes", "YesNo") == "yes"
+    partials.accept()
+    assert partials.final() is True
+    assert partials.final() is False
+
+def test_rejected_partial_is_offered_again_once_it_changes():
+    partials = tracker()
+    partials.partial("no", "YesNo")
+    assert partials.partial("no", "YesNo") == "no"
+    partials.partial("no thanks", "YesNo")
+    assert partials.partial("no thanks", "YesNo") == "no thanks"
@@ -0,0 +1,54 @@
+import json
+import os
+import time
+
+from Speech_Persistence import OrderWriter
+
+class FakeTable:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def upsert(self, records, on_conflict):
+        self.rows.update((record[on_conflict], record) for record in records)
+        return self
+
+    def execute(self):
+        pass
+
+class FakeClient:
+    def __init__(self):
+        self.rows = {}
+
+    def table(self, name):
+        return FakeTable(self.rows)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_journal_failure_keeps_the_writer_running_and_is_reported(tmp_path):
+    client = FakeClient()
+    reports = []
+    # The journal's directory does not exist yet, every append fails
+    journal = tmp_path / "missing" / "orders.jsonl"
+    writer = OrderWriter(lambda: client, journal_path=str(journal), flush_seconds=0.01,
+                         max_backoff=0.05, report=reports.append)
+    writer.start()
+    wait_for(lambda: reports == [None])
+
+    key = writer.submit({"drink": "black coffee", "size": "L"}, "microphone")
+    wait_for(lambda: key in client.rows)
+    wait_for(lambda: writer.counts["journal_errors"] >= 2)
+    assert writer.thread.is_alive()
+    assert reports[-1].startswith("Order journal")
+
+    os.makedirs(journal.parent)
+    wait_for(lambda: reports[-1] is None)
+    second = writer.submit({"drink": "green tea", "size": "M"}, "microphone")
+    wait_for(lambda: second in client.rows)
+    wait_for(lambda: writer.error is None and not writer.pending)
+    with open(journal, encoding="utf-8") as f:
+        orders = [json.loads(line)["record"]["order_key"] for line in f if '"order"' in line]
+    assert key in orders and second in orders
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from Speech_Resample import Resampler, create_resampler, model_sample_rate
+
+def tone(rate, seconds=0.5, freq=440.0, amplitude=8000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16).tobytes()
+
+def whole(in_rate, out_rate, pcm):
+    resampler = Resampler(in_rate, out_rate)
+    return resampler.process(pcm) + resampler.flush()
+
+def blockwise(in_rate, out_rate, pcm, sizes):
+    resampler = Resampler(in_rate, out_rate)
+    out, start, n = [], 0, 0
+    while start < len(pcm):
+        size = sizes[n % len(sizes)] * 2
+        out.append(resampler.process(pcm[start:start + size]))
+        start += size
+        n += 1
+    return b"".join(out) + resampler.flush()
+
+@pytest.mark.parametrize("in_rate,out_rate", [(48000, 16000), (44100, 16000), (8000, 16000)])
+@pytest.mark.parametrize("sizes", [[1], [7, 160, 3], [1024], [4410, 1, 999]])
+def test_blockwise_output_equals_whole_stream_output(in_rate, out_rate, sizes):
+    pcm = tone(in_rate)
+    assert blockwise(in_rate, out_rate, pcm, sizes) == whole(in_rate, out_rate, pcm)
+
+@pytest.mark.parametrize("in_rate", [48000, 44100, 8000])
+def test_output_length_follows_the_rate_ratio(in_rate):
+    out = whole(in_rate, 16000, tone(in_rate, seconds=1.0))
+    assert abs(len(out) // 2 - 16000) <= 2
+
+def test_tone_survives_and_lines_up_with_the_input():
+    out = np.frombuffer(whole(48000, 16000, tone(48000)), dtype=np.int16).astype(np.float64)
+    expected = 8000 * np.sin(2 * np.pi * 440.0 * np.arange(len(out)) / 16000)
+    # Skip the filter's start-up and tail, where the input is cut off
+    middle = slice(200, len(out) - 200)
+    assert np.max(np.abs(out[middle] - expected[middle])) < 80
+
+def test_content_above_the_new_nyquist_is_removed():
+    out = np.frombuffer(whole(48000, 16000, tone(48000, freq=12000.0)), dtype=np.int16)
+    assert np.max(np.abs(out[200:-200])) < 80
+
+def test_empty_blocks_produce_nothing():
+    resampler = Resampler(48000, 16000)
+    assert resampler.process(b"") == b""
+
+def test_no_resampler_when_rates_match_or_disabled():
+    assert create_resampler(16000, 16000) is None
+    assert create_resampler(48000, 16000, enabled=False) is None
+    assert isinstance(create_resampler(48000, 16000), Resampler)
+
+def test_model_rate_is_read_from_mfcc_conf(tmp_path):
+    (tmp_path / "conf").mkdir()
+    (tmp_path / "conf" / "mfcc.conf").write_text("--use-energy=false\n--sample-frequency=8000\n")
+    assert model_sample_rate(str(tmp_path)) == 8000
+    assert model_sample_rate(str(tmp_path / "missing"), default=16000) == 16000
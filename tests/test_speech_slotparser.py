@@ -0,0 +1,74 @@
+import pytest
+
+from Speech_SlotParser import SlotParser
+
+KEYWORDS = {
+    "Drink": {
+        "latte": ["latte"],
+        "iced latte": ["iced latte"],
+        "milk tea": ["milk tea"],
+        "espresso": ["espresso"],
+    },
+    "Size": {
+        "S": ["size s", "size small", "small"],
+        "M": ["size m", "size medium", "medium"],
+        "L": ["size l", "size large", "large"],
+    },
+}
+COMPONENTS = {
+    "Latte": ["Milk", "Sugar"],
+    "Iced Latte": ["Milk", "Sugar", "Ice"],
+    "Milk Tea": ["Milk", "Tapioca Pearls"],
+}
+
+@pytest.fixture
+def parser():
+    return SlotParser(KEYWORDS, COMPONENTS)
+
+@pytest.mark.parametrize("text,expected", [
+    ("a large iced latte with less sugar",
+     {"drink": "iced latte", "size": "L", "components": {"Sugar": "S"}}),
+    ("iced latte size medium with extra milk and less ice",
+     {"drink": "iced latte", "size": "M", "components": {"Milk": "L", "Ice": "S"}}),
+    # Sizes after their ingredients
+    ("small latte milk large sugar small",
+     {"drink": "latte", "size": "S", "components": {"Milk": "L", "Sugar": "S"}}),
+    # Sizes before their ingredients, with filler in between
+    ("latte medium with a bit more of the milk and less sugar please",
+     {"drink": "latte", "size": "M", "components": {"Milk": "L", "Sugar": "S"}}),
+    # "milk tea" is the drink, not the ingredient "milk"
+    ("milk tea large with extra tapioca pearls",
+     {"drink": "milk tea", "size": "L", "components": {"Tapioca Pearls": "L"}}),
+    # Components come back in catalog order whatever order they were said in
+    ("iced latte less ice normal sugar extra milk",
+     {"drink": "iced latte", "size": None, "components": {"Milk": "L", "Sugar": "M", "Ice": "S"}}),
+])
+def test_compound_orders(parser, text, expected):
+    assert parser.parse(text) == expected
+
+def test_drink_alone_leaves_the_other_slots_open(parser):
+    assert parser.parse("espresso") == {"drink": "espresso", "size": None, "components": {}}
+
+def test_two_drinks_are_not_guessed_at(parser):
+    assert parser.parse("latte or milk tea large") == {"drink": None, "size": None, "components": {}}
+
+def test_two_free_sizes_leave_the_drink_size_open(parser):
+    assert parser.parse("small latte large")["size"] is None
+
+def test_amount_words_do_not_size_the_drink(parser):
+    assert parser.parse("extra latte")["size"] is None
+
+def test_ingredients_of_other_drinks_are_ignored(parser):
+    assert parser.parse("latte large with extra tapioca pearls") == \
+        {"drink": "latte", "size": "L", "components": {}}
+
+def test_drink_already_known_from_the_dialog(parser):
+    assert parser.parse("large with less sugar", drink="latte") == \
+        {"drink": "latte", "size": "L", "components": {"Sugar": "S"}}
+
+def test_grammar_phrases_cover_compound_answers(parser):
+    phrases = parser.grammar_phrases()
+    for word in ["large", "less", "tapioca pearls", "with"]:
+        assert word in phrases["Drink"]
+    assert "size large" not in phrases["Size"]
+    assert "extra" in phrases["Size"] and "milk" in phrases["Size"]
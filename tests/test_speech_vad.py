@@ -0,0 +1,51 @@
+import numpy as np
+
+from Speech_VAD import VoiceActivityGate
+
+RATE = 16000
+BLOCK = RATE // 10
+
+def silence(level=20, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, level, BLOCK).astype(np.int16).tobytes()
+
+def voiced(amplitude=6000, frequency=180):
+    t = np.arange(BLOCK) / RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16).tobytes()
+
+def test_silence_is_not_decoded():
+    gate = VoiceActivityGate(RATE)
+    for seed in range(20):
+        assert gate.process(silence(seed=seed)) == (b"", False)
+    assert gate.skipped_ratio() == 1.0
+
+def test_speech_opens_with_the_preroll_and_ends_after_the_hangover():
+    gate = VoiceActivityGate(RATE, preroll_ms=200, hangover_ms=300)
+    quiet = [silence(seed=seed) for seed in range(5)]
+    for block in quiet:
+        gate.process(block)
+    speech = voiced()
+    audio, ended = gate.process(speech)
+    # The last 200 ms before the speech come first, so the onset is not lost
+    assert audio == quiet[-2] + quiet[-1] + speech and not ended
+
+    assert gate.process(speech) == (speech, False)
+    tail = [gate.process(silence(seed=10 + n)) for n in range(3)]
+    assert [ended for _, ended in tail] == [False, False, True]
+    assert all(audio for audio, _ in tail)
+    assert gate.process(silence(seed=20)) == (b"", False)
+
+def test_hangover_follows_set_hangover():
+    gate = VoiceActivityGate(RATE, hangover_ms=800)
+    gate.process(voiced())
+    gate.set_hangover(0.2)
+    assert [gate.process(silence(seed=n))[1] for n in range(2)] == [False, True]
+
+def test_steady_hum_is_absorbed_into_the_noise_floor():
+    gate = VoiceActivityGate(RATE)
+    hum = voiced(amplitude=300, frequency=50)
+    opened = [bool(gate.process(hum)[0]) for _ in range(100)]
+    # The floor starts at a quiet room, so the hum may open the gate at first
+    # but not once the floor has caught up with it
+    assert not any(opened[-50:])
+    assert bool(gate.process(voiced())[0])
@@ -0,0 +1,85 @@
+import gc
+import time
+
+import pytest
+
+from Speech_Workers import RecognitionPool
+
+# Module level so the spawned workers can import them
+def load_fake_model(path):
+    return path
+
+class FakeRecognizer:
+    def __init__(self, model, sample_rate, grammar=None):
+        self.model = model
+
+    def AcceptWaveform(self, data):
+        return False
+
+    def FinalResult(self):
+        return '{"text": ""}'
+
+def open_fake_recognizer(model, sample_rate, grammar=None):
+    return FakeRecognizer(model, sample_rate, grammar)
+
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+def start_pool(check_seconds):
+    reports = []
+    pool = RecognitionPool({"en": "en-model"}, "en", workers=2, report=reports.append, check_seconds=check_seconds,
+                           loader=load_fake_model, opener=open_fake_recognizer)
+    pool.reports = reports
+    pool.start()
+    return pool
+
+@pytest.fixture
+def pool():
+    pool = start_pool(check_seconds=0.1)
+    yield pool
+    pool.stop()
+
+# Maintenance that will not run during the test
+@pytest.fixture
+def unattended_pool():
+    pool = start_pool(check_seconds=3600)
+    yield pool
+    pool.stop()
+
+def test_sessions_avoid_a_dead_worker_until_it_is_restarted(pool):
+    dead = pool.workers[0]
+    dead.process.kill()
+    dead.process.join()
+    for _ in range(4):
+        recognizer = pool.create_recognizer(16000)
+        assert recognizer.worker is not dead
+        assert recognizer.AcceptWaveform(b"\0" * 3200) is False
+
+    wait_for(lambda: pool.reports and pool.reports[-1] is None)
+    assert pool.reports[0].startswith("Recognition worker recognizer-0 exited")
+    assert pool.workers[0] is not dead and pool.workers[0].alive()
+
+def test_open_on_a_worker_that_just_died_goes_to_another(unattended_pool):
+    pool = unattended_pool
+    dead = pool.workers[0]
+    dead.process.kill()
+    dead.process.join()
+    # Before the pool has noticed: the open itself finds the worker gone
+    dead.exited = False
+    dead.process.is_alive = lambda: True
+    dead.streams.clear()
+    pool.workers[1].streams.update(range(1000, 1010))
+    recognizer = pool.create_recognizer(16000)
+    assert recognizer.worker is pool.workers[1]
+    assert dead.exited
+
+def test_idle_worker_frees_released_recognizers(pool):
+    recognizer = pool.create_recognizer(16000)
+    worker = recognizer.worker
+    del recognizer
+    gc.collect()
+    assert worker.released
+    wait_for(lambda: not worker.released)
@@ -0,0 +1,14 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import WebSocket_Speech_VoskAPI as ws
+
+@pytest.mark.parametrize("sample_rate", ["abc", "0", "-16000", "16k"])
+def test_bad_sample_rate_closes_with_unsupported_data(monkeypatch, sample_rate):
+    monkeypatch.setattr(ws.readiness, "is_ready", lambda name=None: True)
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with TestClient(ws.app).websocket_connect(f"/ws/audio?sample_rate={sample_rate}") as socket:
+            socket.receive_json()
+    assert closed.value.code == 1003
+    assert "sample_rate" in closed.value.reason